@@ -1,28 +1,48 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 import os
+import json
+import hashlib
 import asyncio
 import datetime
 import uuid
+import threading
+import time
 from dotenv import load_dotenv
-import google.generativeai as genai
-from openai import OpenAI
-import edge_tts
 import platform
+from tts_engine import split_text, stream_segments, segments_from_stream, iterate_in_thread
+from audio_cache import AudioCache, get_audio_cache
+from llm_cache import LLM_CACHE_ENABLED, get_llm_cache, cached_call, cached_stream
+import metrics
+import mp3_index
+import event_loop
+import providers
+import rate_limiter
+from singleflight import SingleFlight
+import storage
+from tts_failover import synthesize_one_voice
+from jobs import JobManager, JobQueueFull, FINISHED
+from batch import BatchManager, BatchError, parse_items
+from voice_catalog import get_voice_catalog
 
 app = Flask(__name__)
+# За nginx/Apache можна віддати файл силами вебсервера (X-Sendfile)
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "0") == "1"
+# Черга /jobs: у пам'яті, SQLite або Redis (JOB_BACKEND) — див. job_backends.py.
+# Записи /jobs і /stream теж там: з кількома воркерами gunicorn потрібен sqlite або redis
+jobs = JobManager()
 
 # --- НАЛАШТУВАННЯ ---
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GROK_API_KEY = os.getenv("GROK_API_KEY")
+# Озвучувати відповідь Gemini по реченнях, не чекаючи кінця генерації
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
 
-# Налаштування Gemini (якщо є ключ)
-if GOOGLE_API_KEY:
-    try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-        print("✅ Gemini налаштовано.")
-    except Exception as e:
-        print(f"⚠️ Помилка налаштування Gemini: {e}")
+# SDK провайдерів (Gemini, Edge) імпортуються при першому запиті — див. providers.py.
+# Клієнти створюються один раз на процес, асинхронна озвучка йде на спільному loop — див. event_loop.py
+
+# Фонове прибирання старих аудіо (TTL + ліміт розміру)
+storage.start_gc()
 
 # Виправлення для Windows (щоб не зависало локально)
 if platform.system() == 'Windows':
@@ -30,77 +50,113 @@ if platform.system() == 'Windows':
 
 # --- ФУНКЦІЇ ---
 
-async def save_audio(text, filename, voice):
-    """Зберігає аудіо через потік (Stream) — це найнадійніший метод для Render."""
+async def save_audio(text, filename, voice, on_progress=None):
+    """Зберігає аудіо: текст ріжеться на сегменти, які озвучуються паралельно."""
     if not text or not text.strip():
         print("❌ ПОМИЛКА: Текст для озвучки пустий!")
         raise ValueError("Text cannot be empty for TTS generation.")
     
     print(f"🎙️ Починаю генерацію аудіо (перші 50 симв.): {text[:50]}...")
     
-    # 🔄 МЕХАНІЗМ ПОВТОРНИХ СПРОБ (3 рази)
-    max_retries = 3
-    for attempt in range(max_retries):
+    segments = split_text(text)
+    print(f"🧩 Текст поділено на {len(segments)} сегм.")
+
+    async def produce():
+        # 🔄 Кожен сегмент: повтор, хедж при затримці і заміна на схожий голос (один на весь файл)
+        used = await synthesize_one_voice(segments, filename, voice, on_progress=on_progress,
+                                          full_text=lambda: text)
+        # Файл з голосом-заміною не кешуємо під ("edge", voice) — повтор отримав би інший голос
+        return used == ("edge", voice)
+
+    try:
+        with metrics.span("tts", provider="edge"):
+            await get_audio_cache().cached(filename, produce, text, "edge", voice)
+    except Exception as e:
+        print("❌ Всі спроби вичерпано.")
+        raise e
+
+    await asyncio.to_thread(_log_duration, filename)
+
+def _log_duration(path):
+    """Тривалість готового файлу — з індексу кадрів, без декодування."""
+    seconds = mp3_index.duration(path)
+    metrics.observe("audio_duration_seconds", seconds, provider="edge")
+    print(f"✅ Аудіо успішно збережено ({mp3_index.format_duration(seconds)}): {path}")
+
+def _collect(pieces, collected):
+    """Пропускає шматки тексту далі, запам'ятовуючи їх (для кешу)."""
+    for piece in pieces:
+        collected.append(piece)
+        yield piece
+
+async def save_audio_stream(pieces, filename, voice, on_progress=None):
+    """Озвучує текст, який ще генерується: речення йдуть у TTS, щойно ШІ їх дописав."""
+    collected = []
+    segments = segments_from_stream(iterate_in_thread(lambda: _collect(pieces, collected)))
+    print("🎙️ Починаю потокову генерацію аудіо (ШІ → TTS)...")
+    with metrics.span("tts", provider="edge"):
+        used = await synthesize_one_voice(segments, filename, voice, on_progress=on_progress,
+                                          full_text=lambda: "".join(collected))
+    if used == ("edge", voice):
         try:
-            communicate = edge_tts.Communicate(text, voice)
-            
-            # ВІДКРИВАЄМО ФАЙЛ І ЗАПИСУЄМО ПОТОКОМ (Chunk-by-chunk)
-            # Це надійніше, ніж communicate.save(), бо ми контролюємо процес
-            received_data = False
-            with open(filename, "wb") as f:
-                async for chunk in communicate.stream():
-                    if chunk["type"] == "audio":
-                        f.write(chunk["data"])
-                        received_data = True
-            
-            if not received_data:
-                raise Exception("Microsoft не надіслав жодних даних (пустий потік).")
-                
-            print(f"✅ Аудіо успішно збережено: {filename}")
-            return # Успіх
-            
+            get_audio_cache().store(AudioCache.key("".join(collected), "edge", voice), filename)
         except Exception as e:
-            print(f"⚠️ Помилка генерації (Спроба {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(1.5) # Чекаємо трохи довше
-            else:
-                print("❌ Всі спроби вичерпано.")
-                raise e
+            print(f"⚠️ Не вдалося покласти аудіо в кеш: {e}")
+    await asyncio.to_thread(_log_duration, filename)
 
-def call_gemini(text, instruction):
-    """Викликає Gemini API."""
+def call_gemini(text, instruction, bypass_cache=False):
+    """Викликає Gemini API (з кешем відповідей, якщо LLM_CACHE_ENABLED=1)."""
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model_name = 'gemini-2.0-flash'
         full_prompt = f"{instruction}\n\nText: {text}"
-        response = model.generate_content(full_prompt)
-        
-        if not response.parts:
-            print("⚠️ Gemini повернув порожню відповідь (можливо, фільтри безпеки).")
-            return None
+
+        def call():
+            # Темп, повтори і backoff (в т.ч. Retry-After) — у спільному rate_limiter
+            with metrics.span("llm", provider="gemini"):
+                model = providers.gemini_model(model_name)
+                response = rate_limiter.call("gemini", model.generate_content, full_prompt)
             
-        return response.text.strip()
+            if not response.parts:
+                metrics.inc("llm_empty_responses_total", provider="gemini")
+                print("⚠️ Gemini повернув порожню відповідь (можливо, фільтри безпеки).")
+                return None
+                
+            return response.text.strip()
+
+        cache = get_llm_cache() if LLM_CACHE_ENABLED else None
+        return cached_call(cache, model_name, full_prompt, call, bypass=bypass_cache)
     except Exception as e:
         print(f"⚠️ Помилка виклику Gemini: {e}")
         return None
 
+def stream_gemini(text, instruction, bypass_cache=False):
+    """Генератор шматків відповіді Gemini (stream=True), з кешем відповідей."""
+    model_name = 'gemini-2.0-flash'
+    full_prompt = f"{instruction}\n\nText: {text}"
+
+    def stream():
+        with metrics.span("llm", provider="gemini"):
+            model = providers.gemini_model(model_name)
+            for chunk in rate_limiter.stream("gemini", lambda: model.generate_content(full_prompt, stream=True)):
+                if chunk.parts:
+                    yield chunk.text
+
+    cache = get_llm_cache() if LLM_CACHE_ENABLED else None
+    return cached_stream(cache, model_name, full_prompt, stream, bypass=bypass_cache)
+
 # --- МАРШРУТИ ---
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/generate', methods=['POST'])
-def generate():
-    print("\n--- НОВИЙ ЗАПИТ ---")
-    data = request.json
+def prepare_text(data, report=lambda *a: None):
+    """Крок ШІ: повертає текст, готовий до озвучки."""
     text = data.get('text')
     voice = data.get('voice', 'en-US-ChristopherNeural')
     model_name = data.get('model', 'gemini-2.0-flash')
     instruction = data.get('instruction', '')
 
-    if not text:
-        return jsonify({"error": "Введіть текст!"}), 400
-
     print(f"📥 Отримано текст: {text[:30]}...")
     print(f"🤖 Модель: {model_name}, Голос: {voice}")
 
@@ -110,7 +166,8 @@ def generate():
     # Спробуємо використати ШІ тільки якщо вибрано Gemini і є ключ
     if "gemini" in model_name:
         if GOOGLE_API_KEY:
-            ai_result = call_gemini(text, instruction)
+            report("llm", 0.05)
+            ai_result = call_gemini(text, instruction, bypass_cache=bool(data.get('no_cache')))
             if ai_result:
                 processed_text = ai_result
                 print("✨ Текст успішно оброблено через ШІ.")
@@ -129,25 +186,457 @@ def generate():
     if not processed_text or not processed_text.strip():
         processed_text = "System error. No text provided."
 
+    return processed_text
+
+def uses_llm_stream(data):
+    """Чи піде текст у TTS потоком від Gemini (замість готового тексту)."""
+    return LLM_STREAMING and GOOGLE_API_KEY and "gemini" in data.get('model', 'gemini-2.0-flash')
+
+def prepare_text_stream(data, report=lambda *a: None):
+    """Як prepare_text, але віддає текст шматками по мірі генерації ШІ.
+
+    Якщо ШІ впав або нічого не написав до першого шматка — віддаємо оригінал.
+    Якщо ШІ впав посеред тексту — помилка (половину озвучки вже не відкотити).
+    """
+    text = data.get('text')
+    print(f"📥 Отримано текст: {text[:30]}...")
+    report("llm", 0.05)
+    started = False
+    pending = ""
     try:
+        for piece in stream_gemini(text, data.get('instruction', ''), bypass_cache=bool(data.get('no_cache'))):
+            if not started:
+                pending += piece
+                if not pending.strip():
+                    continue
+                piece, started = pending, True
+                print("✨ ШІ почав відповідати, текст іде в озвучку.")
+            yield piece
+    except Exception as e:
+        if started:
+            raise
+        print(f"⚠️ Помилка виклику Gemini: {e}")
+    if not started:
+        print("⚠️ ШІ не спрацював, використовуємо оригінальний текст.")
+        yield text if text and text.strip() else "System error. No text provided."
+
+# Однакові генерації (текст, інструкція, модель, голос), що йдуть одночасно, виконуються один раз
+generations = SingleFlight("generation")
+
+def run_generation(report, data):
+    """Повний цикл: ШІ-обробка тексту + озвучка. Повертає ім'я файлу.
+
+    Подвійний клік чи кілька однакових запитів одночасно отримують файл однієї генерації.
+    no_cache (примусова нова генерація) схлопування вимикає.
+    """
+    if data.get('no_cache'):
+        return _generate(report, data)
+    key = SingleFlight.key(
+        data.get('text'), data.get('instruction', ''), data.get('model', 'gemini-2.0-flash'),
+        data.get('voice', 'en-US-ChristopherNeural'),
+    )
+    filename, _ = generations.do(key, lambda: _generate(report, data), on_wait=lambda: report("coalesced", 0.1))
+    return filename
+
+def _generate(report, data):
+    metrics.inc("generations_total")
+    voice = data.get('voice', 'en-US-ChristopherNeural')
+    filename = storage.new_filename()
+    on_progress = lambda done, total: report("tts", 0.2 + 0.8 * done / total)
+
+    if uses_llm_stream(data):
+        event_loop.run(save_audio_stream(prepare_text_stream(data, report), storage.path_for(filename), voice, on_progress))
+    else:
+        processed_text = prepare_text(data, report)
+
         # 3. Генерація файлу
-        filename = f"audio_{uuid.uuid4()}.mp3"
-        
+        report("tts", 0.2)
+
         # Виклик асинхронної функції
-        asyncio.run(save_audio(processed_text, filename, voice))
+        event_loop.run(save_audio(processed_text, storage.path_for(filename), voice, on_progress=on_progress))
+
+    # Файл має бути доступний і на інших нодах (/download може прийти на будь-яку)
+    storage.publish(filename)
+    return filename
+
+jobs.register("generate", run_generation)
+# Пакети мають власний пул воркерів (BATCH_WORKERS), окремо від /jobs
+batches = BatchManager(run_generation)
 
+@app.route('/generate', methods=['POST'])
+def generate():
+    """Старий блокуючий маршрут (залишено для сумісності)."""
+    print("\n--- НОВИЙ ЗАПИТ ---")
+    data = request.json
+
+    if not data.get('text'):
+        return jsonify({"error": "Введіть текст!"}), 400
+
+    try:
+        filename = run_generation(lambda *a: None, data)
         return jsonify({"filename": filename})
 
     except Exception as e:
         print(f"🔥 КРИТИЧНА ПОМИЛКА: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/download/<filename>')
-def download_file(filename):
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Ставить генерацію у фонову чергу і одразу повертає id задачі."""
+    print("\n--- НОВА ЗАДАЧА ---")
+    data = request.json or {}
+
+    if not data.get('text'):
+        return jsonify({"error": "Введіть текст!"}), 400
+
     try:
-        return send_file(filename, as_attachment=True)
+        job = jobs.submit("generate", data)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Задачу не знайдено"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: шле знімок задачі при кожній зміні стану."""
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "Задачу не знайдено"}), 404
+
+    def stream():
+        seq = -1
+        while True:
+            job = jobs.wait(job_id, seq)
+            if job is None:
+                return
+            if job["seq"] == seq:
+                yield ": keep-alive\n\n"
+                continue
+            seq = job["seq"]
+            yield f"data: {json.dumps(job)}\n\n"
+            if job["status"] in FINISHED:
+                return
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- ПАКЕТНА ГЕНЕРАЦІЯ ---
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """Приймає JSON-масив або JSONL з {text, voice, model, instruction} і ставить усе в чергу."""
+    try:
+        items = parse_items(request.get_data())
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        batch = batches.submit(items)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    metrics.inc("batches_total")
+    print(f"\n--- НОВИЙ ПАКЕТ: {len(items)} елем. ---")
+    return jsonify({
+        "batch_id": batch.id,
+        "total": len(items),
+        "status_url": f"/batch/{batch.id}",
+        "zip_url": f"/batch/{batch.id}/zip",
+    }), 202
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    batch = batches.get(batch_id)
+    if batch is None:
+        return jsonify({"error": "Пакет не знайдено"}), 404
+    return jsonify(batches.status(batch))
+
+@app.route('/batch/<batch_id>/zip')
+def batch_zip(batch_id):
+    """ZIP з MP3 і manifest.json, який віддається потоком по мірі готовності елементів."""
+    batch = batches.get(batch_id)
+    if batch is None:
+        return jsonify({"error": "Пакет не знайдено"}), 404
+    return Response(batches.archive(batch), mimetype="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="batch_{batch.id}.zip"',
+        "X-Accel-Buffering": "no",
+    })
+
+# --- ПОТОКОВЕ АУДІО ---
+
+# Зареєстровані потоки — записи в бекенді черги: GET /stream/<id> може прийти на іншу ноду.
+# Запис живе STREAM_TTL: повторні й Range-запити (<audio> у Safari) після озвучки йдуть з файлу.
+# Поки йде озвучка, TTL продовжується (не частіше STREAM_TOUCH_EVERY), тож довгий потік не зникне
+STREAM_TTL = 600
+STREAM_TOUCH_EVERY = 30
+
+# Потоки, що зараз озвучуються в цьому процесі: stream_id → _LiveStream
+_live_streams = {}
+_live_streams_lock = threading.Lock()
+
+
+class _LiveStream:
+    """Озвучка, що дописує .part файл; читачі йдуть слідом за файлом, а не через чергу в пам'яті.
+
+    Відключений клієнт нічого не тримає: генерація дописує файл до кінця (для кешу й повторів).
+    .part перейменовується, лише коли його закрив останній читач (у Windows відкритий файл
+    не перейменувати); нові читачі після цього відкривають уже готовий файл.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.readers = 0
+        self.renamed = False
+
+    def update(self, written=0, done=False, error=None):
+        with self.cond:
+            self.written += written
+            self.done = self.done or done
+            self.error = self.error or error
+            self.cond.notify_all()
+
+    def wait(self, sent):
+        """Чекає, доки у файлі з'явиться щось після sent байтів. False — потік завершено."""
+        with self.cond:
+            while sent >= self.written and not self.done and self.error is None:
+                self.cond.wait()
+            if self.error is not None:
+                raise self.error
+            return sent < self.written
+
+    def open(self, path):
+        """Файл для нового читача: .part (з обліком читачів), а після перейменування — готовий."""
+        self.wait(0)  # .part уже створено (або потік завершився)
+        with self.cond:
+            if self.renamed:
+                return open(path, "rb"), False
+            self.readers += 1
+        try:
+            return open(f"{path}.part", "rb"), True
+        except BaseException:
+            self.close_reader()
+            raise
+
+    def close_reader(self):
+        with self.cond:
+            self.readers -= 1
+            self.cond.notify_all()
+
+    def finish(self, path, timeout=STREAM_TTL):
+        """Перейменовує дописаний .part у path, дочекавшись, поки його закриють усі читачі (у потоці).
+
+        timeout — на випадок читача, якого сервер так і не закрив.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.readers and time.monotonic() < deadline:
+                self.cond.wait(deadline - time.monotonic())
+            os.replace(f"{path}.part", path)
+            self.renamed = True
+
+
+def _end_stream(stream_id, entry=None):
+    """Прибирає потік з активних; entry — повернути запис у стан «не почато» (після помилки)."""
+    with _live_streams_lock:
+        _live_streams.pop(stream_id, None)
+    if entry is not None:
+        jobs.backend.put_record("stream", stream_id, entry, STREAM_TTL)
+
+async def _pump_audio(stream_id, entry, pieces, voice, path, live):
+    """Задача на спільному loop: озвучує текст (шматками, напр. від ШІ) і пише файл, повідомляючи live."""
+    part_path = f"{path}.part"
+    loop = asyncio.get_running_loop()
+    try:
+        collected = []
+        segments = segments_from_stream(iterate_in_thread(lambda: _collect(pieces, collected)))
+        touched = loop.time()
+        with open(part_path, "wb") as f:
+            async for chunk in stream_segments(segments, voice):
+                f.write(chunk)
+                f.flush()
+                live.update(written=len(chunk))
+                if loop.time() - touched > STREAM_TOUCH_EVERY:
+                    touched = loop.time()
+                    await asyncio.to_thread(jobs.backend.put_record, "stream", stream_id,
+                                            {**entry, "started": True}, STREAM_TTL)
+        live.update(done=True)
+        await asyncio.to_thread(live.finish, path)
+        await asyncio.to_thread(get_audio_cache().store, AudioCache.key("".join(collected), "edge", voice), path)
+        await asyncio.to_thread(storage.publish, os.path.basename(path))
+        print(f"✅ Потокове аудіо збережено: {path}")
     except Exception as e:
-        return str(e), 404
+        print(f"🔥 Помилка потокової генерації: {e}")
+        try: os.remove(part_path)
+        except OSError: pass
+        live.update(error=e)
+        await asyncio.to_thread(_end_stream, stream_id, entry)
+    else:
+        _end_stream(stream_id)
+
+def _follow_stream(live, path, chunk_size=64 * 1024):
+    """Чанки файлу, що ще дописується: від початку і далі по мірі озвучки."""
+    f, counted = live.open(path)
+    try:
+        sent = 0
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                sent += len(chunk)
+                yield chunk
+            elif not live.wait(sent):
+                return
+    finally:
+        f.close()
+        if counted:
+            live.close_reader()
+
+def _iter_file(path, chunk_size=64 * 1024, offset=0):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+@app.route('/stream', methods=['POST'])
+def create_stream():
+    """Реєструє потік і повертає URL, який можна одразу віддати в <audio src>."""
+    data = request.json or {}
+    if not data.get('text'):
+        return jsonify({"error": "Введіть текст!"}), 400
+
+    stream_id = uuid.uuid4().hex
+    filename = storage.new_filename()
+    jobs.backend.put_record("stream", stream_id, {"data": data, "filename": filename}, STREAM_TTL)
+
+    return jsonify({"stream_url": f"/stream/{stream_id}", "filename": filename}), 201
+
+@app.route('/stream/<stream_id>')
+def play_stream(stream_id):
+    """Віддає MP3 чанками (chunked transfer) по мірі озвучки; файл дописується у фоні.
+
+    Запис потоку не зникає після першого запиту: поки йде озвучка, кожен запит іде слідом
+    за файлом, а коли файл готовий — віддається з Range/ETag, як /download.
+    """
+    entry = jobs.backend.get_record("stream", stream_id)
+    if entry is None:
+        return jsonify({"error": "Потік не знайдено"}), 404
+
+    data = entry["data"]
+    filename = entry["filename"]
+    headers = {"Cache-Control": "no-cache", "X-Audio-Filename": filename, "X-Accel-Buffering": "no"}
+
+    def send_ready(path):
+        response = send_file(path, mimetype="audio/mpeg", conditional=True, etag=True)
+        response.headers["X-Audio-Filename"] = filename
+        return response
+
+    ready = storage.resolve(filename)
+    if ready is not None:
+        return send_ready(ready)
+
+    with _live_streams_lock:
+        live = _live_streams.get(stream_id)
+        starting = live is None and not entry.get("started")
+        if starting:
+            live = _live_streams[stream_id] = _LiveStream()
+    if live is None:
+        # Могли дописати між перевірками; інакше озвучується на іншій ноді — файл з'явиться в сховищі
+        ready = storage.resolve(filename)
+        if ready is not None:
+            return send_ready(ready)
+        return jsonify({"error": "Потік ще озвучується"}), 503, {"Retry-After": "2"}
+    path = storage.path_for(filename)
+    if not starting:
+        return Response(_follow_stream(live, path), mimetype="audio/mpeg", headers=headers)
+
+    voice = data.get('voice', 'en-US-ChristopherNeural')
+    try:
+        jobs.backend.put_record("stream", stream_id, {**entry, "started": True}, STREAM_TTL)
+        if uses_llm_stream(data):
+            # Перші речення від ШІ одразу йдуть в озвучку
+            pieces = prepare_text_stream(data)
+        else:
+            text = prepare_text(data)
+            # Вже озвучували — просто читаємо з кешу
+            if get_audio_cache().fetch(AudioCache.key(text, "edge", voice), path):
+                storage.publish(filename)
+                live.renamed = True  # .part не було — читачі одразу відкривають path
+                live.update(written=os.path.getsize(path), done=True)
+                _end_stream(stream_id)
+                return send_ready(path)
+            pieces = [text]
+    except Exception as e:
+        live.update(error=e)
+        _end_stream(stream_id, entry)
+        raise
+
+    event_loop.submit(_pump_audio(stream_id, entry, pieces, voice, path, live))
+    return Response(_follow_stream(live, path), mimetype="audio/mpeg", headers=headers)
+
+@app.route('/download/<filename>')
+def download_file(filename):
+    """Віддає файл зі сховища: Range (перемотка/докачка), ETag і умовні запити.
+
+    ?inline=1 — для програвача в браузері замість скачування; ?start=секунди — з цього моменту.
+    """
+    path = storage.resolve(filename)
+    if path is None:
+        metrics.inc("downloads_total", status="not_found")
+        return "Файл не знайдено (можливо, він застарів і був видалений).", 404
+
+    start = request.args.get("start", type=float)
+    if start:
+        # ?start=секунди — віддаємо з найближчого кадру (індекс перемотки будується за один прохід)
+        info = mp3_index.scan(path, seek_step=mp3_index.SEEK_STEP)
+        offset = info.seek.offset_for(start) if info.frames else 0
+        metrics.inc("downloads_total", status="seek")
+        return Response(_iter_file(path, offset=offset), mimetype="audio/mpeg",
+                        headers={"X-Audio-Duration": f"{info.duration:.3f}", "Cache-Control": "no-cache"})
+
+    # Без metrics.span: send_file лише будує відповідь, а саму передачу веде сервер через
+    # wsgi.file_wrapper (sendfile) — її тривалість тут не виміряти без втрати sendfile
+    response = send_file(
+        path,
+        mimetype="audio/mpeg",
+        as_attachment=not request.args.get("inline"),
+        download_name=filename,
+        conditional=True,
+        etag=True,
+        max_age=3600,
+    )
+    metrics.inc("downloads_total", status=str(response.status_code))
+    return response
+
+@app.route('/voices')
+def list_voices():
+    """Каталог голосів з фільтрами ?provider=&language=&gender= (без мережі — з диска і пам'яті).
+
+    Застарілий каталог оновлюється у фоні; ETag дозволяє браузеру не качати список щоразу.
+    """
+    catalog = get_voice_catalog()
+    catalog.refresh_in_background()
+    voices = catalog.find(provider=request.args.get("provider"), language=request.args.get("language"),
+                          gender=request.args.get("gender"))
+    response = jsonify({"voices": voices, "languages": catalog.languages()})
+    response.set_etag(f"{catalog.etag}-{hashlib.sha1(request.query_string).hexdigest()[:8]}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Метрики у форматі Prometheus (окремо для кожного воркера)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
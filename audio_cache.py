@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import metrics
+
+# --- НАЛАШТУВАННЯ КЕШУ АУДІО ---
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", ".audio_cache")
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "1024"))
+
+_SPACES_RE = re.compile(r"[ \t ]+")
+
+
+def normalize_text(text):
+    """Прибирає різницю, яка не впливає на озвучку (пробіли, \\r\\n)."""
+    lines = (_SPACES_RE.sub(" ", line).strip() for line in text.replace("\r\n", "\n").split("\n"))
+    return "\n".join(lines).strip()
+
+
+class AudioCache:
+    """Кеш готових MP3 на диску з адресацією за вмістом.
+
+    Ключ — sha256 від (нормалізований текст, провайдер, голос, параметри).
+    Розмір обмежено max_bytes, найстаріші за використанням файли видаляються (LRU за mtime).
+    """
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(text, provider, voice, **params):
+        if not isinstance(text, str):
+            # Ітератор шматків (StoryFile): хешуємо по ходу читання, не збираючи текст у пам'яті
+            digest = hashlib.sha256()
+            for piece in text:
+                digest.update(normalize_text(piece).encode("utf-8") + b"\n")
+            text = f"sha256:{digest.hexdigest()}"
+        payload = json.dumps(
+            [normalize_text(text), provider, voice, params], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def fetch(self, key, dest_path):
+        """Копіює закешований файл у dest_path. Повертає True при влучанні."""
+        src = self._path(key)
+        try:
+            tmp = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest_path)
+            os.utime(src)  # позначаємо як нещодавно використаний
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            metrics.inc("audio_cache_total", result="miss")
+            return False
+        with self.lock:
+            self.hits += 1
+        metrics.inc("audio_cache_total", result="hit")
+        return True
+
+    def store(self, key, src_path):
+        """Атомарно кладе готовий файл у кеш і за потреби звільняє місце."""
+        if self.max_bytes <= 0:
+            return
+        fd, tmp = tempfile.mkstemp(prefix=".put_", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as out, open(src_path, "rb") as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            os.replace(tmp, self._path(key))
+        except Exception:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        self._evict()
+
+    def _evict(self):
+        with self.lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith(".mp3"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+                total += st.st_size
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+                metrics.inc("audio_cache_evictions_total")
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    async def cached(self, path, produce, text, provider, voice, **params):
+        """Віддає файл з кешу або викликає await produce() і кешує результат.
+
+        Якщо produce() повернув False, результат не кешується (напр. частину озвучено голосом-заміною).
+        """
+        if self.max_bytes <= 0:  # AUDIO_CACHE_MAX_MB=0 вимикає кеш
+            await produce()
+            return False
+        key = self.key(text, provider, voice, **params)
+        # Копіювання файлів — у потоці, щоб не гальмувати спільний event loop
+        if await asyncio.to_thread(self.fetch, key, path):
+            print(f"⚡ Аудіо з кешу ({provider}/{voice}): {path}")
+            return True
+        if await produce() is False:
+            return False
+        try:
+            await asyncio.to_thread(self.store, key, path)
+        except Exception as e:
+            print(f"⚠️ Не вдалося покласти аудіо в кеш: {e}")
+        return False
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """Спільний екземпляр кешу для процесу."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AudioCache()
+        return _default
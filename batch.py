@@ -0,0 +1,234 @@
+import json
+import os
+import time
+import uuid
+import zipfile
+
+import metrics
+import storage
+from jobs import JobManager, FINISHED
+
+# --- НАЛАШТУВАННЯ ПАКЕТНОЇ ГЕНЕРАЦІЇ ---
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "3"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_MAX_PENDING = int(os.getenv("BATCH_MAX_PENDING", "500"))
+BATCH_KEEP_SECONDS = int(os.getenv("BATCH_KEEP_SECONDS", "3600"))
+# Скільки пакет може тривати від створення: незавершені після цього елементи вважаються помилкою
+BATCH_DEADLINE = int(os.getenv("BATCH_DEADLINE", str(2 * 3600)))
+
+ITEM_FIELDS = ("text", "voice", "model", "instruction")
+_COPY_BUFFER = 256 * 1024
+
+
+class BatchError(ValueError):
+    """Некоректний пакет (порожній, забагато елементів, елемент без тексту)."""
+
+
+def parse_items(body):
+    """Елементи пакета з тіла запиту: JSON-масив, {"items": [...]} або JSONL (об'єкт на рядок).
+
+    Один об'єкт без items (зокрема JSONL з одного рядка) — пакет з одного елемента.
+    """
+    if isinstance(body, bytes):
+        try:
+            body = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise BatchError("Тіло запиту має бути в UTF-8")
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        items = []
+        for number, line in enumerate(body.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise BatchError(f"Рядок {number}: некоректний JSON")
+    else:
+        items = parsed.get("items", [parsed]) if isinstance(parsed, dict) else parsed
+        if not isinstance(items, list):
+            raise BatchError("Очікується масив елементів або JSONL")
+
+    if not items:
+        raise BatchError("Пакет порожній")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchError(f"Забагато елементів: {len(items)} (максимум {BATCH_MAX_ITEMS})")
+
+    clean = []
+    for index, item in enumerate(items, 1):
+        if not isinstance(item, dict) or not item.get("text"):
+            raise BatchError(f"Елемент {index}: потрібне поле text")
+        if not isinstance(item["text"], str) or not item["text"].strip():
+            raise BatchError(f"Елемент {index}: text має бути непорожнім рядком")
+        clean.append({k: item[k] for k in ITEM_FIELDS if item.get(k) is not None})
+    return clean
+
+
+class Batch:
+    def __init__(self, items, job_ids, batch_id=None, created_at=None):
+        self.id = batch_id or uuid.uuid4().hex
+        self.items = items
+        self.job_ids = job_ids
+        self.created_at = created_at or time.time()
+
+    def to_record(self):
+        return {"id": self.id, "items": self.items, "job_ids": self.job_ids, "created_at": self.created_at}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["items"], record["job_ids"], record["id"], record["created_at"])
+
+    def member_name(self, index):
+        return f"{index + 1:03d}.mp3"
+
+
+class BatchManager:
+    """Пакети задач поверх окремої черги "batch": свій ліміт воркерів, щоб пакет не забивав /jobs.
+
+    Сам пакет зберігається записом у бекенді черги, тож статус і ZIP віддасть будь-яка нода.
+    """
+
+    def __init__(self, runner, max_workers=BATCH_WORKERS, max_pending=BATCH_MAX_PENDING,
+                 keep_seconds=BATCH_KEEP_SECONDS, deadline=BATCH_DEADLINE):
+        self.jobs = JobManager("batch", max_workers=max_workers, max_pending=max_pending, keep_seconds=keep_seconds)
+        self.jobs.register("generate", runner)
+        self.keep_seconds = keep_seconds
+        self.deadline = deadline
+
+    def submit(self, items):
+        """Ставить усі елементи в чергу (або жоден — JobQueueFull). Повертає Batch."""
+        queued = self.jobs.submit_many("generate", [(item,) for item in items])
+        batch = Batch(items, [job.id for job in queued])
+        self.jobs.backend.put_record("batch", batch.id, batch.to_record(), self.keep_seconds)
+        return batch
+
+    def get(self, batch_id):
+        record = self.jobs.backend.get_record("batch", batch_id)
+        return Batch.from_record(record) if record else None
+
+    def _timed_out(self, job_id):
+        return {"id": job_id, "status": "error", "error": "Пакет не завершився вчасно", "result": None}
+
+    def status(self, batch):
+        """Знімок пакета: загальний прогрес і стан кожного елемента."""
+        expired = time.time() > batch.created_at + self.deadline
+        items = []
+        for index, job_id in enumerate(batch.job_ids):
+            job = self.jobs.get(job_id) or {"id": job_id, "status": "error", "error": "Задача застаріла"}
+            if expired and job["status"] not in FINISHED:
+                job = {**job, **self._timed_out(job_id)}
+            items.append({"index": index, **job})
+        return {
+            "id": batch.id,
+            "total": len(items),
+            "done": sum(1 for i in items if i["status"] == "done"),
+            "errors": sum(1 for i in items if i["status"] == "error"),
+            "progress": round(
+                sum(1.0 if i["status"] in FINISHED else i.get("progress", 0) for i in items) / len(items), 3),
+            "items": items,
+        }
+
+    def finished_items(self, batch):
+        """Генератор (index, знімок задачі) у порядку завершення елементів.
+
+        Після дедлайну пакета решта елементів віддається як помилка — генератор не висить вічно.
+        """
+        index_of = {job_id: i for i, job_id in enumerate(batch.job_ids)}
+        deadline = batch.created_at + self.deadline
+        seen = set()
+        while len(seen) < len(batch.job_ids):
+            left = deadline - time.time()
+            if left <= 0:
+                for job_id in batch.job_ids:
+                    if job_id not in seen:
+                        seen.add(job_id)
+                        yield index_of[job_id], self._timed_out(job_id)
+                return
+            for job in self.jobs.wait_finished(batch.job_ids, seen, timeout=min(15, left)):
+                seen.add(job["id"])
+                yield index_of[job["id"]], job
+
+    def archive(self, batch):
+        """Потік ZIP: batch.json одразу, MP3 — по мірі готовності, manifest.json — в кінці.
+
+        batch.json іде першим, щоб байти пішли до клієнта відразу, а не після першого готового
+        елемента (інакше проксі обриває «мовчазне» з'єднання за idle timeout).
+        """
+        def members():
+            info = {"batch_id": batch.id, "created_at": batch.created_at, "total": len(batch.job_ids),
+                    "deadline": batch.created_at + self.deadline}
+            yield "batch.json", json.dumps(info, ensure_ascii=False, indent=2).encode("utf-8")
+            manifest = []
+            for index, job in self.finished_items(batch):
+                item = batch.items[index]
+                entry = {
+                    "index": index,
+                    "status": job["status"],
+                    "error": job.get("error"),
+                    "text": item["text"][:80],
+                    "chars": len(item["text"]),
+                    **{k: item[k] for k in ITEM_FIELDS if k != "text" and k in item},
+                    "timings": job.get("timings", {}),
+                }
+                path = storage.resolve(job["result"]) if job["status"] == "done" else None
+                if path:
+                    entry["file"] = batch.member_name(index)
+                    yield entry["file"], path
+                elif job["status"] == "done":
+                    entry.update(status="error", error="Файл не знайдено")
+                metrics.inc("batch_items_total", status=entry["status"])
+                manifest.append(entry)
+            manifest.sort(key=lambda e: e["index"])
+            payload = {"batch_id": batch.id, "created_at": batch.created_at, "items": manifest}
+            yield "manifest.json", json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+        return iter_zip(members())
+
+
+class _Sink:
+    """Файлоподібний приймач для ZipFile: накопичує байти до наступного drain()."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def iter_zip(members):
+    """Генератор байтів ZIP-архіву з members — пар (ім'я, шлях до файлу або bytes).
+
+    Архів не буферизується: у пам'яті лише поточний шматок файлу.
+    MP3 вже стиснутий, тому файли кладемо без компресії (ZIP_STORED).
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for name, source in members:
+            if isinstance(source, bytes):
+                zf.writestr(name, source)
+            else:
+                info = zipfile.ZipInfo(name, time.localtime(os.path.getmtime(source))[:6])
+                info.file_size = os.path.getsize(source)
+                with open(source, "rb") as f, zf.open(info, "w") as dest:
+                    while True:
+                        chunk = f.read(_COPY_BUFFER)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
@@ -0,0 +1,527 @@
+"""Локальні замінники провайдерів для бенчмарків (без мережі і без ключів).
+
+install() підміняє в sys.modules edge_tts, google.generativeai, openai і customtkinter,
+а FakeGenAIProServer піднімає локальний HTTP-сервер з API, схожим на GenAIPro,
+FakeRedisServer — мінімальний Redis для спільної черги кількох процесів.
+Затримки, розмір чанків і частку помилок задає FakeSettings.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import random
+import re
+import socketserver
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeSettings:
+    def __init__(self, llm_latency=0.5, llm_per_kchar=0.0, llm_words=300, story_parts=40,
+                 tts_ttfb=0.15, tts_chars_per_sec=1500.0, chunk_size=4096, bytes_per_char=60,
+                 error_rate=0.0, genaipro_delay=1.0, seed=0):
+        self.llm_latency = llm_latency          # базова затримка одного виклику ШІ, с
+        self.llm_per_kchar = llm_per_kchar      # додаткова затримка за кожні 1000 символів контексту, с
+        self.llm_words = llm_words              # слів у відповіді
+        self.story_parts = story_parts          # після стількох частин ШІ пише END
+        self.tts_ttfb = tts_ttfb                # час до першого аудіо-чанка, с
+        self.tts_chars_per_sec = tts_chars_per_sec
+        self.chunk_size = chunk_size            # байтів в одному аудіо-чанку
+        self.bytes_per_char = bytes_per_char    # розмір MP3 на символ тексту
+        self.error_rate = error_rate            # частка викликів, що падають
+        self.genaipro_delay = genaipro_delay    # скільки GenAIPro "рендерить" задачу, с
+        self.random = random.Random(seed)
+
+
+SETTINGS = FakeSettings()
+
+# Кадр MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono — 417 байтів
+_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+_FRAME = _FRAME_HEADER + bytes(417 - len(_FRAME_HEADER))
+
+
+def fake_mp3(nbytes):
+    """Валідний MP3 з тихих кадрів приблизно заданого розміру."""
+    frames = max(1, nbytes // len(_FRAME))
+    return _FRAME * frames
+
+
+def _maybe_fail(provider):
+    if SETTINGS.random.random() < SETTINGS.error_rate:
+        raise Exception(f"fake {provider} error")
+
+
+def _fake_text(prefix):
+    # Речення по 12 слів, щоб потокове різання по реченнях мало що різати
+    words = [f"word{i % 97}" for i in range(SETTINGS.llm_words)]
+    sentences = (" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12))
+    return f"{prefix} {' '.join(sentences)} The end of this part."
+
+
+# --- edge_tts ---
+
+class Communicate:
+    def __init__(self, text, voice, **kwargs):
+        self.text = text
+        self.voice = voice
+
+    async def stream(self):
+        await asyncio.sleep(SETTINGS.tts_ttfb)
+        _maybe_fail("edge")
+        data = fake_mp3(len(self.text) * SETTINGS.bytes_per_char)
+        chunks = [data[i:i + SETTINGS.chunk_size] for i in range(0, len(data), SETTINGS.chunk_size)]
+        pause = len(self.text) / SETTINGS.tts_chars_per_sec / max(1, len(chunks))
+        for chunk in chunks:
+            await asyncio.sleep(pause)
+            yield {"type": "audio", "data": chunk}
+
+    async def save(self, path):
+        with open(path, "wb") as f:
+            async for chunk in self.stream():
+                f.write(chunk["data"])
+
+
+_LOCALES = ["en-US", "en-GB", "uk-UA", "de-DE", "fr-FR", "pl-PL", "es-ES", "it-IT", "ja-JP", "zh-CN"]
+
+
+async def list_voices():
+    """Каталог розміру справжнього (~400 голосів) за одну відповідь."""
+    await asyncio.sleep(SETTINGS.tts_ttfb)
+    return [{"ShortName": f"{locale}-Voice{i}Neural", "Locale": locale, "Gender": "Female" if i % 2 else "Male"}
+            for locale in _LOCALES for i in range(40)]
+
+
+# --- google.generativeai ---
+
+class _Usage:
+    def __init__(self, prompt_chars, reply_chars):
+        self.prompt_token_count = prompt_chars // 4
+        self.candidates_token_count = reply_chars // 4
+
+
+class _Response:
+    def __init__(self, text, prompt_chars=0):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = _Usage(prompt_chars, len(text))
+
+
+def _llm_sleep(context_chars):
+    time.sleep(SETTINGS.llm_latency + SETTINGS.llm_per_kchar * context_chars / 1000)
+
+
+# Журнал викликів send_message: скільки токенів контексту і скільки часу зайняла кожна частина
+CHAT_LOG = []
+_PART_RE = re.compile(r"\bPart (\d+)\.")
+
+
+class _Chat:
+    def __init__(self, history):
+        self.history = list(history or [])
+        # Номер частини беремо з тексту, бо стислий контекст містить не всі частини
+        numbers = [int(n) for h in self.history if h.get("role") == "model"
+                   for p in h.get("parts", []) for n in _PART_RE.findall(p)]
+        self.parts_sent = max(numbers, default=0)
+
+    def _context_chars(self, message):
+        return len(message) + sum(len(p) for h in self.history for p in h.get("parts", []))
+
+    def send_message(self, message, safety_settings=None, **kwargs):
+        context = self._context_chars(message)
+        start = time.perf_counter()
+        _llm_sleep(context)
+        CHAT_LOG.append({"tokens": context // 4, "seconds": time.perf_counter() - start})
+        _maybe_fail("gemini")
+        self.parts_sent += 1
+        text = _fake_text(f"Part {self.parts_sent}.")
+        if self.parts_sent >= SETTINGS.story_parts:
+            text += " END"
+        else:
+            text += " Type 'Continue' to receive the next part."
+        self.history.append({"role": "user", "parts": [message]})
+        self.history.append({"role": "model", "parts": [text]})
+        return _Response(text, context)
+
+
+class GenerativeModel:
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, safety_settings=None, stream=False, **kwargs):
+        text = _fake_text("Rewritten.")
+        if not stream:
+            _llm_sleep(len(prompt))
+            _maybe_fail("gemini")
+            return _Response(text, len(prompt))
+        return self._stream(text, len(prompt))
+
+    def _stream(self, text, prompt_chars):
+        # Перший чанк приходить швидше за повну відповідь
+        pieces = [text[i:i + 200] for i in range(0, len(text), 200)]
+        time.sleep(SETTINGS.llm_latency / 4)
+        _maybe_fail("gemini")
+        for piece in pieces:
+            time.sleep(SETTINGS.llm_latency * 3 / 4 / len(pieces))
+            yield _Response(piece, prompt_chars)
+
+    def start_chat(self, history=None):
+        return _Chat(history)
+
+    def count_tokens(self, contents):
+        chars = sum(len(str(c)) for c in (contents if isinstance(contents, list) else [contents]))
+        return types.SimpleNamespace(total_tokens=chars // 4)
+
+
+def _configure(**kwargs):
+    pass
+
+
+# --- openai ---
+
+class _Speech:
+    def __init__(self):
+        self.with_streaming_response = types.SimpleNamespace(create=self._streaming_create)
+
+    @contextlib.contextmanager
+    def _streaming_create(self, **kwargs):
+        yield self.create(**kwargs)
+
+    def create(self, model, voice, input, **kwargs):
+        time.sleep(SETTINGS.tts_ttfb + len(input) / SETTINGS.tts_chars_per_sec)
+        _maybe_fail("openai")
+        data = fake_mp3(len(input) * SETTINGS.bytes_per_char)
+        return types.SimpleNamespace(
+            content=data,
+            stream_to_file=lambda path: open(path, "wb").write(data),
+            iter_bytes=lambda chunk_size=SETTINGS.chunk_size: (
+                data[i:i + chunk_size] for i in range(0, len(data), chunk_size)),
+        )
+
+
+class OpenAI:
+    def __init__(self, api_key=None, **kwargs):
+        self.audio = types.SimpleNamespace(speech=_Speech())
+
+
+# --- customtkinter (лише щоб desktop_app імпортувався без дисплея) ---
+
+class _Widget:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def install(settings=None):
+    """Підміняє SDK провайдерів локальними замінниками."""
+    global SETTINGS
+    if settings is not None:
+        SETTINGS = settings
+
+    edge = types.ModuleType("edge_tts")
+    edge.Communicate = Communicate
+    edge.list_voices = list_voices
+
+    google = types.ModuleType("google")
+    genai = types.ModuleType("google.generativeai")
+    genai.GenerativeModel = GenerativeModel
+    genai.configure = _configure
+    genai_types = types.ModuleType("google.generativeai.types")
+    genai_types.HarmCategory = types.SimpleNamespace(
+        HARM_CATEGORY_HARASSMENT="harassment", HARM_CATEGORY_HATE_SPEECH="hate",
+        HARM_CATEGORY_SEXUALLY_EXPLICIT="sexual", HARM_CATEGORY_DANGEROUS_CONTENT="dangerous")
+    genai_types.HarmBlockThreshold = types.SimpleNamespace(BLOCK_NONE="none")
+    genai.types = genai_types
+    google.generativeai = genai
+
+    openai = types.ModuleType("openai")
+    openai.OpenAI = OpenAI
+
+    sys.modules.update({
+        "edge_tts": edge,
+        "google": google,
+        "google.generativeai": genai,
+        "google.generativeai.types": genai_types,
+        "openai": openai,
+    })
+    install_ui()
+
+
+def install_ui():
+    """Лише customtkinter (щоб desktop_app імпортувався без дисплея), SDK лишаються справжні."""
+    ctk = types.ModuleType("customtkinter")
+    ctk.set_appearance_mode = lambda *a: None
+    ctk.set_default_color_theme = lambda *a: None
+    for name in ("CTk", "CTkLabel", "CTkFrame", "CTkComboBox", "CTkEntry", "CTkTabview", "CTkTextbox",
+                 "CTkButton", "CTkCheckBox", "CTkProgressBar", "CTkScrollableFrame"):
+        setattr(ctk, name, type(name, (_Widget,), {}))
+    sys.modules["customtkinter"] = ctk
+
+
+# --- GenAIPro ---
+
+class _GenAIProHandler(BaseHTTPRequestHandler):
+    server_version = "FakeGenAIPro/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload, status=200, etag=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+        if SETTINGS.random.random() < SETTINGS.error_rate:
+            return self._json({"error": "fake genaipro error"}, 500)
+        task_id = str(next(self.server.ids))
+        self.server.tasks[task_id] = (time.monotonic(), len(data.get("input", "")))
+        self._json({"task_id": task_id})
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/labs/voices"):
+            if self.headers.get("If-None-Match") == '"voices-v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            page = int(dict(p.split("=") for p in (self.path.split("?") + [""])[1].split("&") if "=" in p).get("page", 1))
+            voices = [{"voice_id": f"v{page}_{i}", "name": f"Voice {page}-{i}"} for i in range(100)] if page <= 3 else []
+            time.sleep(SETTINGS.tts_ttfb)
+            return self._json({"voices": voices, "total": 300, "page": page}, etag='"voices-v1"')
+        if "/labs/task/" in path:
+            task_id = path.rsplit("/", 1)[1]
+            started, chars = self.server.tasks.get(task_id, (0, 0))
+            if time.monotonic() - started < SETTINGS.genaipro_delay:
+                return self._json({"status": "processing"})
+            return self._json({"status": "completed", "result": f"{self.server.url}/files/{task_id}.mp3"})
+        if path.startswith("/files/"):
+            task_id = path.rsplit("/", 1)[1].split(".")[0]
+            _, chars = self.server.tasks.get(task_id, (0, 1))
+            body = fake_mp3(chars * SETTINGS.bytes_per_char)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._json({"error": "not found"}, 404)
+
+
+class FakeGenAIProServer:
+    """Локальний GenAIPro. Після start() направляє genaipro_client на себе."""
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _GenAIProHandler)
+        self.httpd.tasks = {}
+        self.httpd.ids = itertools.count(1)
+        self.httpd.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.url = self.httpd.url
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        import genaipro_client
+        genaipro_client.GENAIPRO_BASE_URL = f"{self.url}/api/v1"
+        genaipro_client.GENAIPRO_TASK_URL = f"{self.url}/api/v1/labs/task"
+        genaipro_client.GENAIPRO_VOICES_URL = f"{self.url}/api/v1/labs/voices"
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+# --- Redis ---
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    """Мінімальний Redis-сервер: лише команди, якими користуються job_backends і storage."""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        args = []
+        for _ in range(count):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _encode(self, value):
+        if value is None or value is False:
+            return b"_\r\n" if self.proto == 3 else b"$-1\r\n"
+        if value is True:
+            return b"+OK\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._encode(v) for v in value)
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        self.proto = 2
+        queued = None
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            name = args[0].upper()
+            if name == b"HELLO":
+                # redis-py 5+ домовляється про RESP3: відрізняється лише кодування null
+                self.proto = int(args[1]) if len(args) > 1 else 2
+                self.wfile.write(b"%%1\r\n$5\r\nproto\r\n:%d\r\n" % self.proto)
+            elif name == b"MULTI":
+                queued = []
+                self.wfile.write(b"+OK\r\n")
+            elif name == b"EXEC":
+                results = [self.server.store.execute(a) for a in queued]
+                queued = None
+                self.wfile.write(self._encode(results))
+            elif queued is not None:
+                queued.append(args)
+                self.wfile.write(b"+QUEUED\r\n")
+            else:
+                self.wfile.write(self._encode(self.server.store.execute(args)))
+
+
+class _RedisStore:
+    def __init__(self):
+        self.data = {}
+        self.cond = threading.Condition()
+
+    def execute(self, args):
+        name, rest = args[0].upper().decode(), args[1:]
+        with self.cond:
+            if name == "BRPOP":
+                deadline = time.monotonic() + float(rest[-1] or 0)
+                keys = rest[:-1]
+                while True:
+                    for key in keys:
+                        if self.data.get(key):
+                            return [key, self.data[key].pop()]
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self.cond.wait(remaining)
+            if name == "BLMOVE":
+                source, target, where_from, where_to, timeout = rest
+                deadline = time.monotonic() + float(timeout or 0)
+                while not self.data.get(source):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self.cond.wait(remaining)
+                value = self.data[source].pop(-1 if where_from.upper() == b"RIGHT" else 0)
+                items = self.data.setdefault(target, [])
+                items.insert(len(items) if where_to.upper() == b"RIGHT" else 0, value)
+                self.cond.notify_all()
+                return value
+            result = getattr(self, f"cmd_{name.lower()}", self.cmd_ok)(*rest)
+            self.cond.notify_all()
+            return result
+
+    def cmd_ok(self, *args):
+        return True
+
+    def cmd_ping(self):
+        return True
+
+    def cmd_set(self, key, value, *options):
+        self.data[key] = value
+        return True
+
+    def cmd_get(self, key):
+        return self.data.get(key)
+
+    def cmd_getdel(self, key):
+        return self.data.pop(key, None)
+
+    def cmd_del(self, *keys):
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    def cmd_append(self, key, value):
+        self.data[key] = self.data.get(key, b"") + value
+        return len(self.data[key])
+
+    def cmd_rename(self, key, new_key):
+        self.data[new_key] = self.data.pop(key)
+        return True
+
+    def cmd_strlen(self, key):
+        return len(self.data.get(key, b""))
+
+    def cmd_getrange(self, key, start, end):
+        return self.data.get(key, b"")[int(start):int(end) + 1]
+
+    def cmd_lpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+
+    def cmd_rpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        items.extend(values)
+        return len(items)
+
+    def cmd_lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        end = int(end)
+        return items[int(start):len(items) if end == -1 else end + 1]
+
+    def cmd_lrem(self, key, count, value):
+        items = self.data.get(key, [])
+        if value in items:
+            items.remove(value)  # job_backends видаляє лише по одному (count=1)
+            return 1
+        return 0
+
+    def cmd_hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+        return 1
+
+    def cmd_hsetnx(self, key, field, value):
+        fields = self.data.setdefault(key, {})
+        if field in fields:
+            return 0
+        fields[field] = value
+        return 1
+
+    def cmd_hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def cmd_hdel(self, key, *fields):
+        return sum(1 for f in fields if self.data.get(key, {}).pop(f, None) is not None)
+
+    def cmd_llen(self, key):
+        return len(self.data.get(key, []))
+
+    def cmd_expire(self, key, seconds):
+        return 1 if key in self.data else 0  # TTL у бенчмарку не потрібен
+
+
+class FakeRedisServer:
+    """Локальний Redis у потоці: спільна черга і сховище для кількох процесів-нод."""
+
+    def __init__(self):
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _RedisHandler)
+        self.server.daemon_threads = True
+        self.server.store = _RedisStore()
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
@@ -0,0 +1,426 @@
+"""Офлайн-бенчмарки генерації з локальними замінниками провайдерів.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.run                       # усі сценарії
+    python -m benchmarks.run -s story -s long_tts  # вибрані
+    python -m benchmarks.run --llm-latency 2 --error-rate 0.05 --out bench_output.txt
+
+Кожен сценарій виконується в окремому процесі, щоб пік RSS рахувався окремо.
+Звіт: p50/p95 затримки, задач за хвилину, пік RSS.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import fakes  # noqa: E402
+
+SHORT_TEXT = "Once upon a time there was a small village by the sea. " * 8
+LONG_TEXT = ("The old lighthouse keeper climbed the stairs again. " * 12 + "\n\n") * 50  # ~30k символів
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+# --- СЦЕНАРІЇ ---
+
+@scenario("rewrite")
+def bench_rewrite(args):
+    """Короткий рерайт: Gemini + Edge TTS через app.run_generation."""
+    import app
+    data = {"text": SHORT_TEXT, "model": "gemini-2.0-flash", "instruction": "Rewrite.", "no_cache": True}
+    return [timed(app.run_generation, lambda *a: None, data) for _ in range(args.iterations)], 0
+
+
+@scenario("story")
+def bench_story(args):
+    """Історія на 40 частин через AudioApp.async_pipeline (desktop)."""
+    harness = make_desktop_harness()
+    data = {"mode": "story", "prompt": "Write a story.", "pipelined": not args.sequential,
+            "model": "Gemini 2.5 Flash", "voice": "fake"}
+    latencies = []
+    for i in range(args.iterations):
+        latencies.append(timed(lambda: asyncio.run(harness.async_pipeline(data, f"bench{i}", lambda m, c: None))))
+    return latencies, 0
+
+
+@scenario("story_context")
+def bench_story_context(args):
+    """Історія з повною історією чату і зі стислим контекстом: токени і затримка кожної частини."""
+    if not fakes.SETTINGS.llm_per_kchar:
+        fakes.SETTINGS.llm_per_kchar = 0.02  # інакше довжина контексту не впливає на затримку
+    harness = make_desktop_harness()
+    latencies, logs = [], {}
+    for compact in (False, True):
+        mode = "compact" if compact else "full"
+        data = {"mode": "story", "prompt": "Write a story.", "pipelined": not args.sequential,
+                "compact_context": compact, "model": "Gemini 2.5 Flash", "voice": "fake"}
+        for i in range(args.iterations):
+            fakes.CHAT_LOG.clear()
+            latencies.append(timed(lambda: asyncio.run(
+                harness.async_pipeline(data, f"{mode}{i}", lambda m, c: None))))
+        logs[mode] = list(fakes.CHAT_LOG)
+        print(f"   story_context {mode}: {latencies[-1]:.2f}s", file=sys.stderr)
+    print(f"   {'part':>4} {'full tok':>9} {'full s':>7} {'compact tok':>12} {'compact s':>10}", file=sys.stderr)
+    for n, (full, compact) in enumerate(itertools.zip_longest(logs["full"], logs["compact"], fillvalue={}), 1):
+        print(f"   {n:>4} {full.get('tokens', '-'):>9} {fmt(full.get('seconds'), '{:.2f}'):>7} "
+              f"{compact.get('tokens', '-'):>12} {fmt(compact.get('seconds'), '{:.2f}'):>10}", file=sys.stderr)
+    return latencies, 0
+
+
+@scenario("story_memory")
+def bench_story_memory(args):
+    """Пік пам'яті (tracemalloc) історії без конвеєра залежно від довжини: Edge, OpenAI, GenAIPro."""
+    import tracemalloc
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    os.environ.setdefault("GENAIPRO_API_KEY", "fake-key")
+    fakes.SETTINGS.tts_chars_per_sec = 1e6
+    fakes.SETTINGS.genaipro_delay = 0
+    server = fakes.FakeGenAIProServer().start()
+    import genaipro_client
+    genaipro_client.POLL_FIRST = 0.05
+    harness = make_desktop_harness()
+    harness.voices_map.update({"openai": "openai|alloy", "genaipro": "genaipro|fake"})
+    latencies = []
+    print(f"   {'voice':>9} {'words':>6} {'text KB':>8} {'audio MB':>9} {'peak MB':>8}", file=sys.stderr)
+    try:
+        for voice in ("fake", "openai", "genaipro"):
+            for words in (300, 1200, 4800):
+                fakes.SETTINGS.llm_words = words
+                data = {"mode": "story", "prompt": "Write a story.", "pipelined": False,
+                        "model": "Gemini 2.5 Flash", "voice": voice}
+                tracemalloc.start()
+                try:
+                    latencies.append(timed(lambda: asyncio.run(
+                        harness.async_pipeline(data, f"{voice}{words}", lambda m, c: None))))
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                folder = max((os.path.join(os.getcwd(), d) for d in os.listdir(os.getcwd())
+                              if d.startswith(f"{voice}{words}_")), key=os.path.getmtime)
+                text_kb = os.path.getsize(os.path.join(folder, "story.txt")) / 1024
+                audio_mb = os.path.getsize(os.path.join(folder, "audio.mp3")) / (1024 * 1024)
+                print(f"   {voice:>9} {words:>6} {text_kb:>8.0f} {audio_mb:>9.1f} {peak / (1024 * 1024):>8.1f}",
+                      file=sys.stderr)
+                shutil.rmtree(folder, ignore_errors=True)
+    finally:
+        server.stop()
+    return latencies, 0
+
+
+@scenario("long_tts")
+def bench_long_tts(args):
+    """Озвучка ~30k символів: послідовно (1 потік) і паралельно (TTS_CONCURRENCY)."""
+    import tts_engine
+    latencies = []
+    for concurrency in (1, tts_engine.CONCURRENCY):
+        path = os.path.join(os.getcwd(), f"long_{concurrency}.mp3")
+        latencies.append(timed(lambda: asyncio.run(
+            tts_engine.synthesize_chunked(LONG_TEXT, path, "en-US-ChristopherNeural", concurrency=concurrency))))
+        print(f"   long_tts concurrency={concurrency}: {latencies[-1]:.2f}s", file=sys.stderr)
+    return latencies, 0
+
+
+@scenario("genaipro")
+def bench_genaipro(args):
+    """Довгий текст через GenAIPro-клієнт (локальний сервер)."""
+    server = fakes.FakeGenAIProServer().start()
+    import genaipro_client
+    client = genaipro_client.GenAIProClient("fake-key")
+    try:
+        latencies = [timed(client.synthesize, LONG_TEXT, "v1", "genaipro.mp3") for _ in range(args.iterations)]
+    finally:
+        server.stop()
+    return latencies, 0
+
+
+@scenario("web_load")
+def bench_web_load(args):
+    """Паралельні запити /generate від кількох клієнтів."""
+    import app
+    client_count = args.clients
+    total = args.iterations * client_count
+    data = {"text": SHORT_TEXT, "model": "gemini-2.0-flash", "instruction": "Rewrite.", "no_cache": True}
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        client = app.app.test_client()
+        start = time.perf_counter()
+        r = client.post("/generate", json=data)
+        if r.status_code != 200:
+            with lock:
+                errors += 1
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=client_count) as pool:
+        latencies = list(pool.map(one, range(total)))
+    return latencies, errors
+
+
+@scenario("scale_out")
+def bench_scale_out(args):
+    """Спільна черга SQLite і 1/2/4 «ноди» (JobManager по одному воркеру): задач за хвилину."""
+    import app
+    from job_backends import SQLiteBackend
+    from jobs import JobManager
+
+    backend = SQLiteBackend(os.path.join(os.getcwd(), "jobs.sqlite3"))
+    data = {"text": SHORT_TEXT, "model": "gemini-2.0-flash", "instruction": "Rewrite.", "no_cache": True}
+    total = args.iterations * 4
+    latencies = []
+    errors = 0
+    for nodes in (1, 2, 4):
+        queue = f"scale{nodes}"
+        managers = [JobManager(queue, max_workers=1, max_pending=total, backend=backend) for _ in range(nodes)]
+        for manager in managers:
+            manager.register("generate", app.run_generation)
+        start = time.perf_counter()
+        ids = [job.id for job in managers[0].submit_many("generate", [(data,)] * total)]
+        finished = {}
+        while len(finished) < total:
+            for job in managers[0].wait_finished(ids, finished, timeout=60):
+                finished[job["id"]] = job
+        wall = time.perf_counter() - start
+        errors += sum(job["status"] != "done" for job in finished.values())
+        latencies += [job["run_seconds"] for job in finished.values() if job.get("run_seconds") is not None]
+        print(f"   scale_out {nodes} нод(и): {total / wall * 60:.1f} задач/хв", file=sys.stderr)
+    return latencies, errors
+
+
+@scenario("voices")
+def bench_voices(args):
+    """Каталог голосів: перше завантаження всіх сторінок, ревалідація (ETag/304), старт з диска, пошук."""
+    server = fakes.FakeGenAIProServer().start()
+    os.environ.setdefault("GENAIPRO_API_KEY", "fake-key")
+    import event_loop
+    from voice_catalog import VoiceCatalog
+    path = os.path.join(os.getcwd(), "voice_catalog.json")
+    try:
+        cold = timed(lambda: event_loop.run(VoiceCatalog(path).refresh()))
+        revalidate = timed(lambda: event_loop.run(VoiceCatalog(path).refresh(force=True)))
+        start = time.perf_counter()
+        catalog = VoiceCatalog(path)
+        load = time.perf_counter() - start
+        lookups = [timed(catalog.find, None, language, "female") for language in catalog.languages()]
+    finally:
+        server.stop()
+    print(f"   voices: {len(catalog.voices)} голосів; холодне {cold:.2f}s, ревалідація {revalidate:.2f}s, "
+          f"з диска {load * 1000:.1f} ms, пошук p50 {percentile(lookups, 0.5) * 1e6:.0f} µs", file=sys.stderr)
+    return [cold, revalidate, load], 0
+
+
+# Холодний старт у свіжому процесі зі справжніми SDK (замінники тут нічого б не показали)
+_STARTUP_WEB = """
+import sys
+sys.path.insert(0, {root!r})
+import app
+assert app.app.test_client().get("/").status_code == 200
+"""
+
+_STARTUP_DESKTOP = """
+import sys
+sys.path.insert(0, {root!r})
+try:
+    import customtkinter
+except ImportError:
+    from benchmarks import fakes
+    fakes.install_ui()
+import desktop_app
+"""
+
+
+@scenario("startup")
+def bench_startup(args):
+    """Холодний старт: перша HTTP-відповідь app.py та імпорт desktop_app (ціль --startup-target-ms)."""
+    latencies = []
+    errors = 0
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "0"}
+    for kind, code in (("web", _STARTUP_WEB), ("desktop", _STARTUP_DESKTOP)):
+        runs = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", code.format(root=ROOT)], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            runs.append(time.perf_counter() - start)
+            errors += proc.returncode != 0
+        best = min(runs) * 1000
+        verdict = "OK" if best <= args.startup_target_ms else "ПОВІЛЬНО"
+        print(f"   startup {kind}: {best:.0f} ms (ціль {args.startup_target_ms:.0f} ms) {verdict}", file=sys.stderr)
+        latencies += runs
+    return latencies, errors
+
+
+def make_desktop_harness():
+    """AudioApp без вікна: лише методи конвеєра і потрібні атрибути."""
+    import desktop_app
+    from story_journal import StoryJournal
+    from task_scheduler import TaskScheduler
+
+    names = ("async_pipeline", "synthesize", "check_provider", "update_story_summary", "task_folder", "voice_key")
+    Harness = type("Harness", (), {n: desktop_app.AudioApp.__dict__[n] for n in names})
+    h = Harness()
+    h.voices_map = {"fake": "edge|en-US-ChristopherNeural"}
+    h.saved_settings = {"download_path": os.getcwd()}
+    h.journal = StoryJournal(os.path.join(os.getcwd(), "journal.sqlite3"))
+    h.scheduler = TaskScheduler(None)
+    h.after = lambda ms, fn: None
+    h.update_status = lambda m, c: None
+    h.combo_model = h.combo_voice = types.SimpleNamespace(get=lambda: "")
+    return h
+
+
+# --- ЗАПУСК ---
+
+def configure(args):
+    settings = fakes.FakeSettings(
+        llm_latency=args.llm_latency, llm_per_kchar=args.llm_per_kchar, story_parts=args.story_parts,
+        tts_ttfb=args.tts_ttfb, tts_chars_per_sec=args.tts_cps, chunk_size=args.chunk_size,
+        error_rate=args.error_rate, genaipro_delay=args.genaipro_delay,
+    )
+    fakes.install(settings)
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    # Кеші вимикаємо, щоб міряти саму генерацію
+    os.environ["AUDIO_CACHE_DIR"] = os.path.join(os.getcwd(), "audio_cache")
+    os.environ["AUDIO_CACHE_MAX_MB"] = "0"
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["LLM_STREAMING"] = "0" if args.no_llm_stream else "1"
+
+
+def run_one(name, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    os.chdir(workdir)
+    try:
+        configure(args)
+        start = time.perf_counter()
+        latencies, errors = SCENARIOS[name](args)
+        wall = time.perf_counter() - start
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "scenario": name,
+        "runs": len(latencies),
+        "errors": errors,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "jobs_per_min": len(latencies) / wall * 60 if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def fmt(value, pattern):
+    return pattern.format(value) if value is not None else "-"
+
+
+def report(results):
+    lines = [f"{'scenario':<10} {'runs':>5} {'err':>4} {'p50 s':>8} {'p95 s':>8} {'jobs/min':>9} {'RSS MB':>8}"]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['scenario']:<10} FAILED: {r['error']}")
+            continue
+        lines.append(
+            f"{r['scenario']:<10} {r['runs']:>5} {r['errors']:>4} {fmt(r['p50'], '{:.3f}'):>8} "
+            f"{fmt(r['p95'], '{:.3f}'):>8} {fmt(r['jobs_per_min'], '{:.1f}'):>9} {fmt(r['peak_rss_mb'], '{:.1f}'):>8}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Офлайн-бенчмарки AI Audio Studio")
+    p.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="сценарій (можна кілька)")
+    p.add_argument("-n", "--iterations", type=int, default=3)
+    p.add_argument("--clients", type=int, default=8, help="паралельних клієнтів для web_load")
+    p.add_argument("--sequential", action="store_true", help="story без конвеєра LLM→TTS")
+    p.add_argument("--no-llm-stream", action="store_true", help="rewrite/web_load: чекати повну відповідь ШІ перед TTS")
+    p.add_argument("--llm-latency", type=float, default=0.5)
+    p.add_argument("--llm-per-kchar", type=float, default=0.0)
+    p.add_argument("--story-parts", type=int, default=40)
+    p.add_argument("--tts-ttfb", type=float, default=0.15)
+    p.add_argument("--tts-cps", type=float, default=1500.0, help="швидкість TTS, символів/с")
+    p.add_argument("--chunk-size", type=int, default=4096)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--genaipro-delay", type=float, default=1.0)
+    p.add_argument("--startup-target-ms", type=float, default=1500.0, help="ціль холодного старту")
+    p.add_argument("--json", action="store_true", help="(внутрішнє) вивести результат одного сценарію як JSON")
+    p.add_argument("--out", help="дописати звіт у файл")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    names = args.scenario or list(SCENARIOS)
+
+    if args.json:
+        print(json.dumps(run_one(names[0], args)))
+        return
+
+    passthrough = [a for a in argv if a not in names]
+    passthrough = [a for i, a in enumerate(passthrough) if a not in ("-s", "--scenario")]
+    results = []
+    for name in names:
+        print(f"▶ {name}...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--json", "-s", name, *passthrough],
+            cwd=ROOT, stdout=subprocess.PIPE, text=True,
+        )
+        if proc.returncode != 0:
+            results.append({"scenario": name, "error": f"exit code {proc.returncode}"})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    text = report(results)
+    print(text)
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,28 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog
 import os
-import threading
 import asyncio
 import datetime
+import uuid
 import json
-import requests
-import time
+import shutil
+import tempfile
 import platform
-import queue  # <--- ВАЖЛИВО: Імпорт черги
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from openai import OpenAI
-import edge_tts
+from tts_engine import synthesize_segments, segments_from_stream, iterate_in_thread
+from audio_cache import get_audio_cache
+from llm_cache import get_llm_cache, cached_call, cached_stream
+import metrics
+import mp3_index
+import providers
+import rate_limiter
+from singleflight import SingleFlight
+from tts_failover import speak, failover, plan
+from story_journal import StoryJournal
+from story_context import StoryContext
+from story_text import StoryFile, clean_part
+from task_scheduler import TaskScheduler, ACTIVE
+from voice_catalog import get_voice_catalog, MULTILINGUAL
 
 # --- КОНФІГУРАЦІЯ ---
 load_dotenv()
@@ -23,18 +32,37 @@ GROK_API_KEY = os.getenv("GROK_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
 GENAIPRO_API_KEY = os.getenv("GENAIPRO_API_KEY")
 
-GENAIPRO_BASE_URL = "https://genaipro.vn/api/v1"
-GENAIPRO_TASK_URL = f"{GENAIPRO_BASE_URL}/labs/task"
-GENAIPRO_VOICES_URL = f"{GENAIPRO_BASE_URL}/labs/voices" 
-
 SETTINGS_FILE = "settings.json"
 
-# Налаштування безпеки
+# Підпис провайдера в списку голосів
+VOICE_SUFFIXES = {"edge": "Edge Free", "genaipro": "GenAI", "openai": "OpenAI"}
+# Мітки голосів до каталогу (без прапорця) — задачі в журналі могли зберегти саме їх
+LEGACY_VOICE_LABELS = {
+    "Christopher (Edge Free)": "edge|en-US-ChristopherNeural",
+    "Jenny (Edge Free)": "edge|en-US-JennyNeural",
+    "Ostap (Edge Free)": "edge|uk-UA-OstapNeural",
+    "Conrad (Edge Free)": "edge|de-DE-ConradNeural",
+    "Konrad (Germany)": "genaipro|NlRO8ABjJNJNYaRaLiPJ",
+    "Alloy (OpenAI)": "openai|alloy",
+    "Killian (Edge Free)": "edge|de-DE-KillianNeural",
+}
+ALL_LANGUAGES = "Усі мови"
+
+# Скільки частин історії озвучується одночасно в конвеєрному режимі
+PART_TTS_CONCURRENCY = 2
+
+# Параметри озвучки, що входять у ключ кешу аудіо
+TTS_CACHE_PARAMS = {
+    "openai": {"model": "tts-1"},
+    "genaipro": {"model": "eleven_multilingual_v2", "speed": 1, "style": 0.5},
+}
+
+# Налаштування безпеки (рядкові назви — щоб не імпортувати SDK Gemini на старті)
 SAFETY_SETTINGS = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
 }
 
 ctk.set_appearance_mode("Light")
@@ -75,18 +103,16 @@ class AudioApp(ctk.CTk):
         else:
             self.flags = {"US": "🇺🇸", "UA": "🇺🇦", "DE": "🇩🇪", "AI": "🤖", "VN": "🇻🇳"}
 
-        self.voices_map = {
-            f"{self.flags['US']} Christopher (Edge Free)": "edge|en-US-ChristopherNeural",
-            f"{self.flags['US']} Jenny (Edge Free)": "edge|en-US-JennyNeural",
-            f"{self.flags['UA']} Ostap (Edge Free)": "edge|uk-UA-OstapNeural",
-            f"{self.flags['DE']} Conrad (Edge Free)": "edge|de-DE-ConradNeural",
-            f"{self.flags['VN']} Konrad (Germany)": "genaipro|NlRO8ABjJNJNYaRaLiPJ",
-            f"{self.flags['AI']} Alloy (OpenAI)": "openai|alloy",
-            f"{self.flags['DE']} Killian (Edge Free)": "edge|de-DE-KillianNeural"
-        }
-        
+        # Голоси — з каталогу (диск + вбудовані), мережа лише у фоні: старт вікна її не чекає
+        self.voice_catalog = get_voice_catalog()
+        self.build_voices_map()
+
         self.combo_voice = ctk.CTkComboBox(self.settings_frame, values=list(self.voices_map.keys()), width=200)
         self.combo_voice.grid(row=1, column=1, padx=10, pady=10)
+        # Фільтр за мовою: повний каталог Edge — сотні голосів, в одному списку ними не вибереш
+        self.combo_language = ctk.CTkComboBox(self.settings_frame, width=110, command=self.filter_voices,
+                                              values=[ALL_LANGUAGES] + self.voice_catalog.languages())
+        self.combo_language.grid(row=1, column=2, padx=10, pady=10)
         self.restore_voice_selection()
 
         # 2. Назва папки/файлу
@@ -127,15 +153,32 @@ class AudioApp(ctk.CTk):
         self.lbl_status.pack(pady=5)
         self.progressbar = ctk.CTkProgressBar(self, mode="indeterminate")
 
-        if GENAIPRO_API_KEY:
-            threading.Thread(target=self.fetch_genaipro_voices, daemon=True).start()
+        self.voice_catalog.refresh_in_background(on_done=lambda changed: changed and self.after(0, self.reload_voices))
+
+        # 5. Список задач (кожна зі своїм статусом)
+        self.tasks_frame = ctk.CTkScrollableFrame(self, height=140, label_text="Задачі")
+        self.tasks_frame.pack(pady=5, padx=20, fill="x")
+        self.btn_clear_tasks = ctk.CTkButton(self, text="Очистити завершені", width=140, height=25,
+                                             fg_color="#DDDDDD", text_color="black", hover_color="#BBBBBB",
+                                             command=self.clear_finished_tasks)
+        self.btn_clear_tasks.pack(pady=(0, 5), padx=20, anchor="e")
+        self.task_rows = {}  # id задачі → (рядок, мітка повідомлення, статус, для якого збудовано кнопки)
+        self.task_order = []
 
         # === ІНІЦІАЛІЗАЦІЯ ЧЕРГИ ===
-        self.task_queue = queue.Queue() # Створюємо чергу
-        self.is_processing = False      # Прапорець для відстеження стану
-        
-        # Запускаємо фоновий процес, який буде "їсти" задачі з черги
-        threading.Thread(target=self.queue_worker, daemon=True).start()
+        # Планувальник виконує кілька задач одночасно на одному event loop
+        # Журнал на диску: задачі переживають перезапуск, історії продовжуються з останньої частини
+        self.journal = StoryJournal()
+        # Однакові задачі (той самий текст, модель і голос) в черзі одночасно генеруються один раз
+        self.generations = SingleFlight("task")
+        self.scheduler = TaskScheduler(self.run_task, on_change=lambda: self.after(0, self.refresh_tasks))
+        self.scheduler.start()
+        for task_id, name, data, status in self.journal.unfinished_tasks():
+            if status == "error":
+                # Впалі не запускаються самі — лишаються в списку з кнопкою повтору
+                self.scheduler.add_failed(name, data, task_id=task_id, message="❌ Помилка до перезапуску")
+            else:
+                self.scheduler.submit(name, data, task_id=task_id, message="♻️ Відновлено після перезапуску")
 
     def setup_story_tab(self):
         """Елементи для вкладки створення історії"""
@@ -148,6 +191,17 @@ class AudioApp(ctk.CTk):
         btn_paste = ctk.CTkButton(self.tab_story, text="Вставити", width=80, height=25, command=lambda: self.paste_to_widget(self.textbox_story))
         btn_paste.pack(pady=5, anchor="e")
 
+        # Конвеєр: озвучка частин паралельно з генерацією наступних
+        self.chk_pipeline = ctk.CTkCheckBox(self.tab_story, text="Озвучувати частини одразу (паралельно з генерацією)")
+        self.chk_pipeline.pack(pady=5, anchor="w")
+        if self.saved_settings.get("pipeline", True):
+            self.chk_pipeline.select()
+
+        self.chk_compact = ctk.CTkCheckBox(self.tab_story, text="Стислий контекст (підсумок + останні частини)")
+        self.chk_compact.pack(pady=5, anchor="w")
+        if self.saved_settings.get("compact_context", True):
+            self.chk_compact.select()
+
     def setup_rewrite_tab(self):
         """Елементи для вкладки рерайту"""
         # Інструкція
@@ -167,6 +221,18 @@ class AudioApp(ctk.CTk):
         btn_paste = ctk.CTkButton(self.tab_rewrite, text="Вставити", width=80, height=25, command=lambda: self.paste_to_widget(self.textbox_rewrite))
         btn_paste.pack(pady=5, anchor="e")
 
+        # Кеш відповідей ШІ: повторний рерайт того ж тексту не платить за Gemini ще раз
+        self.chk_llm_cache = ctk.CTkCheckBox(self.tab_rewrite, text="Використати кеш ШІ (не перегенеровувати той самий текст)")
+        self.chk_llm_cache.pack(pady=5, anchor="w")
+        if self.saved_settings.get("llm_cache"):
+            self.chk_llm_cache.select()
+
+        # Потік: озвучка починається з перших речень, поки ШІ дописує решту
+        self.chk_stream_llm = ctk.CTkCheckBox(self.tab_rewrite, text="Озвучувати по мірі генерації (потоково)")
+        self.chk_stream_llm.pack(pady=5, anchor="w")
+        if self.saved_settings.get("stream_llm", True):
+            self.chk_stream_llm.select()
+
     # --- ЛОГІКА ЧЕРГИ ТА ЗАПУСКУ ---
 
     def start_process(self):
@@ -185,7 +251,8 @@ class AudioApp(ctk.CTk):
             if not prompt:
                 self.lbl_status.configure(text="❌ Помилка: Промпт історії порожній!", text_color="red")
                 return
-            process_data = {"mode": "story", "prompt": prompt}
+            process_data = {"mode": "story", "prompt": prompt, "pipelined": bool(self.chk_pipeline.get()),
+                            "compact_context": bool(self.chk_compact.get())}
             
             # Очищаємо текст, щоб можна було писати наступний
             self.textbox_story.delete("1.0", "end")
@@ -196,170 +263,415 @@ class AudioApp(ctk.CTk):
             if not source_text:
                 self.lbl_status.configure(text="❌ Помилка: Немає тексту для рерайту!", text_color="red")
                 return
-            process_data = {"mode": "rewrite", "instruction": instruction, "text": source_text}
+            process_data = {"mode": "rewrite", "instruction": instruction, "text": source_text,
+                            "use_llm_cache": bool(self.chk_llm_cache.get()),
+                            "stream_llm": bool(self.chk_stream_llm.get())}
             
             # Очищаємо текст
             self.textbox_rewrite.delete("1.0", "end")
 
         self.save_settings()
 
-        # Формуємо задачу та кладемо в чергу
-        task = {
-            "data": process_data,
-            "filename": filename
-        }
-        self.task_queue.put(task)
+        # Модель і голос фіксуємо в момент додавання — задачі виконуються паралельно.
+        # Голос — стабільним ключем "провайдер|id": мітки в списку змінюються разом з каталогом
+        process_data["model"] = self.combo_model.get()
+        process_data["voice"] = self.voices_map[self.combo_voice.get()]
+
+        # Формуємо задачу та кладемо в чергу (спершу в журнал, щоб вона пережила перезапуск)
+        task_id = uuid.uuid4().hex[:8]
+        self.journal.add_task(task_id, filename, process_data)
+        self.scheduler.submit(filename, process_data, task_id=task_id)
 
         # Візуальний ефект: кнопка блимає зеленим
         original_color = self.btn_generate.cget("fg_color")
         self.btn_generate.configure(text="✅ ДОДАНО В ЧЕРГУ", fg_color="green")
         self.after(1000, lambda: self.btn_generate.configure(text="ДОДАТИ В ЧЕРГУ", fg_color=original_color))
 
-        # Оновлення статусу
-        q_size = self.task_queue.qsize()
-        self.lbl_status.configure(text=f"📥 В черзі задач: {q_size}. Обробка йде...", text_color="blue")
-        
-        # Якщо воркер спав, показуємо прогрес-бар (воркер сам його вимкне, коли все зробить)
-        if not self.is_processing:
-            self.progressbar.pack(pady=5, padx=50, fill="x")
-            self.progressbar.start()
-
-    def queue_worker(self):
-        """Вічний цикл, який обробляє задачі одну за одною"""
-        print("--- WORKER STARTED ---")
-        while True:
-            try:
-                # Чекаємо на задачу. Цей рядок блокує потік, поки черга пуста.
-                task_data = self.task_queue.get()
-                
-                process_data = task_data["data"]
-                filename = task_data["filename"]
-                
-                self.is_processing = True
-                print(f"--- Processing: {filename} ---")
-                
-                self.update_status(f"⏳ Обробляю: {filename}...", "blue")
-                
-                # Запускаємо важку роботу
-                if platform.system() == 'Windows':
-                    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-                asyncio.run(self.async_pipeline(process_data, filename))
-                
-            except Exception as e:
-                print(f"ERROR IN WORKER: {e}")
-                self.show_error(f"Помилка в черзі: {str(e)}")
-            finally:
-                # Позначаємо задачу як виконану, незалежно від успіху чи помилки
-                if 'task_data' in locals():
-                    self.task_queue.task_done()
-                
-                # Перевіряємо, чи черга пуста
-                if self.task_queue.empty():
-                    self.is_processing = False
-                    self.update_status("✅ Всі задачі виконано!", "green")
-                    self.after(0, lambda: self.progressbar.stop())
-                    self.after(0, lambda: self.progressbar.pack_forget())
+    async def run_task(self, task):
+        """Виконує одну задачу з черги (викликається планувальником)."""
+        status = lambda m, c: self.scheduler.set_status(task, m, c)
+        self.journal.set_status(task.id, "running")
+        try:
+            with metrics.JobTimer(task.name).activate(), metrics.span("task"):
+                data = task.data
+                run = lambda: self.async_pipeline(data, task.name, status, task_id=task.id)
+                if data["mode"] == "rewrite":
+                    # Схлопуємо лише рерайт: результат залежить тільки від входу. Історія щоразу
+                    # нова (як і в кеші ШІ), тож однакові промпти — окремі історії
+                    key = SingleFlight.key(data["mode"], data.get("text"), data.get("instruction"),
+                                           data.get("model"), data.get("voice"))
+                    folder, shared = await self.generations.do_async(
+                        key, run,
+                        on_wait=lambda: status("🔗 Така сама задача вже виконується — чекаю її результат", "blue"),
+                    )
+                    if shared:
+                        await asyncio.to_thread(self.copy_result, folder, task.name, task.id)
                 else:
-                    q_size = self.task_queue.qsize()
-                    self.update_status(f"✅ Готово. В черзі ще: {q_size}", "blue")
+                    await run()
+        except asyncio.CancelledError:
+            self.journal.set_status(task.id, "cancelled")
+            raise
+        except Exception:
+            self.journal.set_status(task.id, "error")
+            raise
+        self.journal.set_status(task.id, "done")
+
+    def cancel_task(self, task_id):
+        self.scheduler.cancel(task_id)
+        self.journal.set_status(task_id, "cancelled")
+
+    def clear_finished_tasks(self):
+        # Прибрані впалі задачі не мають повертатися після перезапуску
+        self.journal.dismiss(self.scheduler.clear_finished())
+
+    def retry_task(self, task_id):
+        self.journal.set_status(task_id, "queued")
+        self.scheduler.retry(task_id)
+
+    def _task_row(self, task):
+        """Рядок задачі: назва, повідомлення і кнопки для її статусу. Повертає (рядок, мітка, статус)."""
+        row = ctk.CTkFrame(self.tasks_frame, fg_color="transparent")
+        ctk.CTkLabel(row, text=task.name, width=140, anchor="w", font=("Arial", 12, "bold")).pack(side="left")
+        message = ctk.CTkLabel(row, text=task.message, text_color=task.color, anchor="w")
+        message.pack(side="left", fill="x", expand=True)
+        if task.status in ACTIVE:
+            ctk.CTkButton(row, text="✕", width=28, height=24, fg_color="#CC3333",
+                          command=lambda t=task.id: self.cancel_task(t)).pack(side="right", padx=2)
+        if task.status == "error":
+            ctk.CTkButton(row, text="🔁", width=28, height=24,
+                          command=lambda t=task.id: self.retry_task(t)).pack(side="right", padx=2)
+        if task.status == "queued":
+            ctk.CTkButton(row, text="↓", width=28, height=24,
+                          command=lambda t=task.id: self.scheduler.move(t, 1)).pack(side="right", padx=2)
+            ctk.CTkButton(row, text="↑", width=28, height=24,
+                          command=lambda t=task.id: self.scheduler.move(t, -1)).pack(side="right", padx=2)
+        return row, message, task.status
+
+    def refresh_tasks(self):
+        """Оновлює список задач на місці: у наявних рядках міняється лише текст повідомлення,
+        перебудовується тільки рядок, у якого змінився статус (інші кнопки)."""
+        tasks = self.scheduler.snapshot()
+        alive = {task.id for task in tasks}
+        for task_id in [t for t in self.task_rows if t not in alive]:
+            self.task_rows.pop(task_id)[0].destroy()
+
+        order = []
+        for task in tasks:
+            row = self.task_rows.get(task.id)
+            if row is not None and row[2] == task.status:
+                row[1].configure(text=task.message, text_color=task.color)
+            else:
+                if row is not None:
+                    row[0].destroy()
+                self.task_rows[task.id] = self._task_row(task)
+                self.task_order = None  # новий рядок — перепакувати в потрібне місце
+            order.append(task.id)
+        if order != self.task_order:
+            for task_id in order:
+                self.task_rows[task_id][0].pack_forget()
+            for task_id in order:
+                self.task_rows[task_id][0].pack(fill="x", pady=1)
+            self.task_order = order
+
+        running = sum(1 for t in tasks if t.status == "running")
+        queued = sum(1 for t in tasks if t.status == "queued")
+        if running or queued:
+            self.lbl_status.configure(text=f"⏳ Виконується: {running}, в черзі: {queued}", text_color="blue")
+            if not self.progressbar.winfo_ismapped():
+                self.progressbar.pack(pady=5, padx=50, fill="x", before=self.tasks_frame)
+                self.progressbar.start()
+        else:
+            if tasks:
+                self.lbl_status.configure(text="✅ Всі задачі виконано!", text_color="green")
+            self.progressbar.stop()
+            self.progressbar.pack_forget()
 
     # --- ГЕНЕРАЦІЯ ---
 
-    async def async_pipeline(self, data, filename):
+    async def async_pipeline(self, data, filename, status=None, task_id=None):
+        status = status or self.update_status
+        slot = self.scheduler.slot
         try:
-            model_choice = self.combo_model.get()
-            voice_choice = self.combo_voice.get()
+            model_choice = data.get("model") or self.combo_model.get()
+            voice_choice = data.get("voice") or self.voices_map[self.combo_voice.get()]
             
             if "Pro" in model_choice:
                 api_model = 'gemini-2.5-pro'
             else:
                 api_model = 'gemini-2.5-flash'
 
-            model = genai.GenerativeModel(api_model)
-            full_story_text = ""
+            model = providers.get("gemini").GenerativeModel(api_model)
+            story_text = ""
+
+            voice_key = self.voice_key(voice_choice)
+            if not voice_key:
+                raise Exception(f"Невідомий голос: {voice_choice}")
+            provider, voice_id = voice_key.split("|", 1)
+            self.check_provider(provider)
+
+            target_folder = self.task_folder(filename, task_id)
+            text_path = os.path.join(target_folder, "story.txt")
+            audio_path = os.path.join(target_folder, "audio.mp3")
+
+            # Конвеєр: кожна готова частина історії одразу йде в озвучку
+            pipelined = data["mode"] == "story" and data.get("pipelined", True)
+            part_tasks = []
+            parts_dir = None
+            voiced = False  # аудіо вже записане під час генерації тексту
+            voiced_seconds = 0.0  # тривалість уже озвучених частин (з заголовків кадрів, без декодування)
+            if pipelined:
+                os.makedirs(target_folder, exist_ok=True)
+                parts_dir = tempfile.mkdtemp(prefix=".parts_", dir=target_folder)
+                tts_slots = asyncio.Semaphore(PART_TTS_CONCURRENCY)
+
+                async def voice_part(index, text):
+                    nonlocal voiced_seconds
+                    part_path = os.path.join(parts_dir, f"{index:03d}.mp3")
+                    async with tts_slots:
+                        await self.synthesize(provider, voice_id, text, part_path, status=status)
+                    voiced_seconds += await asyncio.to_thread(mp3_index.duration, part_path)
+                    return part_path
 
             # === ЛОГІКА ГЕНЕРАЦІЇ ===
             
-            if data["mode"] == "rewrite":
-                self.update_status(f"🤖 Переписую текст ({filename})...", "blue")
-                
-                instruction = data.get("instruction", "Rewrite this text.")
-                source_text = data.get("text", "")
-                
-                final_prompt = f"INSTRUCTION:\n{instruction}\n\nSOURCE TEXT TO REWRITE:\n{source_text}"
-                
-                response = model.generate_content(final_prompt, safety_settings=SAFETY_SETTINGS)
-                full_story_text = response.text.strip()
-                
-            else:
-                self.update_status(f"🤖 Пишу історію Loop ({filename})...", "blue")
-                chat = model.start_chat(history=[])
-                current_msg = data["prompt"]
-                part_count = 0
-                
-                while True:
-                    part_count += 1
-                    self.update_status(f"🤖 Генерація ({filename}) частини {part_count}...", "blue")
-                    
-                    response = chat.send_message(current_msg, safety_settings=SAFETY_SETTINGS)
-                    raw_text = response.text.strip()
-                    
-                    clean_text = raw_text
-                    is_end = False
-                    if "END" in clean_text:
-                        clean_text = clean_text.replace("END", "")
-                        is_end = True
+            try:
+                if data["mode"] == "rewrite":
+                    status(f"🤖 Переписую текст ({filename})...", "blue")
                     
-                    clean_text = clean_text.replace("Type 'Continue' to receive the next part.", "")
-                    clean_text = clean_text.replace("Type “Continue” to receive the next part.", "")
-                    clean_text = clean_text.replace("Type Continue to receive the next part.", "")
-                    clean_text = clean_text.replace("Type ‘Continue’ to receive the next part.", "")
+                    instruction = data.get("instruction", "Rewrite this text.")
+                    source_text = data.get("text", "")
                     
-                    full_story_text += clean_text + "\n"
+                    final_prompt = f"INSTRUCTION:\n{instruction}\n\nSOURCE TEXT TO REWRITE:\n{source_text}"
                     
-                    if is_end or part_count > 40:
-                        break
+                    def call():
+                        response = rate_limiter.call("gemini", model.generate_content, final_prompt, safety_settings=SAFETY_SETTINGS)
+                        return response.text.strip()
+
+                    # Кеш ШІ вмикається галочкою на вкладці Rewrite
+                    cache = get_llm_cache() if data.get("use_llm_cache") else None
+                    if data.get("stream_llm"):
+                        # Речення йдуть в озвучку, щойно Gemini їх дописав: час ≈ max(ШІ, TTS), а не сума
+                        def stream():
+                            request = lambda: model.generate_content(final_prompt, safety_settings=SAFETY_SETTINGS, stream=True)
+                            for chunk in rate_limiter.stream("gemini", request):
+                                if chunk.parts:
+                                    yield chunk.text
+
+                        pieces = []
+
+                        def collect():
+                            for piece in cached_stream(cache, api_model, final_prompt, stream, safety_settings=SAFETY_SETTINGS):
+                                pieces.append(piece)
+                                yield piece
+
+                        os.makedirs(target_folder, exist_ok=True)
+                        async with slot("gemini"):
+                            with metrics.span("llm_tts_stream", provider=provider):
+                                await synthesize_segments(
+                                    segments_from_stream(iterate_in_thread(collect)), audio_path,
+                                    concurrency=PART_TTS_CONCURRENCY,
+                                    synth=lambda text, part_path: self.synthesize(provider, voice_id, text, part_path, status=status),
+                                    on_progress=lambda done, total: status(
+                                        f"🎙️ Аудіо {filename}: {done}/{total} сегм. (ШІ ще пише)", "blue"),
+                                )
+                        story_text = "".join(pieces).strip()
+                        voiced = True
+                    else:
+                        async with slot("gemini"):
+                            with metrics.span("llm", provider="gemini"):
+                                story_text = await asyncio.to_thread(
+                                    cached_call, cache, api_model, final_prompt, call, safety_settings=SAFETY_SETTINGS,
+                                )
                     
-                    current_msg = "Continue"
-                    time.sleep(1)
+                else:
+                    status(f"🤖 Пишу історію Loop ({filename})...", "blue")
+                    os.makedirs(target_folder, exist_ok=True)
+
+                    # Відновлення з журналу: готові частини не генеруються повторно
+                    parts = self.journal.load_parts(task_id) if task_id else []
+                    # Стислий контекст: промпт + підсумок + останні частини замість усієї історії
+                    context = None
+                    if data.get("compact_context"):
+                        summarized, summary = self.journal.get_summary(task_id) if task_id else (0, "")
+                        context = StoryContext.from_parts(data["prompt"], parts, summary, summarized)
+                    else:
+                        chat = model.start_chat(history=StoryJournal.chat_history(parts))
+                    # Текст історії не збирається в пам'яті: частини дописуються в story.txt,
+                    # а озвучка без конвеєра читає його звідти шматками (StoryFile)
+                    with StoryFile(text_path) as story_file:
+                        story_text = story_file
+                        for part in parts:
+                            story_file.write(part["text"])
+                            if pipelined and part["text"].strip():
+                                part_tasks.append(asyncio.ensure_future(voice_part(len(part_tasks), part["text"])))
+                        if parts:
+                            status(f"♻️ Продовжую з частини {len(parts) + 1} ({filename})", "blue")
+
+                        current_msg = "Continue" if parts else data["prompt"]
+                        part_count = len(parts)
+                        is_end = bool(parts) and (parts[-1]["is_end"] or part_count > 40)
+
+                        while not is_end:
+                            part_count += 1
+                            # Озвучка якоїсь частини вже впала — далі генерувати текст марно
+                            for t in part_tasks:
+                                if t.done() and not t.cancelled() and t.exception():
+                                    raise t.exception()
+                            voiced_parts = sum(1 for t in part_tasks if t.done())
+                            status(f"🤖 Генерація ({filename}) частини {part_count}... "
+                                   f"(озвучено: {voiced_parts}, {mp3_index.format_duration(voiced_seconds)})", "blue")
+                            if context is not None:
+                                chat = model.start_chat(history=context.history())
+                            
+                            # send_message блокуючий — виносимо в потік, щоб не стопорити озвучку.
+                            # Паузу між частинами задає спільний лімітер (замість фіксованої секунди)
+                            async with slot("gemini"):
+                                with metrics.span("story_part", provider="gemini"):
+                                    response = await asyncio.to_thread(
+                                        rate_limiter.call, "gemini", chat.send_message, current_msg,
+                                        safety_settings=SAFETY_SETTINGS,
+                                    )
+                            usage = getattr(response, "usage_metadata", None)
+                            if usage is not None:
+                                metrics.observe("llm_prompt_tokens", usage.prompt_token_count, provider="gemini",
+                                                context="compact" if context is not None else "full")
+                            raw_text = response.text.strip()
+                            clean_text, found_end = clean_part(raw_text)
+                            is_end = is_end or found_end
+
+                            # Чекпоінт: спершу журнал, потім story.txt
+                            if task_id:
+                                self.journal.add_part(task_id, part_count - 1, current_msg, raw_text, clean_text,
+                                                      is_end or part_count > 40)
+                            story_file.write(clean_text)
+
+                            if context is not None:
+                                context.add(current_msg, raw_text)
+                                if context.needs_summary() and not is_end:
+                                    await self.update_story_summary(model, context, task_id, slot)
+
+                            if pipelined and clean_text.strip():
+                                part_tasks.append(asyncio.ensure_future(voice_part(len(part_tasks), clean_text)))
+                            
+                            if part_count > 40:
+                                break
+                            
+                            current_msg = "Continue"
+
+                if not (story_text.chars if isinstance(story_text, StoryFile) else story_text.strip()):
+                    raise Exception("AI повернув порожній текст.")
+
+                # === ЗБЕРЕЖЕННЯ ТА ОЗВУЧКА ===
+                
+                if data["mode"] == "rewrite":
+                    os.makedirs(target_folder, exist_ok=True)
+                    with open(text_path, "w", encoding="utf-8") as f:
+                        f.write(story_text)
+
+                if pipelined:
+                    status(f"🎙️ Доозвучую частини {filename}...", "blue")
+                    part_paths = await asyncio.gather(*part_tasks)
+                    # Склеювання по межах кадрів: без зайвих ID3/Xing, тривалість — безкоштовно.
+                    # Пишемо в тимчасовий файл і підміняємо — обірваний запис не лишить битий mp3
+                    tmp_audio = audio_path + ".tmp"
+                    try:
+                        await asyncio.to_thread(mp3_index.concat, part_paths, tmp_audio)
+                        os.replace(tmp_audio, audio_path)
+                    finally:
+                        if os.path.exists(tmp_audio):
+                            os.remove(tmp_audio)
+                elif not voiced:
+                    status(f"🎙️ Генерую аудіо для {filename}...", "blue")
+                    await self.synthesize(
+                        provider, voice_id, story_text, audio_path, status=status,
+                        on_progress=lambda done, total: status(
+                            f"🎙️ Аудіо {filename}: {done}/{total} сегм.", "blue"),
+                    )
+            finally:
+                for t in part_tasks:
+                    t.cancel()
+                await asyncio.gather(*part_tasks, return_exceptions=True)
+                if parts_dir:
+                    shutil.rmtree(parts_dir, ignore_errors=True)
 
-            if not full_story_text.strip():
-                raise Exception("AI повернув порожній текст.")
+            seconds = await asyncio.to_thread(mp3_index.duration, audio_path)
+            metrics.observe("audio_duration_seconds", seconds, provider=provider)
+            print(f"✅ {filename}: аудіо {mp3_index.format_duration(seconds)}")
 
-            # === ЗБЕРЕЖЕННЯ ТА ОЗВУЧКА ===
-            
+            # Підсумок по етапах (LLM / TTS / запис) поруч зі story.txt
+            timer = metrics.current_timer()
+            if timer is not None:
+                timer.save(os.path.join(target_folder, "timings.json"))
+
+            # Відкриваємо папку після завершення
+            self.after(0, lambda: self.open_folder(target_folder))
+            return target_folder
+
+        except Exception as e:
+            # Прокидаємо помилку вгору, щоб її зловив worker
+            raise e
+
+    def task_folder(self, filename, task_id=None):
+        """Папка результатів задачі; після перезапуску — та сама, що й до нього (з журналу)."""
+        target_folder = self.journal.get_folder(task_id) if task_id else None
+        if not target_folder:
             timestamp = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
             base_path = self.saved_settings.get("download_path", os.getcwd())
             folder_name = f"{filename}_{timestamp}"
             target_folder = os.path.join(base_path, folder_name)
-            os.makedirs(target_folder, exist_ok=True)
+            if task_id:
+                self.journal.set_folder(task_id, target_folder)
+        return target_folder
+
+    def copy_result(self, source_folder, filename, task_id=None):
+        """Результат схлопнутої задачі: копія story.txt і audio.mp3 з папки задачі, яка їх згенерувала."""
+        target_folder = self.task_folder(filename, task_id)
+        os.makedirs(target_folder, exist_ok=True)
+        for name in ("story.txt", "audio.mp3"):
+            source = os.path.join(source_folder, name)
+            if os.path.exists(source):
+                shutil.copy2(source, os.path.join(target_folder, name))
+        self.after(0, lambda: self.open_folder(target_folder))
+
+    async def update_story_summary(self, model, context, task_id, slot):
+        """Згортає старі частини історії в підсумок. Якщо ШІ не впорався — контекст просто трохи довший."""
+        prompt, count = context.summary_prompt()
+        try:
+            async with slot("gemini"):
+                with metrics.span("story_summary", provider="gemini"):
+                    response = await asyncio.to_thread(
+                        rate_limiter.call, "gemini", model.generate_content, prompt, safety_settings=SAFETY_SETTINGS,
+                    )
+            summary = response.text.strip()
+        except Exception as e:
+            print(f"⚠️ Не вдалося оновити підсумок історії: {e}")
+            return
+        if not summary:
+            return
+        context.apply_summary(summary, count)
+        if task_id:
+            self.journal.set_summary(task_id, context.summarized, context.summary)
 
-            text_path = os.path.join(target_folder, "story.txt")
-            with open(text_path, "w", encoding="utf-8") as f:
-                f.write(full_story_text)
+    def check_provider(self, provider):
+        if provider == "openai" and not OPENAI_API_KEY: raise Exception("Немає OPENAI_API_KEY")
+        if provider == "genaipro" and not GENAIPRO_API_KEY: raise Exception("Немає GENAIPRO_API_KEY")
 
-            self.update_status(f"🎙️ Генерую аудіо для {filename}...", "blue")
-            audio_path = os.path.join(target_folder, "audio.mp3")
-            
-            voice_raw = self.voices_map[voice_choice]
-            provider, voice_id = voice_raw.split("|")
-
-            if provider == "openai":
-                if not self.openai_tts_client: raise Exception("Немає OPENAI_API_KEY")
-                await asyncio.to_thread(self.generate_openai, full_story_text, voice_id, audio_path)
-            elif provider == "genaipro":
-                if not GENAIPRO_API_KEY: raise Exception("Немає GENAIPRO_API_KEY")
-                await asyncio.to_thread(self.generate_genaipro, full_story_text, voice_id, audio_path, self.update_status)
-            else: # Edge
-                communicate = edge_tts.Communicate(full_story_text, voice_id)
-                await communicate.save(audio_path)
+    async def synthesize(self, provider, voice_id, text, path, on_progress=None, status=None):
+        """Озвучує текст обраним провайдером (через кеш аудіо і ліміт провайдера).
 
-            # Відкриваємо папку після завершення
-            self.after(0, lambda: self.open_folder(target_folder))
+        Якщо провайдер впав — пробує еквівалентний голос іншого провайдера (tts_failover).
+        """
+        status = status or self.update_status
 
-        except Exception as e:
-            # Прокидаємо помилку вгору, щоб її зловив worker
-            raise e
+        async def attempt(p, v, tmp_path, on_audio):
+            async def produce():
+                async with self.scheduler.slot(p):
+                    await speak(p, v, text, tmp_path, on_audio, status_callback=status, on_progress=on_progress)
+
+            with metrics.span("tts", provider=p):
+                await get_audio_cache().cached(tmp_path, produce, text, p, v, **TTS_CACHE_PARAMS.get(p, {}))
+
+        await failover(plan(provider, voice_id), attempt, path, notify=lambda msg: status(msg, "orange"))
 
     # --- ДОПОМІЖНІ ФУНКЦІЇ ---
 
@@ -367,66 +679,88 @@ class AudioApp(ctk.CTk):
         try: widget.insert("insert", self.clipboard_get())
         except: pass
 
-    def generate_openai(self, text, voice, path):
-        resp = self.openai_tts_client.audio.speech.create(model="tts-1", voice=voice, input=text)
-        resp.stream_to_file(path)
-
-    def generate_genaipro(self, text, voice, path, status_callback):
-        headers = {"Authorization": f"Bearer {GENAIPRO_API_KEY}", "Content-Type": "application/json"}
-        data = {
-            "input": text[:10000], 
-            "voice_id": voice, 
-            "model_id": "eleven_multilingual_v2",
-            "speed": 1,
-            "style": 0.5
-        }
-        
-        r = requests.post(GENAIPRO_TASK_URL, json=data, headers=headers)
-        if r.status_code != 200: raise Exception(f"GenAI Error: {r.text}")
-        
-        task_id = r.json().get("task_id")
-        check_url = f"{GENAIPRO_TASK_URL}/{task_id}"
-        
-        for i in range(240): # До 8 хвилин очікування 
-            time.sleep(2)
-            r_check = requests.get(check_url, headers=headers)
-            if r_check.status_code == 200:
-                url = r_check.json().get("result")
-                if url:
-                    with open(path, 'wb') as f: f.write(requests.get(url).content)
-                    return
-        raise Exception("GenAI Timeout")
-
     def setup_api(self):
-        if GOOGLE_API_KEY: genai.configure(api_key=GOOGLE_API_KEY)
-        self.openai_tts_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+        # SDK завантажуються у фоні вже після показу вікна (див. providers.py)
+        warm = ["gemini", "edge"] + [p for p, key in (("openai", OPENAI_API_KEY), ("genaipro", GENAIPRO_API_KEY)) if key]
+        self.after(500, lambda: providers.warm_up(warm))
 
     def load_settings(self):
         try: return json.load(open(SETTINGS_FILE, "r", encoding="utf-8")) if os.path.exists(SETTINGS_FILE) else {}
         except: return {}
 
     def save_settings(self):
-        s = {"model": self.combo_model.get(), "voice": self.combo_voice.get(), 
+        s = {"model": self.combo_model.get(), "voice": self.voices_map.get(self.combo_voice.get(), ""), 
              "download_path": self.saved_settings.get("download_path", ""), 
-             "last_filename": self.entry_filename.get()}
+             "last_filename": self.entry_filename.get(),
+             "llm_cache": bool(self.chk_llm_cache.get()),
+             "pipeline": bool(self.chk_pipeline.get()),
+             "compact_context": bool(self.chk_compact.get()),
+             "voice_language": self.combo_language.get(),
+             "stream_llm": bool(self.chk_stream_llm.get())}
         try: json.dump(s, open(SETTINGS_FILE, "w", encoding="utf-8"), indent=4)
         except: pass
 
     def restore_voice_selection(self):
-        v = self.saved_settings.get("voice", "")
+        # У налаштуваннях — ключ "провайдер|id" (старі версії зберігали мітку)
+        v = self.voice_labels.get(self.voice_key(self.saved_settings.get("voice", "")), "")
+        language = self.saved_settings.get("voice_language")
+        if language is None and v in self.voice_info:
+            language = self.voice_info[v]["language"]
+        if language and language != MULTILINGUAL:
+            self.combo_language.set(language)
+            self.filter_voices(language)
         if v in self.voices_map: self.combo_voice.set(v)
 
-    def fetch_genaipro_voices(self):
-        try:
-            h = {"Authorization": f"Bearer {GENAIPRO_API_KEY}"}
-            r = requests.get(f"{GENAIPRO_VOICES_URL}?page_size=100", headers=h)
-            if r.status_code == 200:
-                voices = r.json().get("voices", [])
-                for v in voices:
-                    label = f"{self.flags['VN']} {v.get('name')} (GenAI)"
-                    self.voices_map[label] = f"genaipro|{v.get('voice_id')}"
-                self.after(0, lambda: self.combo_voice.configure(values=list(self.voices_map.keys())))
-        except: pass
+    def voice_flag(self, voice):
+        if voice["provider"] == "openai": return self.flags["AI"]
+        if voice["provider"] == "genaipro": return self.flags["VN"]
+        country = voice["language"].split("-")[-1].upper()
+        if len(country) != 2 or not country.isalpha(): return ""
+        if platform.system() == "Windows": return f"[{country}]"
+        return "".join(chr(0x1F1E6 + ord(c) - ord("A")) for c in country)
+
+    def build_voices_map(self):
+        """Мітка → "провайдер|id" для всіх голосів каталогу (і мітка → запис каталогу, ключ → мітка).
+
+        Однакові мітки (тезки в різних мовах чи в GenAIPro) розрізняються id голосу — жоден не ховається.
+        """
+        voices = self.voice_catalog.find()
+        labels = [f"{self.voice_flag(v)} {v['name']} ({VOICE_SUFFIXES.get(v['provider'], v['provider'])})".strip()
+                  for v in voices]
+        counts = {}
+        for label in labels:
+            counts[label] = counts.get(label, 0) + 1
+        self.voice_info = {}
+        for label, v in zip(labels, voices):
+            self.voice_info[label if counts[label] == 1 else f"{label} [{v['id']}]"] = v
+        self.voices_map = {label: f"{v['provider']}|{v['id']}" for label, v in self.voice_info.items()}
+        self.voice_labels = {key: label for label, key in self.voices_map.items()}
+
+    def voice_key(self, value):
+        """"провайдер|id" для голосу задачі чи налаштувань: ключ як є, мітка — через поточний каталог
+        або старі мітки (задачі з журналу, додані до зміни міток). Невідомий голос — порожній рядок."""
+        if "|" in value:
+            return value
+        if value in self.voices_map:
+            return self.voices_map[value]
+        return LEGACY_VOICE_LABELS.get(value.split(" ", 1)[-1].strip(), "")
+
+    def filter_voices(self, language=None):
+        language = language or self.combo_language.get()
+        labels = [label for label, v in self.voice_info.items()
+                  if language == ALL_LANGUAGES or v["language"] in (language, MULTILINGUAL)]
+        self.combo_voice.configure(values=labels)
+        if labels and self.combo_voice.get() not in labels:
+            self.combo_voice.set(labels[0])
+
+    def reload_voices(self):
+        """Каталог оновився у фоні — перебудовуємо списки, зберігаючи вибір (за ключем: мітка могла змінитись)."""
+        selected = self.voices_map.get(self.combo_voice.get())
+        self.build_voices_map()
+        self.combo_language.configure(values=[ALL_LANGUAGES] + self.voice_catalog.languages())
+        if selected in self.voice_labels:
+            self.combo_voice.set(self.voice_labels[selected])
+        self.filter_voices()
 
     def select_folder(self):
         f = filedialog.askdirectory()
@@ -435,11 +769,6 @@ class AudioApp(ctk.CTk):
     def update_status(self, m, c): 
         self.after(0, lambda: self.lbl_status.configure(text=m, text_color=c))
 
-    def show_error(self, m):
-        def _u():
-            self.lbl_status.configure(text=f"❌ {m}", text_color="red")
-        self.after(0, _u)
-
     def open_folder(self, p):
         try:
             if platform.system() == "Windows": os.startfile(p)
@@ -0,0 +1,75 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import platform
+import threading
+
+# Один довгоживучий event loop на процес (воркер gunicorn) у фоновому потоці.
+# Замість asyncio.run на кожен запит: запити одного воркера ділять loop, поки чекають мережу,
+# а loop не створюється і не закривається щоразу.
+
+_loop = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _serve(loop, ready):
+    asyncio.set_event_loop(loop)
+    loop.call_soon(ready.set)
+    loop.run_forever()
+
+
+def get_loop():
+    """Спільний loop процесу; запускається при першому зверненні (і заново після fork)."""
+    global _loop, _pid
+    with _lock:
+        if _loop is None or _pid != os.getpid():
+            if platform.system() == 'Windows':
+                asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            threading.Thread(target=_serve, args=(loop, ready), daemon=True, name="event-loop").start()
+            ready.wait()
+            _loop, _pid = loop, os.getpid()
+            print("🔁 Спільний event loop запущено")
+        return _loop
+
+
+def _start(coro, future):
+    task = asyncio.ensure_future(coro)
+
+    def done(t):
+        if t.cancelled():
+            future.cancel()
+        elif t.exception() is not None:
+            future.set_exception(t.exception())
+        else:
+            future.set_result(t.result())
+
+    task.add_done_callback(done)
+    future.task = task
+
+
+def submit(coro):
+    """Запускає coro на спільному loop і одразу повертає concurrent.futures.Future.
+
+    contextvars викликаючого потоку (напр. metrics.JobTimer) переносяться в задачу.
+    """
+    loop = get_loop()
+    future = concurrent.futures.Future()
+    # Задача створюється в контексті викликача, тож бачить його contextvars
+    loop.call_soon_threadsafe(_start, coro, future, context=contextvars.copy_context())
+    return future
+
+
+def run(coro, timeout=None):
+    """Блокуючий аналог asyncio.run для потоків Flask/JobManager: чекає coro на спільному loop."""
+    if threading.current_thread().name == "event-loop":
+        raise RuntimeError("event_loop.run() не можна викликати з самого loop — використовуйте await")
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        get_loop().call_soon_threadsafe(lambda: future.task.cancel())
+        raise
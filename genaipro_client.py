@@ -0,0 +1,166 @@
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import mp3_index
+import rate_limiter
+from tts_engine import iter_segments, split_text
+
+GENAIPRO_BASE_URL = "https://genaipro.vn/api/v1"
+GENAIPRO_TASK_URL = f"{GENAIPRO_BASE_URL}/labs/task"
+GENAIPRO_VOICES_URL = f"{GENAIPRO_BASE_URL}/labs/voices"
+
+# Ліміт символів на одну задачу GenAIPro — довший текст ділиться на кілька задач
+MAX_TASK_CHARS = 9000
+MAX_PARALLEL_TASKS = 3
+
+# Адаптивне опитування: починаємо часто, далі рідше
+POLL_FIRST = 1.0
+POLL_MAX = 10.0
+POLL_FACTOR = 1.5
+POLL_TIMEOUT = 480
+
+DOWNLOAD_CHUNK = 256 * 1024
+
+
+class GenAIProClient:
+    """Клієнт GenAIPro з пулом з'єднань (keep-alive) і потоковим завантаженням."""
+
+    def __init__(self, api_key, pool_size=8):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {api_key}"})
+
+    def create_task(self, text, voice, model_id="eleven_multilingual_v2", speed=1, style=0.5):
+        data = {
+            "input": text,
+            "voice_id": voice,
+            "model_id": model_id,
+            "speed": speed,
+            "style": style,
+        }
+        r = self.session.post(GENAIPRO_TASK_URL, json=data, timeout=60)
+        if r.status_code != 200:
+            # HTTPError несе статус і заголовки (Retry-After) для rate_limiter
+            raise requests.HTTPError(f"GenAI Error: {r.text}", response=r)
+        task_id = r.json().get("task_id")
+        if not task_id:
+            # ValueError не повторюється лімітером: без id опитувати нічого
+            raise ValueError(f"GenAI Error: у відповіді немає task_id: {r.text}")
+        return task_id
+
+    def check_task(self, task_id):
+        """Один запит стану задачі. Не-200 — HTTPError: 429/5xx лімітер повторить, інші 4xx — ні."""
+        metrics.inc("genaipro_polls_total")
+        r = self.session.get(f"{GENAIPRO_TASK_URL}/{task_id}", timeout=30)
+        if r.status_code != 200:
+            raise requests.HTTPError(f"GenAI Error: {r.text}", response=r)
+        return r.json()
+
+    def wait_result(self, task_id, timeout=POLL_TIMEOUT):
+        """Чекає на готовий результат, збільшуючи паузу між перевірками. Повертає URL.
+
+        Кожна перевірка йде через rate_limiter: мережевий збій чи 5xx не обривають довгу озвучку.
+        """
+        deadline = time.monotonic() + timeout
+        delay = POLL_FIRST
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(POLL_MAX, delay * POLL_FACTOR)
+            info = rate_limiter.call("genaipro", self.check_task, task_id)
+            if info.get("result"):
+                return info["result"]
+            if info.get("status") in ("failed", "error"):
+                metrics.inc("provider_errors_total", provider="genaipro")
+                raise Exception(f"GenAI Error: {info}")
+        metrics.inc("provider_errors_total", provider="genaipro")
+        raise Exception("GenAI Timeout")
+
+    def download(self, url, path):
+        """Потоково пише файл на диск (без завантаження всього в пам'ять)."""
+        tmp = f"{path}.part"
+        with metrics.span("download", provider="genaipro"), self.session.get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(DOWNLOAD_CHUNK):
+                    f.write(chunk)
+        os.replace(tmp, path)
+
+    def _synthesize_one(self, text, voice, path, params):
+        task_id = rate_limiter.call("genaipro", self.create_task, text, voice, **params)
+        url = self.wait_result(task_id)
+        self.download(url, path)
+
+    def synthesize(self, text, voice, path, status_callback=None, max_parallel=MAX_PARALLEL_TASKS, **params):
+        """Озвучує текст будь-якої довжини: ділить на задачі, виконує паралельно, склеює по порядку.
+
+        text — рядок або ітератор шматків (StoryFile). Наступна задача створюється, лише коли
+        звільнилось місце, тож у пам'яті не більше max_parallel шматків тексту.
+        """
+        if isinstance(text, str):
+            segments = split_text(text, MAX_TASK_CHARS)
+            total = len(segments)
+        else:
+            segments, total = iter_segments(text, MAX_TASK_CHARS), None
+        segments = iter(segments)
+        first = next(segments, None)
+        if first is None:
+            raise ValueError("Text cannot be empty for TTS generation.")
+        second = next(segments, None)
+        if second is None:
+            self._synthesize_one(first, voice, path, params)
+            return
+
+        tmp_dir = tempfile.mkdtemp(prefix=".genai_", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            part_paths = []
+            running = deque()
+            done = 0
+
+            def finish_oldest():
+                nonlocal done
+                running.popleft().result()
+                done += 1
+                if status_callback:
+                    progress = f"{done}/{total}" if total else f"{done}"
+                    status_callback(f"🎙️ GenAIPro: {progress} частин", "blue")
+
+            pool = ThreadPoolExecutor(max_workers=max_parallel)
+            try:
+                for segment in itertools.chain((first, second), segments):
+                    if len(running) >= max_parallel:
+                        finish_oldest()
+                    part_paths.append(os.path.join(tmp_dir, f"{len(part_paths):03d}.mp3"))
+                    running.append(pool.submit(self._synthesize_one, segment, voice, part_paths[-1], params))
+                while running:
+                    finish_oldest()
+            finally:
+                # При помилці не запускаємо задачі, що ще не стартували, і не чекаємо тих, що вже йдуть
+                pool.shutdown(wait=False, cancel_futures=True)
+            tmp_path = os.path.join(tmp_dir, "joined.mp3")
+            mp3_index.concat(part_paths, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def list_voices_page(self, page, page_size=100, etag=None):
+        """Одна сторінка голосів: (voices, total або None, ETag). None — якщо не змінилась (304 на etag)."""
+        headers = {"If-None-Match": etag} if etag else {}
+        r = self.session.get(GENAIPRO_VOICES_URL, params={"page": page, "page_size": page_size},
+                             headers=headers, timeout=30)
+        if r.status_code == 304:
+            return None
+        if r.status_code != 200:
+            raise requests.HTTPError(f"GenAI Error: {r.text}", response=r)
+        data = r.json()
+        return data.get("voices", []), data.get("total"), r.headers.get("ETag")
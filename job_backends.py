@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import providers
+
+# --- НАЛАШТУВАННЯ СПІЛЬНОЇ ЧЕРГИ ---
+# memory — черга в пам'яті процесу: лише для ОДНОГО воркера gunicorn (-w 1). /jobs/<id>, /stream/<id>
+#          і /batch/<id> живуть у пам'яті воркера, тож з кількома воркерами запит на інший дасть 404;
+# sqlite — спільна черга для всіх воркерів одного хоста (файл JOB_DB);
+# redis — спільна черга для кількох нод за балансувальником (REDIS_URL).
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+JOB_DB = os.getenv("JOB_DB", "jobs.sqlite3")
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.2"))
+JOB_QUEUED_TTL = 24 * 3600  # скільки живе в Redis стан задачі, що ще стоїть у черзі, с
+# Оренда задачі (SQLite і Redis): якщо воркер стільки не звітував (save), він вважається мертвим
+# і задача повертається в чергу. Кожне оновлення прогресу продовжує оренду.
+JOB_LEASE = float(os.getenv("JOB_LEASE", str(15 * 60)))
+
+
+class MemoryBackend:
+    """Стан задач, черги і записи в пам'яті процесу; очікування — на Condition, без опитування."""
+
+    def __init__(self):
+        self.cond = threading.Condition(threading.RLock())
+        self.states = {}
+        self.queues = {}
+        self.records = {}
+
+    def enqueue(self, queue, entries, max_pending):
+        """Ставить [(state, task, args)] у чергу: або всі, або жодної. Повертає False, якщо не влазять."""
+        with self.cond:
+            self._prune()
+            pending = self.queues.setdefault(queue, deque())
+            if len(pending) + len(entries) > max_pending:
+                return False
+            for state, task, args in entries:
+                self.states[state["id"]] = state
+                pending.append((state["id"], task, args))
+            self.cond.notify_all()
+            return True
+
+    def claim(self, queue, timeout):
+        """Забирає наступну задачу з черги: (state, task, args) або None, якщо за timeout нічого не з'явилось."""
+        with self.cond:
+            pending = self.queues.setdefault(queue, deque())
+            if not self.cond.wait_for(lambda: pending, timeout=timeout):
+                return None
+            job_id, task, args = pending.popleft()
+            return self.states[job_id], task, args
+
+    def save(self, state, ttl=None):
+        """Зберігає знімок задачі; ttl — для завершених (після нього задачу можна забути)."""
+        with self.cond:
+            self.states[state["id"]] = dict(state, expires_at=time.time() + ttl if ttl else None)
+            self.cond.notify_all()
+
+    def load(self, job_id):
+        with self.cond:
+            state = self.states.get(job_id)
+            return dict(state) if state else None
+
+    def wait_for(self, predicate, timeout):
+        """Чекає, поки predicate() поверне непорожнє значення (або timeout). Повертає останнє значення."""
+        with self.cond:
+            return self.cond.wait_for(predicate, timeout=timeout)
+
+    def put_record(self, kind, key, data, ttl):
+        with self.cond:
+            self.records[(kind, key)] = (data, time.time() + ttl)
+
+    def get_record(self, kind, key, pop=False):
+        with self.cond:
+            entry = self.records.pop((kind, key), None) if pop else self.records.get((kind, key))
+            if entry is None or entry[1] < time.time():
+                return None
+            return entry[0]
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [k for k, s in self.states.items() if (s.get("expires_at") or now) < now]:
+            del self.states[job_id]
+        for key in [k for k, (_, expires_at) in self.records.items() if expires_at < now]:
+            del self.records[key]
+
+
+class _PollingBackend:
+    """Спільне для бекендів поза процесом: очікування опитуванням з кроком POLL_INTERVAL."""
+
+    def wait_for(self, predicate, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            result = predicate()
+            remaining = deadline - time.monotonic()
+            if result or remaining <= 0:
+                return result
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+
+class SQLiteBackend(_PollingBackend):
+    """Черга в SQLite (WAL): спільна для всіх процесів одного хоста. Задачу забирає BEGIN IMMEDIATE."""
+
+    def __init__(self, path=JOB_DB, lease=JOB_LEASE):
+        self.path = path
+        self.lease = lease
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, queue TEXT NOT NULL, status TEXT NOT NULL,"
+                " task TEXT NOT NULL, args TEXT NOT NULL, state TEXT NOT NULL, expires_at REAL, claimed_at REAL)"
+            )
+            # База, створена до оренди задач
+            if "claimed_at" not in [col[1] for col in db.execute("PRAGMA table_info(jobs)")]:
+                db.execute("ALTER TABLE jobs ADD COLUMN claimed_at REAL")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (queue, status)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " kind TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def enqueue(self, queue, entries, max_pending):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                db.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+                db.execute("DELETE FROM records WHERE expires_at < ?", (now,))
+                pending = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'queued'", (queue,)).fetchone()[0]
+                if pending + len(entries) > max_pending:
+                    db.execute("ROLLBACK")
+                    return False
+                db.executemany(
+                    "INSERT INTO jobs (id, queue, status, task, args, state) VALUES (?, ?, 'queued', ?, ?, ?)",
+                    [(s["id"], queue, task, json.dumps(args, ensure_ascii=False), json.dumps(s))
+                     for s, task, args in entries],
+                )
+                db.execute("COMMIT")
+                return True
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def claim(self, queue, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                now = time.time()
+                # Оренда минула — воркер помер посеред задачі; повертаємо її на своє місце в черзі
+                expired = db.execute(
+                    "UPDATE jobs SET status = 'queued' WHERE queue = ? AND status = 'running' AND claimed_at < ?",
+                    (queue, now - self.lease)).rowcount
+                row = db.execute(
+                    "SELECT id, task, args, state FROM jobs WHERE queue = ? AND status = 'queued'"
+                    " ORDER BY rowid LIMIT 1", (queue,)).fetchone()
+                if row:
+                    db.execute("UPDATE jobs SET status = 'running', claimed_at = ? WHERE id = ?", (now, row[0]))
+                db.execute("COMMIT")
+            if expired:
+                print(f"♻️ Черга {queue}: {expired} задач(і) без живого воркера повернуто в чергу")
+            if row:
+                return json.loads(row[3]), row[1], json.loads(row[2])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def save(self, state, ttl=None):
+        with self._connect() as db:
+            now = time.time()
+            db.execute("UPDATE jobs SET status = ?, state = ?, expires_at = ?, claimed_at = ? WHERE id = ?",
+                       (state["status"], json.dumps(state), now + ttl if ttl else None, now, state["id"]))
+
+    def load(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_record(self, kind, key, data, ttl):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO records (kind, key, data, expires_at) VALUES (?, ?, ?, ?)",
+                       (kind, key, json.dumps(data, ensure_ascii=False), time.time() + ttl))
+
+    def get_record(self, kind, key, pop=False):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT data FROM records WHERE kind = ? AND key = ? AND expires_at >= ?",
+                             (kind, key, time.time())).fetchone()
+            if pop:
+                db.execute("DELETE FROM records WHERE kind = ? AND key = ?", (kind, key))
+            db.execute("COMMIT")
+        return json.loads(row[0]) if row else None
+
+
+class RedisBackend(_PollingBackend):
+    """Черга в Redis (LPUSH/BLMOVE): спільна для кількох нод. Стан задачі — JSON з TTL.
+
+    Забрана задача переходить у список processing:<черга> з орендою в хеші leases:<черга>;
+    з processing її знімає фінальний save, а якщо воркер помер — claim повертає її в чергу.
+    """
+
+    def __init__(self, prefix="studio", lease=JOB_LEASE):
+        self.prefix = prefix
+        self.lease = lease
+        self.claimed = {}  # id задачі → (черга, сирий запис у processing) для задач цього процесу
+        self.claimed_lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return providers.get("redis")
+
+    def _key(self, *parts):
+        return ":".join((self.prefix, *parts))
+
+    def enqueue(self, queue, entries, max_pending):
+        # Ліміт м'який: між LLEN і LPUSH інша нода теж може додати задачі
+        if self.redis.llen(self._key("queue", queue)) + len(entries) > max_pending:
+            return False
+        pipe = self.redis.pipeline()
+        for state, task, args in entries:
+            pipe.set(self._key("job", state["id"]), json.dumps(state), ex=JOB_QUEUED_TTL)
+            pipe.lpush(self._key("queue", queue), json.dumps({"id": state["id"], "task": task, "args": args}))
+        pipe.execute()
+        return True
+
+    def _requeue_expired(self, queue):
+        """Записи processing, чия оренда минула (воркер помер), — назад на початок черги."""
+        processing, leases = self._key("processing", queue), self._key("leases", queue)
+        now = time.time()
+        requeued = 0
+        for raw in self.redis.lrange(processing, 0, -1):
+            deadline = self.redis.hget(leases, raw)
+            if deadline is None:
+                # Воркер упав між BLMOVE і записом оренди (або запис щойно забрали) — оренда від зараз
+                self.redis.hsetnx(leases, raw, now + self.lease)
+            elif float(deadline) < now and self.redis.lrem(processing, 1, raw):
+                # LREM атомарний: задачу повертає лише одна нода
+                self.redis.hdel(leases, raw)
+                self.redis.rpush(self._key("queue", queue), raw)
+                requeued += 1
+        if requeued:
+            print(f"♻️ Черга {queue}: {requeued} задач(і) без живого воркера повернуто в чергу")
+
+    def _release(self, queue, raw):
+        self.redis.lrem(self._key("processing", queue), 1, raw)
+        self.redis.hdel(self._key("leases", queue), raw)
+
+    def claim(self, queue, timeout):
+        self._requeue_expired(queue)
+        raw = self.redis.blmove(self._key("queue", queue), self._key("processing", queue),
+                                max(1, int(timeout)), "RIGHT", "LEFT")
+        if raw is None:
+            return None
+        self.redis.hset(self._key("leases", queue), raw, time.time() + self.lease)
+        entry = json.loads(raw)
+        state = self.load(entry["id"])
+        if state is None:
+            self._release(queue, raw)
+            return None  # задача застаріла, поки стояла в черзі
+        with self.claimed_lock:
+            self.claimed[entry["id"]] = (queue, raw)
+        return state, entry["task"], entry["args"]
+
+    def save(self, state, ttl=None):
+        """ttl задають лише для завершеної задачі: тоді її запис знімається з processing."""
+        self.redis.set(self._key("job", state["id"]), json.dumps(state), ex=max(1, int(ttl or JOB_QUEUED_TTL)))
+        with self.claimed_lock:
+            claimed = self.claimed.pop(state["id"], None) if ttl else self.claimed.get(state["id"])
+        if claimed is None:
+            return
+        queue, raw = claimed
+        if ttl:
+            self._release(queue, raw)
+        else:
+            self.redis.hset(self._key("leases", queue), raw, time.time() + self.lease)  # продовжує оренду
+
+    def load(self, job_id):
+        raw = self.redis.get(self._key("job", job_id))
+        return json.loads(raw) if raw else None
+
+    def put_record(self, kind, key, data, ttl):
+        self.redis.set(self._key(kind, key), json.dumps(data, ensure_ascii=False), ex=max(1, int(ttl)))
+
+    def get_record(self, kind, key, pop=False):
+        name = self._key(kind, key)
+        raw = self.redis.getdel(name) if pop else self.redis.get(name)
+        return json.loads(raw) if raw else None
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_backend():
+    """Спільний бекенд процесу за JOB_BACKEND."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            if JOB_BACKEND == "sqlite":
+                _default = SQLiteBackend(JOB_DB)
+            elif JOB_BACKEND == "redis":
+                _default = RedisBackend()
+            elif JOB_BACKEND == "memory":
+                _default = MemoryBackend()
+            else:
+                raise ValueError(f"Невідомий JOB_BACKEND: {JOB_BACKEND}")
+            print(f"🗂️ Черга задач: {JOB_BACKEND}")
+            if JOB_BACKEND == "memory" and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+                print("⚠️ JOB_BACKEND=memory з кількома воркерами: задачі й потоки не видно з інших воркерів — "
+                      "задайте JOB_BACKEND=sqlite (або redis)")
+        return _default
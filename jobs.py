@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+import uuid
+
+import job_backends
+import metrics
+
+# --- НАЛАШТУВАННЯ ФОНОВИХ ЗАДАЧ ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+JOB_KEEP_SECONDS = int(os.getenv("JOB_KEEP_SECONDS", "3600"))
+
+FINISHED = ("done", "error")
+
+
+class JobQueueFull(Exception):
+    """Черга переповнена — нову задачу не приймаємо."""
+
+
+class Job:
+    _FIELDS = ("id", "status", "stage", "progress", "result", "error", "seq",
+               "created_at", "started_at", "finished_at", "timings", "stage_started")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.timings = {}
+        self.stage_started = None
+        self.seq = 0
+        # report() з воркера і on_progress з циклу подій оновлюють ту саму задачу
+        self.lock = threading.Lock()
+
+    def state(self):
+        """Сирий стан для бекенда черги (JSON)."""
+        return {k: getattr(self, k) for k in self._FIELDS}
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls.__new__(cls)
+        for k in cls._FIELDS:
+            setattr(job, k, state.get(k))
+        job.timings = job.timings or {}
+        job.lock = threading.Lock()
+        return job
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "seq": self.seq,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "timings": {k: round(v, 3) for k, v in self.timings.items()},
+        }
+
+
+class JobManager:
+    """Черга фонових задач з обмеженою кількістю воркерів у цьому процесі.
+
+    Стан і сама черга — у бекенді (job_backends): у пам'яті процесу, у SQLite (усі воркери хоста)
+    або в Redis (кілька нод). Задача ставиться за назвою (register), тож її може виконати
+    будь-який процес, де ця назва зареєстрована; аргументи мають серіалізуватися в JSON.
+    """
+
+    def __init__(self, queue="jobs", max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING,
+                 keep_seconds=JOB_KEEP_SECONDS, backend=None):
+        self.queue = queue
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_seconds = keep_seconds
+        self.backend = backend or job_backends.get_backend()
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.workers = []
+
+    def register(self, name, fn):
+        """Реєструє fn(report, *args) під назвою name і запускає воркери процесу."""
+        self.tasks[name] = fn
+        with self.lock:
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, daemon=True,
+                                          name=f"{self.queue}-worker-{len(self.workers)}")
+                self.workers.append(worker)
+                worker.start()
+
+    def submit(self, task, *args):
+        """Ставить задачу task(report, *args) у чергу. Повертає Job одразу."""
+        return self.submit_many(task, [args])[0]
+
+    def submit_many(self, task, args_list):
+        """Ставить у чергу кілька задач: або всі, або жодної (якщо не влазять у чергу)."""
+        batch = [Job() for _ in args_list]
+        entries = [(job.state(), task, list(args)) for job, args in zip(batch, args_list)]
+        if not self.backend.enqueue(self.queue, entries, self.max_pending):
+            raise JobQueueFull("Забагато задач у черзі, спробуйте пізніше.")
+        return batch
+
+    def get(self, job_id):
+        state = self.backend.load(job_id)
+        return Job.from_state(state).to_dict() if state else None
+
+    def wait(self, job_id, seq, timeout=15):
+        """Чекає, поки стан задачі зміниться після seq. Повертає знімок або None."""
+        def changed():
+            state = self.backend.load(job_id)
+            return state if state is None or state["seq"] > seq else None
+
+        if self.backend.load(job_id) is None:
+            return None
+        self.backend.wait_for(changed, timeout)
+        return self.get(job_id)
+
+    def wait_finished(self, job_ids, seen, timeout=15):
+        """Чекає, поки завершиться хоч одна задача з job_ids, якої ще немає в seen.
+
+        Повертає знімки таких задач (порожній список, якщо вийшов timeout).
+        Задачі, яких уже немає в бекенді, повертаються як помилка.
+        """
+        def ready():
+            found = []
+            for job_id in job_ids:
+                if job_id in seen:
+                    continue
+                job = self.get(job_id)
+                if job is None:
+                    found.append({"id": job_id, "status": "error", "error": "Задача застаріла", "result": None})
+                elif job["status"] in FINISHED:
+                    found.append(job)
+            return found
+
+        return self.backend.wait_for(ready, timeout) or []
+
+    def _work(self):
+        while True:
+            try:
+                claimed = self.backend.claim(self.queue, timeout=5)
+            except Exception as e:
+                print(f"⚠️ Черга {self.queue} недоступна: {e}")
+                time.sleep(1)
+                continue
+            if claimed is None:
+                continue
+            state, task, args = claimed
+            job = Job.from_state(state)
+            fn = self.tasks.get(task)
+            if fn is None:
+                self._update(job, status="error", stage="error", error=f"Невідома задача: {task}",
+                             finished_at=time.time())
+                continue
+            self._run(job, fn, args)
+
+    def _update(self, job, **fields):
+        with job.lock:
+            now = time.time()
+            stage = fields.get("stage")
+            if stage and stage != job.stage:
+                if job.stage_started is not None:
+                    job.timings[job.stage] = job.timings.get(job.stage, 0) + now - job.stage_started
+                job.stage_started = now
+            for k, v in fields.items():
+                setattr(job, k, v)
+            job.seq += 1
+            state = dict(job.state(), timings=dict(job.timings))
+            self.backend.save(state, self.keep_seconds if job.status in FINISHED else None)
+
+    def _run(self, job, fn, args):
+        self._update(job, status="running", stage="starting", started_at=time.time())
+        metrics.observe("job_queue_seconds", job.started_at - job.created_at)
+
+        def report(stage, progress=None):
+            fields = {"stage": stage}
+            if progress is not None:
+                fields["progress"] = progress
+            self._update(job, **fields)
+
+        try:
+            result = fn(report, *args)
+            self._update(job, status="done", stage="done", progress=1.0, result=result, finished_at=time.time())
+        except Exception as e:
+            print(f"🔥 Задача {job.id} впала: {e}")
+            self._update(job, status="error", stage="error", error=str(e), finished_at=time.time())
+        metrics.inc("jobs_total", status=job.status)
+        metrics.observe("job_run_seconds", job.finished_at - job.started_at)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# --- НАЛАШТУВАННЯ КЕШУ ШІ ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "0") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+
+class LLMCache:
+    """Кеш відповідей ШІ у SQLite з TTL та обмеженням кількості записів.
+
+    Ключ — sha256 від (модель, повний промпт, налаштування безпеки).
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses(used_at)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(model_name, prompt, safety_settings=None):
+        safety = sorted((str(k), str(v)) for k, v in (safety_settings or {}).items())
+        payload = json.dumps([model_name, prompt, safety], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self._connect() as db:
+            row = db.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc("llm_cache_total", result="miss")
+                return None
+            db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            metrics.inc("llm_cache_total", result="hit")
+            return row[0]
+
+    def set(self, key, response):
+        now = time.time()
+        with self.lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def cached_call(cache, model_name, prompt, call, safety_settings=None, bypass=False):
+    """Повертає відповідь з кешу або викликає call() і кешує непорожній результат."""
+    if cache is None or bypass:
+        return call()
+    key = cache.key(model_name, prompt, safety_settings)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"⚡ Відповідь ШІ з кешу ({model_name}).")
+        return cached
+    result = call()
+    if result:
+        cache.set(key, result)
+    return result
+
+
+def cached_stream(cache, model_name, prompt, stream, safety_settings=None, bypass=False):
+    """Як cached_call, але для потокової відповіді: stream() — генератор шматків тексту.
+
+    При влучанні віддає весь текст одним шматком, інакше — шматки по мірі надходження,
+    а повний текст кешує після завершення потоку.
+    """
+    if cache is None or bypass:
+        yield from stream()
+        return
+    key = cache.key(model_name, prompt, safety_settings)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"⚡ Відповідь ШІ з кешу ({model_name}).")
+        yield cached
+        return
+    pieces = []
+    for piece in stream():
+        pieces.append(piece)
+        yield piece
+    result = "".join(pieces)
+    if result:
+        cache.set(key, result)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Спільний екземпляр кешу для процесу."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LLMCache()
+        return _default
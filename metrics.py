@@ -0,0 +1,139 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Лічильники і гістограми у форматі Prometheus (в пам'яті процесу)
+PREFIX = "studio_"
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf"))
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_current_timer = contextvars.ContextVar("job_timer", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Збільшує лічильник, напр. inc("retries_total", provider="edge")."""
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Додає значення в гістограму."""
+    with _lock:
+        key = _key(name, labels)
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                h["buckets"][i] += 1
+        h["sum"] += value
+        h["count"] += 1
+
+
+@contextmanager
+def span(stage, **labels):
+    """Міряє тривалість етапу: гістограма stage_duration_seconds + лічильник помилок.
+
+    Якщо активний JobTimer, тривалість потрапляє і в підсумок задачі.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        inc("stage_errors_total", stage=stage, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_duration_seconds", elapsed, stage=stage, **labels)
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.add(stage, elapsed, status, labels)
+
+
+class JobTimer:
+    """Збирає тривалості етапів однієї задачі (для timings.json поруч зі story.txt)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, status, labels):
+        with self.lock:
+            self.spans.append({"stage": stage, "seconds": round(seconds, 3), "status": status, **labels})
+
+    @contextmanager
+    def activate(self):
+        token = _current_timer.set(self)
+        try:
+            yield self
+        finally:
+            _current_timer.reset(token)
+
+    def summary(self):
+        with self.lock:
+            totals = {}
+            for s in self.spans:
+                t = totals.setdefault(s["stage"], {"count": 0, "seconds": 0.0, "errors": 0})
+                t["count"] += 1
+                t["seconds"] = round(t["seconds"] + s["seconds"], 3)
+                t["errors"] += s["status"] == "error"
+            return {
+                "job": self.name,
+                "wall_seconds": round(time.time() - self.started, 3),
+                "stages": totals,
+                "spans": list(self.spans),
+            }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()):
+    items = list(pairs) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render():
+    """Текст для /metrics (Prometheus text exposition format)."""
+    lines = []
+    with _lock:
+        seen = set()
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                seen.add(name)
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), h in sorted(_histograms.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                seen.add(name)
+            for bound, count in zip(BUCKETS, h["buckets"]):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', le)])} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {h['sum']}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {h['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,267 @@
+import bisect
+import math
+import os
+
+# Робота з MP3 на рівні кадрів, без декодування: заголовки кадрів, точна тривалість,
+# склеювання по межах кадрів і індекс для перемотки. Файл читається блоками —
+# пам'ять стала, час лінійний (склеїти 2-годинну аудіокнигу ≈ скопіювати файл).
+
+BLOCK_SIZE = 256 * 1024
+SEEK_STEP = 1.0  # крок індексу перемотки, с
+
+# Бітрейти (кбіт/с) за індексом 1..14: (версія, шар) → таблиця; MPEG-2.5 користується таблицями MPEG-2
+_BITRATES = {
+    (1, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+_VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+_LAYERS = {0b01: 3, 0b10: 2, 0b11: 1}
+
+
+class FrameHeader:
+    """Розібраний 4-байтовий заголовок кадру MPEG audio."""
+
+    __slots__ = ("version", "layer", "bitrate", "sample_rate", "padding", "mono", "protected", "samples", "length")
+
+    def __init__(self, version, layer, bitrate, sample_rate, padding, mono, protected):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate          # біт/с
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.mono = mono
+        self.protected = protected      # є CRC після заголовка
+        if layer == 1:
+            self.samples = 384
+            self.length = (12 * bitrate // sample_rate + padding) * 4
+        else:
+            self.samples = 576 if layer == 3 and version != 1 else 1152
+            self.length = self.samples // 8 * bitrate // sample_rate + padding
+
+    @property
+    def duration(self):
+        return self.samples / self.sample_rate
+
+    def side_info_size(self):
+        """Розмір side info Layer III — після нього в першому кадрі стоїть тег Xing/Info."""
+        if self.version == 1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+_header_cache = {}
+
+
+def parse_header(data, pos=0):
+    """FrameHeader для 4 байтів data[pos:pos+4] або None, якщо це не заголовок кадру."""
+    raw = data[pos:pos + 4]
+    try:
+        return _header_cache[raw]
+    except KeyError:
+        pass
+    header = _parse(raw) if len(raw) == 4 else None
+    if header is not None and len(_header_cache) < 4096:
+        _header_cache[raw] = header  # у файлі зазвичай лише кілька різних заголовків
+    return header
+
+
+def _parse(raw):
+    if raw[0] != 0xFF or raw[1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = raw[1], raw[2], raw[3]
+    version = _VERSIONS.get((b1 >> 3) & 0b11)
+    layer = _LAYERS.get((b1 >> 1) & 0b11)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0b11
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # зарезервовані значення і "free format" не підтримуємо
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index - 1] * 1000
+    return FrameHeader(version, layer, bitrate, _SAMPLE_RATES[version][rate_index],
+                       (b2 >> 1) & 1, (b3 >> 6) == 0b11, not b1 & 1)
+
+
+def _id3v2_end(f):
+    """Кінець тегів ID3v2 на початку файлу (їх може бути кілька підряд)."""
+    pos = 0
+    while True:
+        f.seek(pos)
+        head = f.read(10)
+        if len(head) < 10 or head[:3] != b"ID3":
+            return pos
+        size = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+        pos += 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def _audio_end(f, size):
+    """Кінець аудіо: без тегу ID3v1 (128 байтів "TAG…" в кінці файлу)."""
+    if size >= 128:
+        f.seek(size - 128)
+        if f.read(3) == b"TAG":
+            return size - 128
+    return size
+
+
+def iter_runs(f, start=0, end=None):
+    """(зсув, FrameHeader, n) — серії з n однакових кадрів підряд між start і end.
+
+    TTS пише CBR, тож серія зазвичай займає весь блок і перевіряється зрізами з кроком
+    у довжину кадру (на рівні C), а не циклом по кадрах. Сміття між кадрами пропускається.
+    """
+    if end is None:
+        end = os.fstat(f.fileno()).st_size
+    base, pos, buf = start, 0, b""
+    cache = _header_cache
+    while True:
+        if len(buf) - pos < 4:
+            base += pos
+            f.seek(base)
+            buf, pos = f.read(BLOCK_SIZE), 0
+            if len(buf) < 4:
+                return
+        raw = buf[pos:pos + 4]
+        header = cache.get(raw) or parse_header(raw)
+        if header is None:
+            # Шукаємо наступний байт синхронізації
+            nxt = buf.find(b"\xff", pos + 1)
+            pos = nxt if nxt >= 0 else len(buf)
+            continue
+        length = header.length
+        if base + pos + length > end:
+            return  # обрізаний останній кадр
+        # Скільки кадрів повністю в буфері (і до end) мають такий самий заголовок
+        count = (min(len(buf), end - base) - pos) // length
+        for k in range(4):
+            column = buf[pos + k:pos + k + (count - 1) * length + 1:length]
+            count = min(count, len(column) - len(column.lstrip(raw[k:k + 1])))
+        count = max(count, 1)  # кадр, що виходить за межі буфера
+        yield base + pos, header, count
+        pos += count * length
+
+
+def _is_info_frame(f, offset, header):
+    """Чи перший кадр — службовий Xing/Info/VBRI (кількість кадрів для плеєра, без звуку)."""
+    f.seek(offset)
+    data = f.read(min(header.length, 4 + 2 + 32 + 4))
+    xing_at = 4 + (2 if header.protected else 0) + header.side_info_size()
+    return data[xing_at:xing_at + 4] in (b"Xing", b"Info") or data[36:40] == b"VBRI"
+
+
+class SeekIndex:
+    """Відповідність «секунда → зсув кадру» з кроком step (будується за один прохід)."""
+
+    def __init__(self, step=SEEK_STEP):
+        self.step = step
+        self.times = []
+        self.offsets = []
+
+    def add_run(self, seconds, offset, frame_seconds, length, count):
+        """Додає точки для серії з count однакових кадрів, що починається в момент seconds."""
+        i = 0
+        if self.times:
+            i = max(0, math.ceil((self.times[-1] + self.step - seconds) / frame_seconds - 1e-9))
+        while i < count:
+            self.times.append(seconds + i * frame_seconds)
+            self.offsets.append(offset + i * length)
+            i += max(1, math.ceil(self.step / frame_seconds - 1e-9))
+
+    def offset_for(self, seconds):
+        """Зсув кадру, з якого треба почати, щоб грати з моменту seconds (або трохи раніше)."""
+        if not self.offsets:
+            return 0
+        return self.offsets[max(0, bisect.bisect_right(self.times, seconds) - 1)]
+
+
+class Mp3Info:
+    """Результат scan(): межі аудіо, кількість кадрів, тривалість і (за потреби) індекс перемотки."""
+
+    def __init__(self):
+        self.tag_end = 0        # кінець ID3v2 (0 — тегу немає)
+        self.audio_start = 0    # перший кадр зі звуком (після Xing/Info)
+        self.audio_end = 0      # кінець останнього повного кадру
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = 0
+        self.has_info_frame = False
+        self.seek = None
+
+    @property
+    def duration(self):
+        return self.samples / self.sample_rate if self.sample_rate else 0.0
+
+
+def scan(path, seek_step=None):
+    """Один прохід по файлу: межі аудіо, точна тривалість (сума кадрів), індекс перемотки, якщо seek_step."""
+    info = Mp3Info()
+    info.seek = SeekIndex(seek_step) if seek_step else None
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        info.tag_end = info.audio_start = info.audio_end = _id3v2_end(f)
+        for offset, header, count in iter_runs(f, info.tag_end, _audio_end(f, size)):
+            if info.frames == 0:
+                if not info.has_info_frame and _is_info_frame(f, offset, header):
+                    info.has_info_frame = True
+                    offset, count = offset + header.length, count - 1
+                    if not count:
+                        continue
+                info.audio_start = offset
+                info.sample_rate = header.sample_rate
+            # Для TTS частота однакова в усьому файлі; кадри з іншою частотою рахуємо в її одиницях
+            samples = header.samples * info.sample_rate // header.sample_rate
+            if info.seek is not None:
+                info.seek.add_run(info.samples / info.sample_rate, offset, samples / info.sample_rate,
+                                  header.length, count)
+            info.frames += count
+            info.samples += samples * count
+            info.audio_end = offset + count * header.length
+    return info
+
+
+def duration(path):
+    """Точна тривалість MP3 у секундах без декодування."""
+    return scan(path).duration
+
+
+def format_duration(seconds):
+    """1:02:03 або 2:03 — для статусів і логів."""
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def _copy_range(src, out, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(BLOCK_SIZE, remaining))
+        if not chunk:
+            break
+        out.write(chunk)
+        remaining -= len(chunk)
+
+
+def concat(part_paths, path):
+    """Склеює MP3 по межах кадрів без перекодування. Повертає тривалість результату, с.
+
+    ID3v2 лишається лише від першої частини; Xing/Info (з кількістю кадрів окремої частини)
+    і ID3v1 відкидаються, щоб плеєр не показував тривалість лише першого шматка.
+    Частини, в яких не знайдено жодного кадру, копіюються як є.
+    """
+    total = 0.0
+    with open(path, "wb") as out:
+        for index, part in enumerate(part_paths):
+            info = scan(part)
+            with open(part, "rb") as f:
+                if not info.frames:
+                    print(f"⚠️ {part}: MP3-кадрів не знайдено, копіюю як є")
+                    _copy_range(f, out, 0, os.fstat(f.fileno()).st_size)
+                    continue
+                if index == 0 and info.tag_end:
+                    _copy_range(f, out, 0, info.tag_end)
+                _copy_range(f, out, info.audio_start, info.audio_end)
+            total += info.duration
+    return total
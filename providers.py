@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+import metrics
+
+# Реєстр провайдерів ШІ/TTS: SDK імпортується і налаштовується лише при першому зверненні.
+# google.generativeai, openai і edge_tts разом імпортуються кілька секунд — це холодний
+# старт вікна (PyInstaller) і воркера gunicorn, навіть якщо потрібен лише Edge.
+# Імпорти навмисно звичайні (всередині фабрик), щоб PyInstaller їх знаходив.
+
+_factories = {}
+_instances = {}
+_models = {}
+_lock = threading.Lock()
+
+
+def register(name):
+    """Декоратор: фабрика провайдера, яка викликається один раз при першому get(name)."""
+    def wrap(factory):
+        _factories[name] = factory
+        return factory
+    return wrap
+
+
+def get(name):
+    """Провайдер за назвою (модуль SDK або клієнт). None — якщо немає ключа."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            start = time.perf_counter()
+            _instances[name] = _factories[name]()
+            elapsed = time.perf_counter() - start
+            metrics.observe("provider_init_seconds", elapsed, provider=name)
+            print(f"🔌 Провайдер {name} завантажено за {elapsed * 1000:.0f} мс")
+        return _instances[name]
+
+
+def gemini_model(name):
+    """Спільний GenerativeModel на назву моделі: не створюється на кожен запит, клієнт SDK і його
+    з'єднання (keep-alive) використовуються повторно."""
+    try:
+        return _models[name]
+    except KeyError:
+        pass
+    genai = get("gemini")
+    with _lock:
+        if name not in _models:
+            _models[name] = genai.GenerativeModel(name)
+        return _models[name]
+
+
+def warm_up(names):
+    """Завантажує провайдерів у фоні (напр. після показу вікна), щоб не чекати на першій задачі."""
+    def run():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"⚠️ Не вдалося завантажити провайдера {name}: {e}")
+    threading.Thread(target=run, daemon=True, name="providers-warmup").start()
+
+
+@register("gemini")
+def _gemini():
+    import google.generativeai as genai
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        genai.configure(api_key=api_key)
+    return genai
+
+
+@register("edge")
+def _edge():
+    import edge_tts
+    return edge_tts
+
+
+@register("redis")
+def _redis():
+    import redis
+    return redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+
+@register("openai")
+def _openai():
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+
+@register("genaipro")
+def _genaipro():
+    api_key = os.getenv("GENAIPRO_API_KEY")
+    if not api_key:
+        return None
+    from genaipro_client import GenAIProClient
+    return GenAIProClient(api_key)
@@ -0,0 +1,246 @@
+import asyncio
+import contextvars
+import email.utils
+import hashlib
+import os
+import random
+import threading
+import time
+
+import metrics
+
+# --- НАЛАШТУВАННЯ ТЕМПУ ЗАПИТІВ ---
+# Початковий темп (запитів/с) для кожного провайдера; RATE_LIMITS="gemini=2,edge=10" перевизначає
+DEFAULT_RATES = {"gemini": 2.0, "edge": 10.0, "openai": 3.0, "genaipro": 5.0}
+RATE_LIMITS = dict(DEFAULT_RATES, **{
+    k.strip(): float(v) for k, v in
+    (item.split("=", 1) for item in os.getenv("RATE_LIMITS", "").split(",") if "=" in item)
+})
+MIN_RATE = 0.05           # нижче не опускаємось навіть після серії 429
+MAX_RATE_FACTOR = 4.0     # вище початкового темпу в стільки разів не розганяємось
+INCREASE_STEP = 0.05      # адитивний приріст (частка початкового темпу) за кожен успіх
+DECREASE_FACTOR = 0.5     # мультиплікативне зменшення при 429
+
+MAX_ATTEMPTS = int(os.getenv("RATE_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Ключі API, від яких залежить окремий лімітер (на кожен ключ — своя квота)
+KEY_ENV = {"gemini": "GOOGLE_API_KEY", "openai": "OPENAI_API_KEY", "genaipro": "GENAIPRO_API_KEY"}
+
+THROTTLE_STATUSES = (429,)
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+# Винятки SDK без HTTP-статусу, що означають перевантаження (google.api_core)
+THROTTLE_NAMES = ("ResourceExhausted", "TooManyRequests", "RateLimitError")
+
+# Колбек «токен отримано, запит пішов» для поточної задачі/потоку: tts_failover запускає
+# годинник хеджування лише після нього, а не поки спроба стоїть у локальній черзі
+on_acquire = contextvars.ContextVar("rate_limiter_on_acquire", default=None)
+
+
+class AdaptiveLimiter:
+    """Token bucket з AIMD-темпом: +крок за успіх, ×0.5 за 429, пауза до Retry-After.
+
+    Темп знижується не частіше разу на «вікно»: 429 на запити, видані до останнього зниження,
+    лише продовжують паузу — інакше пачка паралельних відмов зрізала б темп до мінімуму.
+
+    Спільний для всіх потоків і event loop'ів процесу: час очікування рахується під локом,
+    а чекає кожен сам (time.sleep або asyncio.sleep).
+    """
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.decreased_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """Бронює один токен і повертає, скільки треба почекати до нього."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # у мінус — це черга наступних бронювань
+            wait = max(0.0, -self.tokens / self.rate)
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        """Чекає токен; повертає момент видачі запиту (для throttled/failed)."""
+        wait = self._reserve()
+        if wait > 0:
+            metrics.observe("rate_limit_wait_seconds", wait, provider=self.name)
+            time.sleep(wait)
+        _notify_acquired()
+        return time.monotonic()
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            metrics.observe("rate_limit_wait_seconds", wait, provider=self.name)
+            await asyncio.sleep(wait)
+        _notify_acquired()
+        return time.monotonic()
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.base_rate * MAX_RATE_FACTOR, self.rate + self.base_rate * INCREASE_STEP)
+
+    def throttled(self, retry_after=None, issued_at=None):
+        """429 на запит, виданий у issued_at (None — невідомо, вважаємо новим)."""
+        with self.lock:
+            now = time.monotonic()
+            decrease = issued_at is None or issued_at >= self.decreased_at
+            if decrease:
+                self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+                self.decreased_at = now
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+        metrics.inc("rate_limited_total", provider=self.name)
+        if decrease:
+            print(f"🐢 {self.name}: перевищено ліміт, темп знижено до {self.rate:.2f} запит/с")
+
+    def failed(self, exc, attempt, attempts, issued_at=None):
+        """Облік помилки. Повертає паузу перед наступною спробою або None, якщо пробувати більше не варто."""
+        metrics.inc("provider_errors_total", provider=self.name)
+        after = retry_after(exc)
+        if is_throttle(exc):
+            self.throttled(after, issued_at)
+        print(f"⚠️ {self.name}: помилка (Спроба {attempt + 1}/{attempts}): {exc}")
+        if attempt >= attempts - 1 or not is_retryable(exc):
+            return None
+        metrics.inc("retries_total", provider=self.name)
+        return backoff_delay(attempt, after)
+
+
+def _notify_acquired():
+    callback = on_acquire.get()
+    if callback is not None:
+        callback()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(provider, key=None):
+    """Лімітер для пари (провайдер, ключ API); ключ за замовчуванням береться з env."""
+    key = key if key is not None else os.getenv(KEY_ENV.get(provider, ""), "")
+    ident = (provider, hashlib.sha256(key.encode("utf-8")).hexdigest()[:12])
+    with _limiters_lock:
+        if ident not in _limiters:
+            _limiters[ident] = AdaptiveLimiter(provider, RATE_LIMITS.get(provider, 1.0))
+        return _limiters[ident]
+
+
+def _status_and_headers(exc):
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None) or getattr(response, "status_code", None)
+    code = getattr(exc, "code", None)
+    if status is None and isinstance(code, int):
+        status = code
+    headers = getattr(response, "headers", None) or getattr(exc, "headers", None) or {}
+    return status if isinstance(status, int) else None, headers
+
+
+def retry_after(exc):
+    """Секунди з заголовка Retry-After (число або HTTP-дата), якщо він є. Приймає і виняток, і відповідь."""
+    _, headers = _status_and_headers(exc)
+    if not hasattr(headers, "get"):
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle(exc):
+    status, _ = _status_and_headers(exc)
+    return status in THROTTLE_STATUSES or type(exc).__name__ in THROTTLE_NAMES
+
+
+def is_retryable(exc):
+    """429/5xx/мережеві збої — так; інші 4xx і помилки в нашому коді — ні."""
+    # FileNotFoundError/PermissionError — локальний файл (напр. тимчасову папку скасованої спроби вже прибрано)
+    if isinstance(exc, (ValueError, TypeError, KeyError, AttributeError, FileNotFoundError, PermissionError)) \
+            and not is_throttle(exc):
+        return False
+    status, _ = _status_and_headers(exc)
+    return status is None or status in RETRY_STATUSES
+
+
+def backoff_delay(attempt, after=None):
+    """Експоненційна пауза з повним jitter; Retry-After від сервера має пріоритет."""
+    if after is not None:
+        return after
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def call(provider, fn, *args, attempts=MAX_ATTEMPTS, **kwargs):
+    """Блокуючий виклик fn(*args, **kwargs) через лімітер провайдера з повторами і backoff."""
+    lim = limiter(provider)
+    for attempt in range(attempts):
+        issued = lim.acquire()
+        metrics.inc("provider_requests_total", provider=provider)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            delay = lim.failed(e, attempt, attempts, issued)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        lim.success()
+        return result
+
+
+async def call_async(provider, make_coro, attempts=MAX_ATTEMPTS):
+    """Як call, але для корутин: make_coro() створює нову корутину на кожну спробу."""
+    lim = limiter(provider)
+    for attempt in range(attempts):
+        issued = await lim.acquire_async()
+        metrics.inc("provider_requests_total", provider=provider)
+        try:
+            result = await make_coro()
+        except Exception as e:
+            delay = lim.failed(e, attempt, attempts, issued)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        lim.success()
+        return result
+
+
+def stream(provider, make_iter, attempts=MAX_ATTEMPTS):
+    """Генератор через лімітер: повторює запит, лише якщо ще нічого не віддано."""
+    lim = limiter(provider)
+    for attempt in range(attempts):
+        issued = lim.acquire()
+        metrics.inc("provider_requests_total", provider=provider)
+        started = False
+        try:
+            for item in make_iter():
+                started = True
+                yield item
+        except Exception as e:
+            # Після першого елемента повторювати вже не можна — споживач отримав би дублікати
+            delay = lim.failed(e, attempt, attempt + 1 if started else attempts, issued)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        lim.success()
+        return
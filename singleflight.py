@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import json
+import threading
+
+import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.task = None
+
+
+class SingleFlight:
+    """Схлопування однакових запитів, що виконуються одночасно (singleflight).
+
+    Перший виклик з ключем (лідер) виконує роботу, решта з тим самим ключем чекають
+    на неї і отримують той самий результат або виняток. Після завершення ключ звільняється:
+    наступний запит уже запускає нову генерацію (за повтори відповідають кеші).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.coalesced = 0
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+    def _join(self, key):
+        """Повертає (call, is_leader) і рахує лічильники."""
+        with self.lock:
+            call = self.calls.get(key)
+            # Задача вже завершилась (напр. скасований лідер), а ключ ще не звільнено — це не спільна робота
+            leader = call is None or (call.task is not None and call.task.done())
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        metrics.inc("singleflight_calls_total", scope=self.name)
+        if not leader:
+            metrics.inc("singleflight_coalesced_total", scope=self.name)
+            print(f"🔗 {self.name}: такий самий запит уже виконується — чекаю його результат")
+        return call, leader
+
+    def _forget(self, key, call):
+        with self.lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+
+    def do(self, key, fn, on_wait=None):
+        """Блокуючий варіант для потоків: fn() виконує лише лідер.
+
+        Повертає (результат, shared); shared=True — результат чужого виклику.
+        on_wait() викликається, якщо доводиться чекати на чужий виклик.
+        """
+        call, leader = self._join(key)
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                self._forget(key, call)
+                call.done.set()
+        else:
+            if on_wait:
+                on_wait()
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    async def do_async(self, key, make_coro, on_wait=None):
+        """Варіант для одного event loop: робота йде окремою задачею.
+
+        make_coro — робота від імені лідера (його папка, статус), тож лише вона й живе, поки
+        лідер чекає: скасували лідера — скасовується і робота, а ті, хто чекав, стартують
+        заново (перший з них стає лідером і виконує роботу вже своїм make_coro).
+        Скасування того, хто лише чекає, роботу не зупиняє.
+        """
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                call.task = asyncio.ensure_future(make_coro())
+                call.task.add_done_callback(lambda _, call=call: self._forget(key, call))
+            elif on_wait:
+                on_wait()
+            try:
+                return await asyncio.shield(call.task), not leader
+            except asyncio.CancelledError:
+                if leader:
+                    call.task.cancel()
+                elif call.task.cancelled() and not _cancelling():
+                    continue  # скасували лідера, а не нас — виконуємо самі
+                raise
+
+
+def _cancelling():
+    """Чи скасовують поточну задачу (Python 3.11+; на старіших — вважаємо, що так)."""
+    task = asyncio.current_task()
+    return getattr(task, "cancelling", lambda: 1)()
@@ -29,7 +29,8 @@ async function generateVideo() {
     const startTime = Date.now();
 
     try {
-        const response = await fetch('/generate', {
+        // Ставимо задачу в чергу — сервер одразу повертає job_id
+        const response = await fetch('/jobs', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ 
@@ -42,12 +43,23 @@ async function generateVideo() {
 
         const data = await response.json();
 
+        if (!response.ok) {
+            alert("Помилка: " + data.error);
+            resetButton();
+            return;
+        }
+
+        const job = await waitForJob(data.job_id, (update) => {
+            const percent = Math.round((update.progress || 0) * 100);
+            timeDisplay.innerText = `⏳ ${update.stage}: ${percent}%`;
+        });
+
         // 2. Засікаємо час кінця
         const endTime = Date.now();
         // Рахуємо різницю в секундах
         const duration = ((endTime - startTime) / 1000).toFixed(2);
 
-        if (response.ok) {
+        if (job.status === 'done') {
             loader.style.display = 'none';
             btn.className = 'download-state'; 
             btn.innerHTML = '<i class="fa-solid fa-download"></i> Завантажити MP3';
@@ -58,7 +70,7 @@ async function generateVideo() {
             
             btn.onclick = function() {
                 // Запускаємо скачування
-                window.location.href = `/download/${data.filename}`;
+                window.location.href = `/download/${job.result}`;
                 
                 // Перезавантажуємо сторінку через 1.5 секунди після початку скачування
                 // (затримка потрібна, щоб браузер встиг зрозуміти, що це скачування файлу)
@@ -67,7 +79,7 @@ async function generateVideo() {
                 }, 1500); 
             };
         } else {
-            alert("Помилка: " + data.error);
+            alert("Помилка: " + job.error);
             resetButton();
         }
 
@@ -78,6 +90,45 @@ async function generateVideo() {
     }
 }
 
+// Чекає завершення задачі: спершу через SSE, а якщо він недоступний — опитуванням
+function waitForJob(jobId, onUpdate) {
+    return new Promise((resolve, reject) => {
+        if (!window.EventSource) {
+            pollJob(jobId, onUpdate).then(resolve, reject);
+            return;
+        }
+
+        const source = new EventSource(`/jobs/${jobId}/events`);
+        source.onmessage = (event) => {
+            const job = JSON.parse(event.data);
+            onUpdate(job);
+            if (job.status === 'done' || job.status === 'error') {
+                source.close();
+                resolve(job);
+            }
+        };
+        source.onerror = () => {
+            source.close();
+            pollJob(jobId, onUpdate).then(resolve, reject);
+        };
+    });
+}
+
+async function pollJob(jobId, onUpdate) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error);
+        }
+        onUpdate(job);
+        if (job.status === 'done' || job.status === 'error') {
+            return job;
+        }
+        await new Promise((r) => setTimeout(r, 2000));
+    }
+}
+
 function resetButton() {
     const btn = document.getElementById('generate-btn');
     const btnText = document.getElementById('btn-text');
@@ -94,4 +145,145 @@ function resetButton() {
     
     btn.innerHTML = '<span id="btn-text"><i class="fa-solid fa-music"></i> Generate Audio</span><div id="loader" class="loader" style="display: none;"></div>';
     btn.onclick = generateVideo;
-}
\ No newline at end of file
+}
+
+// Потокове відтворення: звук починає грати, поки решта тексту ще озвучується
+async function playStream() {
+    const text = document.getElementById('story-text').value;
+    const voice = document.getElementById('voice-select').value;
+    const model = document.getElementById('model-select').value;
+    const promptInstruction = document.getElementById('custom-prompt').value;
+    const player = document.getElementById('stream-player');
+    const link = document.getElementById('download-link');
+
+    if (!text) {
+        alert("Будь ласка, введіть текст!");
+        return;
+    }
+
+    try {
+        const response = await fetch('/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ 
+                text: text, 
+                voice: voice, 
+                model: model,
+                instruction: promptInstruction 
+            })
+        });
+
+        const data = await response.json();
+
+        if (!response.ok) {
+            alert("Помилка: " + data.error);
+            return;
+        }
+
+        player.src = data.stream_url;
+        player.style.display = 'block';
+        player.play();
+
+        // Файл дописується у фоні — після завершення його можна скачати
+        link.href = `/download/${data.filename}`;
+        link.innerText = 'Завантажити MP3';
+        player.onended = () => { link.style.display = 'block'; };
+    } catch (error) {
+        console.error("Error:", error);
+        alert("Помилка з'єднання!");
+    }
+}
+
+// Пакет: кожен текст, відокремлений рядком "---", озвучується окремо; результат — ZIP
+async function generateBatch() {
+    const texts = document.getElementById('story-text').value
+        .split(/^\s*---\s*$/m)
+        .map((t) => t.trim())
+        .filter((t) => t);
+    const voice = document.getElementById('voice-select').value;
+    const model = document.getElementById('model-select').value;
+    const promptInstruction = document.getElementById('custom-prompt').value;
+    const timeDisplay = document.getElementById('execution-time');
+
+    if (!texts.length) {
+        alert("Будь ласка, введіть текст!");
+        return;
+    }
+
+    try {
+        const response = await fetch('/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(texts.map((text) => ({
+                text: text,
+                voice: voice,
+                model: model,
+                instruction: promptInstruction
+            })))
+        });
+
+        const data = await response.json();
+
+        if (!response.ok) {
+            alert("Помилка: " + data.error);
+            return;
+        }
+
+        // ZIP віддається потоком: скачування йде, поки елементи ще озвучуються
+        window.location.href = data.zip_url;
+
+        while (true) {
+            await new Promise((r) => setTimeout(r, 2000));
+            const status = await (await fetch(data.status_url)).json();
+            timeDisplay.innerText = `📦 ${status.done + status.errors}/${status.total} (${Math.round(status.progress * 100)}%)`;
+            if (status.done + status.errors >= status.total) {
+                if (status.errors) {
+                    timeDisplay.innerText += ` ⚠️ помилок: ${status.errors}`;
+                }
+                return;
+            }
+        }
+    } catch (error) {
+        console.error("Error:", error);
+        alert("Помилка з'єднання!");
+    }
+}
+
+// Повний каталог голосів Edge з сервера (/voices); статичний список у HTML — запасний
+function localeFlag(locale) {
+    const country = (locale.split('-').pop() || '').toUpperCase();
+    if (!/^[A-Z]{2}$/.test(country)) return '🌐';
+    return String.fromCodePoint(...[...country].map((c) => 0x1F1E6 + c.charCodeAt(0) - 65));
+}
+
+async function loadVoices() {
+    const select = document.getElementById('voice-select');
+    try {
+        const response = await fetch('/voices?provider=edge');
+        if (!response.ok) return;
+        const data = await response.json();
+        if (!data.voices.length) return;
+
+        const current = select.value;
+        const groups = {};
+        for (const v of data.voices) {
+            (groups[v.language] = groups[v.language] || []).push(v);
+        }
+        // Будуємо поза DOM і вставляємо одним махом, щоб великий список не гальмував сторінку
+        const fragment = document.createDocumentFragment();
+        for (const language of Object.keys(groups).sort()) {
+            const group = document.createElement('optgroup');
+            group.label = `${localeFlag(language)} ${language}`;
+            for (const v of groups[language]) {
+                const gender = v.gender ? ` (${v.gender})` : '';
+                group.appendChild(new Option(`${v.name}${gender}`, v.id, false, v.id === current));
+            }
+            fragment.appendChild(group);
+        }
+        select.replaceChildren(fragment);
+    } catch (error) {
+        console.error("Voices:", error);
+    }
+}
+
+loadVoices();
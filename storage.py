@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+import metrics
+import providers
+
+# --- НАЛАШТУВАННЯ СХОВИЩА АУДІО ---
+AUDIO_DIR = os.path.abspath(os.getenv("AUDIO_DIR", "generated_audio"))
+AUDIO_TTL_HOURS = float(os.getenv("AUDIO_TTL_HOURS", "24"))
+AUDIO_MAX_MB = int(os.getenv("AUDIO_MAX_MB", "2048"))
+GC_INTERVAL = int(os.getenv("AUDIO_GC_INTERVAL", "600"))
+# Спільне сховище готових файлів для кількох нод: local — лише AUDIO_DIR (один хост або спільний том),
+# redis — файл після генерації копіюється в Redis (REDIS_URL), AUDIO_DIR стає локальним кешем ноди
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "local")
+ARTIFACT_CHUNK = 1024 * 1024
+
+_NAME_RE = re.compile(r"^audio_[0-9a-f-]{36}\.mp3$")
+_gc_started = False
+_gc_lock = threading.Lock()
+
+
+def new_filename():
+    return f"audio_{uuid.uuid4()}.mp3"
+
+
+def path_for(filename):
+    """Повний шлях до файлу в сховищі (каталог створюється за потреби)."""
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    return os.path.join(AUDIO_DIR, filename)
+
+
+def resolve(filename):
+    """Шлях до існуючого файлу або None. Довільні шляхи (../) не пропускаємо.
+
+    Якщо файлу немає локально, а сховище спільне, — спершу завантажуємо його звідти.
+    """
+    if not _NAME_RE.match(filename or ""):
+        return None
+    path = os.path.join(AUDIO_DIR, filename)
+    if os.path.isfile(path):
+        return path
+    if ARTIFACT_STORE == "redis" and _fetch(filename, path):
+        return path
+    return None
+
+
+def _artifact_key(filename):
+    return f"studio:artifact:{filename}"
+
+
+def publish(filename):
+    """Робить готовий файл доступним усім нодам (для ARTIFACT_STORE=local нічого не робить)."""
+    if ARTIFACT_STORE != "redis":
+        return
+    r = providers.get("redis")
+    key = _artifact_key(filename)
+    # Пишемо в тимчасовий ключ шматками і перейменовуємо: інші ноди не побачать половину файлу
+    tmp_key = f"{key}:upload:{uuid.uuid4().hex}"
+    with metrics.span("artifact_upload"), open(path_for(filename), "rb") as f:
+        while True:
+            chunk = f.read(ARTIFACT_CHUNK)
+            if not chunk:
+                break
+            r.append(tmp_key, chunk)
+        r.rename(tmp_key, key)
+        r.expire(key, int(AUDIO_TTL_HOURS * 3600))
+
+
+def _fetch(filename, path):
+    """Завантажує файл зі спільного сховища в локальний кеш ноди. False — якщо його там немає."""
+    r = providers.get("redis")
+    key = _artifact_key(filename)
+    size = r.strlen(key)
+    if not size:
+        return False
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    part_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        with metrics.span("artifact_fetch"), open(part_path, "wb") as f:
+            for start in range(0, size, ARTIFACT_CHUNK):
+                f.write(r.getrange(key, start, min(size, start + ARTIFACT_CHUNK) - 1))
+        os.replace(part_path, path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    metrics.inc("artifact_fetch_total")
+    return True
+
+
+def collect_garbage(ttl_seconds=AUDIO_TTL_HOURS * 3600, max_bytes=AUDIO_MAX_MB * 1024 * 1024):
+    """Видаляє файли, старші за TTL, а потім найстаріші, поки сховище більше за ліміт."""
+    if not os.path.isdir(AUDIO_DIR):
+        return 0
+    now = time.time()
+    entries = []
+    removed = 0
+    for entry in os.scandir(AUDIO_DIR):
+        if not entry.is_file():
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        # Недописані .part-файли живуть стільки ж, скільки й готові
+        if now - st.st_mtime > ttl_seconds:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        else:
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+        total -= size
+
+    if removed:
+        print(f"🧹 Прибрано старих аудіо: {removed}")
+        metrics.inc("storage_gc_removed_total", removed)
+    return removed
+
+
+def _gc_loop():
+    while True:
+        try:
+            collect_garbage()
+        except Exception as e:
+            print(f"⚠️ Помилка прибирання сховища: {e}")
+        time.sleep(GC_INTERVAL)
+
+
+def start_gc():
+    """Запускає фонове прибирання (один раз на процес)."""
+    global _gc_started
+    with _gc_lock:
+        if _gc_started:
+            return
+        _gc_started = True
+    threading.Thread(target=_gc_loop, daemon=True, name="audio-gc").start()
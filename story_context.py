@@ -0,0 +1,65 @@
+import os
+
+# --- НАЛАШТУВАННЯ СТИСЛОГО КОНТЕКСТУ ІСТОРІЇ ---
+# Замість усієї історії чату ШІ бачить: початковий промпт + підсумок + останні KEEP_PARTS частин.
+# Тоді вартість і затримка кожної частини не ростуть разом з історією.
+KEEP_PARTS = int(os.getenv("STORY_KEEP_PARTS", "3"))
+SUMMARY_EVERY = int(os.getenv("STORY_SUMMARY_EVERY", "3"))
+SUMMARY_WORDS = int(os.getenv("STORY_SUMMARY_WORDS", "300"))
+
+SUMMARY_PROMPT = (
+    "You are helping an author who will keep writing the story below. Update the summary of the story so far. "
+    "Keep every character with their name and relationships, places, key events in order, unresolved plot threads, "
+    "the narrative voice and tone. At most {words} words. Return ONLY the summary text.\n\n"
+    "PREVIOUS SUMMARY:\n{summary}\n\nNEW PARTS:\n{parts}"
+)
+SUMMARY_HEADER = "[Summary of the story so far]"
+
+
+class StoryContext:
+    """Стислий контекст для start_chat: промпт + підсумок старих частин + останні keep частин."""
+
+    def __init__(self, prompt, keep=KEEP_PARTS, every=SUMMARY_EVERY, summary="", summarized=0):
+        self.prompt = prompt
+        self.keep = keep
+        self.every = every
+        self.summary = summary
+        self.summarized = summarized  # скільки перших частин уже згорнуто в підсумок
+        self.parts = []  # (повідомлення користувача, відповідь ШІ) після згорнутих
+
+    @classmethod
+    def from_parts(cls, prompt, parts, summary="", summarized=0, **kwargs):
+        """Відновлення з журналу: частини, що вже в підсумку, пропускаємо."""
+        ctx = cls(prompt, summary=summary, summarized=summarized, **kwargs)
+        ctx.parts = [(p["prompt"], p["response"]) for p in parts[summarized:]]
+        return ctx
+
+    def add(self, message, response):
+        self.parts.append((message, response))
+
+    def history(self):
+        """Історія для model.start_chat(history=...): ролі user/model чергуються."""
+        history = []
+        if self.summarized:
+            history.append({"role": "user", "parts": [self.prompt]})
+            history.append({"role": "model", "parts": [f"{SUMMARY_HEADER}\n{self.summary}"]})
+        for message, response in self.parts:
+            history.append({"role": "user", "parts": [message]})
+            history.append({"role": "model", "parts": [response]})
+        return history
+
+    def needs_summary(self):
+        """Підсумок оновлюємо пачками по every частин, а не після кожної."""
+        return len(self.parts) - self.keep >= self.every
+
+    def summary_prompt(self):
+        """Промпт для оновлення підсумку і кількість частин, які він згортає."""
+        count = len(self.parts) - self.keep
+        texts = "\n\n".join(response for _, response in self.parts[:count])
+        prompt = SUMMARY_PROMPT.format(words=SUMMARY_WORDS, summary=self.summary or "(none yet)", parts=texts)
+        return prompt, count
+
+    def apply_summary(self, summary, count):
+        self.summary = summary.strip()
+        self.summarized += count
+        del self.parts[:count]
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+JOURNAL_PATH = "journal.sqlite3"
+JOURNAL_KEEP_DAYS = float(os.getenv("JOURNAL_KEEP_DAYS", "30"))  # скільки днів тримати завершені задачі
+
+
+class StoryJournal:
+    """Надійний журнал задач і частин історії у SQLite.
+
+    Кожна згенерована частина (разом з промптом і сирою відповіддю для історії чату)
+    фіксується одразу, тому після падіння задача продовжується з останньої частини.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, keep_days=JOURNAL_KEEP_DAYS):
+        self.path = path
+        self.lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " id TEXT PRIMARY KEY, name TEXT NOT NULL, data TEXT NOT NULL,"
+                " status TEXT NOT NULL, folder TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS parts ("
+                " task_id TEXT NOT NULL, idx INTEGER NOT NULL,"
+                " prompt TEXT NOT NULL, response TEXT NOT NULL, text TEXT NOT NULL,"
+                " is_end INTEGER NOT NULL, PRIMARY KEY (task_id, idx))"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " task_id TEXT PRIMARY KEY, upto INTEGER NOT NULL, summary TEXT NOT NULL)"
+            )
+        self.prune(keep_days)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # --- Задачі ---
+
+    def add_task(self, task_id, name, data):
+        now = time.time()
+        with self.lock, self._connect() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO tasks (id, name, data, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?)",
+                (task_id, name, json.dumps(data, ensure_ascii=False), now, now),
+            )
+
+    def set_status(self, task_id, status):
+        with self.lock, self._connect() as db:
+            db.execute("UPDATE tasks SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), task_id))
+            if status in ("done", "dismissed"):
+                # Текст уже в story.txt (або задачу прибрали зі списку) — чекпоінти більше не потрібні
+                db.execute("DELETE FROM parts WHERE task_id = ?", (task_id,))
+                db.execute("DELETE FROM summaries WHERE task_id = ?", (task_id,))
+
+    def get_folder(self, task_id):
+        with self.lock, self._connect() as db:
+            row = db.execute("SELECT folder FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            return row[0] if row else None
+
+    def set_folder(self, task_id, folder):
+        with self.lock, self._connect() as db:
+            db.execute("UPDATE tasks SET folder = ?, updated_at = ? WHERE id = ?", (folder, time.time(), task_id))
+
+    def unfinished_tasks(self):
+        """Задачі, що були в черзі, обривались посеред роботи або впали (їх можна повторити).
+
+        Повертає [(id, name, data, status)].
+        """
+        with self.lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT id, name, data, status FROM tasks WHERE status IN ('queued', 'running', 'error')"
+                " ORDER BY created_at"
+            ).fetchall()
+        return [(task_id, name, json.loads(data), status) for task_id, name, data, status in rows]
+
+    def dismiss(self, task_ids):
+        """Завершені задачі, які користувач прибрав зі списку: впалі більше не відновлюються при старті."""
+        with self.lock, self._connect() as db:
+            for task_id in task_ids:
+                db.execute("UPDATE tasks SET status = 'dismissed', updated_at = ?"
+                           " WHERE id = ? AND status IN ('error', 'cancelled')", (time.time(), task_id))
+                db.execute("DELETE FROM parts WHERE task_id = ?", (task_id,))
+                db.execute("DELETE FROM summaries WHERE task_id = ?", (task_id,))
+
+    def prune(self, keep_days):
+        """Видаляє завершені, скасовані, прибрані й давно впалі задачі (з частинами), старші за keep_days днів."""
+        cutoff = time.time() - keep_days * 24 * 3600
+        finished = "status IN ('done', 'cancelled', 'dismissed', 'error') AND updated_at < ?"
+        with self.lock, self._connect() as db:
+            old = f"SELECT id FROM tasks WHERE {finished}"
+            db.execute(f"DELETE FROM parts WHERE task_id IN ({old})", (cutoff,))
+            db.execute(f"DELETE FROM summaries WHERE task_id IN ({old})", (cutoff,))
+            removed = db.execute(f"DELETE FROM tasks WHERE {finished}", (cutoff,)).rowcount
+        if removed:
+            print(f"🧹 Журнал: видалено {removed} завершених задач, старших за {keep_days:g} дн.")
+
+    # --- Частини історії ---
+
+    def add_part(self, task_id, index, prompt, response, text, is_end):
+        with self.lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO parts (task_id, idx, prompt, response, text, is_end)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, index, prompt, response, text, int(is_end)),
+            )
+            db.execute("UPDATE tasks SET updated_at = ? WHERE id = ?", (time.time(), task_id))
+
+    def load_parts(self, task_id):
+        with self.lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT prompt, response, text, is_end FROM parts WHERE task_id = ? ORDER BY idx", (task_id,)
+            ).fetchall()
+        return [{"prompt": p, "response": r, "text": t, "is_end": bool(e)} for p, r, t, e in rows]
+
+    def set_summary(self, task_id, upto, summary):
+        """Підсумок перших upto частин (для стислого контексту історії)."""
+        with self.lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO summaries (task_id, upto, summary) VALUES (?, ?, ?)",
+                (task_id, upto, summary),
+            )
+
+    def get_summary(self, task_id):
+        """Повертає (upto, summary); (0, "") — якщо підсумку ще немає."""
+        with self.lock, self._connect() as db:
+            row = db.execute("SELECT upto, summary FROM summaries WHERE task_id = ?", (task_id,)).fetchone()
+        return (row[0], row[1]) if row else (0, "")
+
+    @staticmethod
+    def chat_history(parts):
+        """Відновлює історію чату Gemini з частин."""
+        history = []
+        for part in parts:
+            history.append({"role": "user", "parts": [part["prompt"]]})
+            history.append({"role": "model", "parts": [part["response"]]})
+        return history
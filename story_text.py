@@ -0,0 +1,49 @@
+import re
+
+# Службові фрази, які ШІ дописує в кінці частини, і маркер кінця історії — прибираються за один прохід
+_NOISE_RE = re.compile(r"END|Type [‘'“]?Continue[’'”]? to receive the next part\.")
+
+READ_CHUNK = 64 * 1024
+
+
+def clean_part(raw_text):
+    """Текст частини без службових фраз. Повертає (текст, чи це остання частина — був END)."""
+    found_end = False
+
+    def strip(match):
+        nonlocal found_end
+        found_end = found_end or match.group() == "END"
+        return ""
+
+    return _NOISE_RE.sub(strip, raw_text), found_end
+
+
+class StoryFile:
+    """story.txt, що дописується по частині і читається шматками.
+
+    Вся історія в пам'яті не збирається: для озвучки StoryFile передається як ітератор
+    рядків (кожен прохід заново читає файл), кеш аудіо хешує його так само потоково.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.chars = 0  # непорожніх символів записано — щоб не перечитувати файл заради перевірки
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, text):
+        self.file.write(text + "\n")
+        self.file.flush()
+        self.chars += len(text.strip())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8", buffering=READ_CHUNK) as f:
+            yield from f
@@ -0,0 +1,176 @@
+import asyncio
+import platform
+import threading
+import uuid
+
+# Скільки задач виконується одночасно і скільки одночасних викликів має кожен провайдер
+MAX_PARALLEL_TASKS = 3
+PROVIDER_LIMITS = {"gemini": 2, "edge": 3, "openai": 2, "genaipro": 1}
+KEEP_FINISHED = 20
+
+ACTIVE = ("queued", "running")
+
+
+class ScheduledTask:
+    def __init__(self, name, data, task_id=None):
+        self.id = task_id or uuid.uuid4().hex[:8]
+        self.name = name
+        self.data = data
+        self.status = "queued"
+        self.message = "📥 В черзі"
+        self.color = "gray"
+        self.future = None
+
+
+class TaskScheduler:
+    """Черга задач, яка виконує кілька задач одночасно на одному довгоживучому event loop.
+
+    runner(task) — корутина, що виконує задачу. Доступ до провайдерів обмежується
+    через `async with scheduler.slot("edge")`. on_change() викликається з потоку
+    планувальника при кожній зміні стану.
+    """
+
+    def __init__(self, runner, max_parallel=MAX_PARALLEL_TASKS, provider_limits=None, on_change=None):
+        self.runner = runner
+        self.max_parallel = max_parallel
+        self.provider_limits = dict(PROVIDER_LIMITS if provider_limits is None else provider_limits)
+        self.on_change = on_change or (lambda: None)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.running = {}
+        self.finished = []
+        self.loop = None
+        self.slots = {}
+        self._ready = threading.Event()
+
+    # --- Потік планувальника ---
+
+    def start(self):
+        threading.Thread(target=self._run_loop, daemon=True, name="scheduler").start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        if platform.system() == 'Windows':
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._dispatch())
+
+    async def _dispatch(self):
+        print("--- SCHEDULER STARTED ---")
+        self.wakeup = asyncio.Event()
+        self.slots = {name: asyncio.Semaphore(n) for name, n in self.provider_limits.items()}
+        self._ready.set()
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                while self.pending and len(self.running) < self.max_parallel:
+                    task = self.pending.pop(0)
+                    task.status = "running"
+                    task.message = "⏳ Старт..."
+                    task.color = "blue"
+                    self.running[task.id] = task
+                    task.future = self.loop.create_task(self._execute(task))
+            self.on_change()
+
+    async def _execute(self, task):
+        print(f"--- Processing: {task.name} ---")
+        try:
+            await self.runner(task)
+            self._finish(task, "done", "✅ Готово", "green")
+        except asyncio.CancelledError:
+            self._finish(task, "cancelled", "⛔ Скасовано", "gray")
+        except Exception as e:
+            print(f"ERROR IN TASK {task.name}: {e}")
+            self._finish(task, "error", f"❌ {e}", "red")
+
+    def _finish(self, task, status, message, color):
+        with self.lock:
+            task.status, task.message, task.color = status, message, color
+            self.running.pop(task.id, None)
+            self.finished.append(task)
+            del self.finished[:-KEEP_FINISHED]
+        self._wake()
+
+    def _wake(self):
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    # --- API для інтерфейсу (потокобезпечне) ---
+
+    def slot(self, provider):
+        """Семафор провайдера. Використовувати лише всередині runner."""
+        if provider not in self.slots:
+            self.slots[provider] = asyncio.Semaphore(self.max_parallel)
+        return self.slots[provider]
+
+    def submit(self, name, data, task_id=None, message=None):
+        task = ScheduledTask(name, data, task_id)
+        if message:
+            task.message = message
+        with self.lock:
+            self.pending.append(task)
+        self._wake()
+        return task
+
+    def add_failed(self, name, data, task_id=None, message="❌ Помилка"):
+        """Додає задачу одразу як завершену з помилкою — її можна повторити кнопкою (retry)."""
+        task = ScheduledTask(name, data, task_id)
+        task.status, task.message, task.color = "error", message, "red"
+        with self.lock:
+            self.finished.append(task)
+            del self.finished[:-KEEP_FINISHED]
+        self.on_change()
+        return task
+
+    def retry(self, task_id):
+        """Повертає завершену з помилкою задачу в кінець черги."""
+        with self.lock:
+            for task in self.finished:
+                if task.id == task_id and task.status == "error":
+                    self.finished.remove(task)
+                    task.status, task.message, task.color = "queued", "🔁 Повтор (з останньої частини)", "gray"
+                    self.pending.append(task)
+                    break
+        self._wake()
+
+    def set_status(self, task, message, color="blue"):
+        task.message, task.color = message, color
+        self.on_change()
+
+    def cancel(self, task_id):
+        with self.lock:
+            for task in self.pending:
+                if task.id == task_id:
+                    self.pending.remove(task)
+                    task.status, task.message, task.color = "cancelled", "⛔ Скасовано", "gray"
+                    self.finished.append(task)
+                    break
+            else:
+                task = self.running.get(task_id)
+                if task and task.future:
+                    self.loop.call_soon_threadsafe(task.future.cancel)
+        self.on_change()
+
+    def move(self, task_id, delta):
+        """Зсуває задачу в черзі на delta позицій (від'ємне — вище)."""
+        with self.lock:
+            for i, task in enumerate(self.pending):
+                if task.id == task_id:
+                    j = max(0, min(len(self.pending) - 1, i + delta))
+                    self.pending.insert(j, self.pending.pop(i))
+                    break
+        self.on_change()
+
+    def clear_finished(self):
+        """Прибирає завершені задачі зі списку. Повертає їхні id (щоб позначити їх і в журналі)."""
+        with self.lock:
+            cleared = [task.id for task in self.finished]
+            self.finished.clear()
+        self.on_change()
+        return cleared
+
+    def snapshot(self):
+        """Список задач для відображення: активні, черга, завершені."""
+        with self.lock:
+            return list(self.running.values()) + list(self.pending) + list(reversed(self.finished))
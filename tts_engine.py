@@ -0,0 +1,338 @@
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import metrics
+import mp3_index
+import providers
+import rate_limiter
+
+# --- НАЛАШТУВАННЯ ЧАНКІНГУ ---
+# Довгий текст ріжемо на шматки по межах абзаців/речень і озвучуємо паралельно.
+CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "2500"))
+CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+MAX_RETRIES = 3
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])[\"'”»)]*\s+")
+
+
+def _hard_split(sentence, max_chars):
+    """Ріже задовге речення по словах, а надто довгі слова — по символах."""
+    if len(sentence) <= max_chars:
+        yield sentence
+        return
+    current = ""
+    for word in sentence.split():
+        while len(word) > max_chars:
+            if current:
+                yield current
+                current = ""
+            yield word[:max_chars]
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            yield current
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        yield current
+
+
+def iter_segments(pieces, max_chars=CHUNK_CHARS):
+    """Як split_text, але для ітератора шматків тексту (напр. рядків story.txt).
+
+    Сегменти віддаються по мірі читання: у пам'яті лише поточний шматок і недобраний сегмент.
+    """
+    current = ""
+    for text in pieces:
+        for paragraph in _PARAGRAPH_RE.split(text or ""):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            first = True
+            for sentence in _SENTENCE_RE.split(paragraph):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                separator = "\n" if first else " "
+                first = False
+                for piece in _hard_split(sentence, max_chars):
+                    if current and len(current) + len(separator) + len(piece) > max_chars:
+                        yield current
+                        current = piece
+                    else:
+                        current = f"{current}{separator}{piece}" if current else piece
+                    separator = " "
+    if current:
+        yield current
+
+
+def split_text(text, max_chars=CHUNK_CHARS):
+    """Ділить текст на сегменти до max_chars символів по межах абзаців і речень."""
+    return list(iter_segments([text], max_chars))
+
+
+async def stream_edge(text, voice, f, on_audio=None):
+    """Пише потік Edge TTS у відкритий файл. Повертає кількість записаних байтів.
+
+    on_audio() викликається на кожен аудіо-чанк (для хеджування — «звук пішов»).
+    """
+    communicate = providers.get("edge").Communicate(text, voice)
+    written = 0
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            f.write(chunk["data"])
+            written += len(chunk["data"])
+            if on_audio:
+                on_audio()
+    if not written:
+        raise Exception("Microsoft не надіслав жодних даних (пустий потік).")
+    return written
+
+
+async def edge_segment(text, voice, part_path, retries=MAX_RETRIES, on_audio=None):
+    """Озвучує один сегмент через Edge. Повторює тільки цей сегмент, а не весь текст (темп і паузи — rate_limiter)."""
+    async def attempt():
+        with metrics.span("tts_segment", provider="edge"), open(part_path, "wb") as f:
+            await stream_edge(text, voice, f, on_audio)
+
+    await rate_limiter.call_async("edge", attempt, attempts=retries)
+
+
+async def _aiter(items):
+    """Приймає і звичайний, і асинхронний ітератор."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def synthesize_segments(segments, path, voice=None, concurrency=CONCURRENCY, retries=MAX_RETRIES,
+                              on_progress=None, synth=None, on_audio=None):
+    """Озвучує сегменти паралельно (не більше concurrency) і склеює їх по порядку в path.
+
+    segments може бути async-ітератором: кожен сегмент іде в озвучку, щойно надійшов.
+    Наступний сегмент читається, лише коли звільнилось місце, тож у пам'яті не більше
+    concurrency сегментів, хоч би яким довгим був текст (готові частини — на диску).
+    synth(text, part_path) — корутина озвучки одного сегмента (за замовчуванням Edge).
+    on_progress(done, total) викликається після кожного готового сегмента; для ітератора
+    total — скільки сегментів уже надійшло (росте разом із текстом).
+    """
+    synth = synth or (lambda text, part_path: edge_segment(text, voice, part_path, retries, on_audio))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    target_dir = os.path.dirname(os.path.abspath(path))
+    tmp_dir = tempfile.mkdtemp(prefix=".tts_", dir=target_dir)
+    part_paths = []
+    tasks = []
+    done = 0
+    total = len(segments) if hasattr(segments, "__len__") else None
+
+    async def run(text, part_path):
+        nonlocal done
+        try:
+            await synth(text, part_path)
+        finally:
+            semaphore.release()
+        done += 1
+        if on_progress:
+            on_progress(done, total or len(tasks))
+
+    try:
+        async for text in _aiter(segments):
+            await semaphore.acquire()
+            # Якщо якийсь сегмент уже впав — не чекаємо кінця тексту
+            failed = next((t for t in tasks if t.done() and not t.cancelled() and t.exception()), None)
+            if failed is not None:
+                semaphore.release()
+                raise failed.exception()
+            part_paths.append(os.path.join(tmp_dir, f"{len(part_paths):05d}.mp3"))
+            tasks.append(asyncio.ensure_future(run(text, part_paths[-1])))
+        if not tasks:
+            raise ValueError("Text cannot be empty for TTS generation.")
+        await asyncio.gather(*tasks)
+
+        # Атомарний запис: спочатку тимчасовий файл, потім rename
+        tmp_path = os.path.join(tmp_dir, "joined.mp3")
+        with metrics.span("file_write"):
+            # Склеювання великих файлів — у потоці, щоб loop далі обслуговував інші задачі
+            await asyncio.to_thread(mp3_index.concat, part_paths, tmp_path)
+            os.replace(tmp_path, path)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+async def synthesize_chunked(text, path, voice, max_chars=CHUNK_CHARS, concurrency=CONCURRENCY,
+                             retries=MAX_RETRIES, on_progress=None, synth=None, on_audio=None):
+    """Паралельна озвучка довгого тексту через Edge TTS.
+
+    Текст ділиться на сегменти, які озвучуються одночасно (не більше concurrency),
+    після чого MP3-частини склеюються по порядку в path.
+    text — рядок або ітератор шматків (напр. StoryFile): тоді сегменти читаються по ходу озвучки.
+    """
+    if not isinstance(text, str):
+        print(f"🧩 Текст озвучується потоково (паралельно: {concurrency})")
+        await synthesize_segments(iter_segments(text, max_chars), path, voice, concurrency, retries,
+                                  on_progress, synth, on_audio)
+        return
+    segments = split_text(text, max_chars)
+    if not segments:
+        raise ValueError("Text cannot be empty for TTS generation.")
+
+    print(f"🧩 Текст поділено на {len(segments)} сегм. (паралельно: {concurrency})")
+    await synthesize_segments(segments, path, voice, concurrency, retries, on_progress, synth, on_audio)
+
+
+async def stream_segments(segments, voice, concurrency=CONCURRENCY, retries=MAX_RETRIES):
+    """Асинхронний генератор MP3-чанків у правильному порядку.
+
+    Перший сегмент віддається одразу, як тільки Microsoft надсилає дані,
+    а наступні сегменти тим часом озвучуються паралельно.
+    segments може бути async-ітератором (напр. потік речень від ШІ).
+    Сегмент повторюється лише якщо з нього ще нічого не було віддано.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    order = asyncio.Queue()  # черга черг: по одній на сегмент, у порядку тексту
+    tasks = []
+
+    async def produce(text, q):
+        limiter = rate_limiter.limiter("edge")
+        for attempt in range(retries):
+            sent = False
+            try:
+                issued = await limiter.acquire_async()
+                async with semaphore:
+                    metrics.inc("provider_requests_total", provider="edge")
+                    communicate = providers.get("edge").Communicate(text, voice)
+                    async for chunk in communicate.stream():
+                        if chunk["type"] == "audio":
+                            q.put_nowait(chunk["data"])
+                            sent = True
+                if not sent:
+                    raise Exception("Microsoft не надіслав жодних даних (пустий потік).")
+                limiter.success()
+                q.put_nowait(None)
+                return
+            except Exception as e:
+                delay = limiter.failed(e, attempt, attempt + 1 if sent else retries, issued)
+                if delay is None:
+                    q.put_nowait(e)
+                    return
+                await asyncio.sleep(delay)
+
+    async def feed():
+        try:
+            async for text in _aiter(segments):
+                q = asyncio.Queue()
+                tasks.append(asyncio.ensure_future(produce(text, q)))
+                order.put_nowait(q)
+            order.put_nowait(None)
+        except Exception as e:
+            order.put_nowait(e)
+
+    feeder = asyncio.ensure_future(feed())
+    sent_any = False
+    try:
+        while True:
+            q = await order.get()
+            if q is None:
+                break
+            if isinstance(q, Exception):
+                raise q
+            while True:
+                item = await q.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                sent_any = True
+                yield item
+        if not sent_any:
+            raise ValueError("Text cannot be empty for TTS generation.")
+    finally:
+        feeder.cancel()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(feeder, *tasks, return_exceptions=True)
+
+
+# --- ПОТОКОВИЙ ТЕКСТ (від ШІ) ---
+
+FIRST_SEGMENT_CHARS = 200
+_BOUNDARY_RE = re.compile(r"(?<=[.!?…])[\"'”»)]*\s+|\n\s*\n")
+
+
+class SentenceSplitter:
+    """Накопичує шматки тексту і віддає лише завершені речення."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, piece):
+        self.buffer += piece
+        last = None
+        for last in _BOUNDARY_RE.finditer(self.buffer):
+            pass
+        if last is None:
+            return ""
+        done, self.buffer = self.buffer[:last.end()], self.buffer[last.end():]
+        return done
+
+    def flush(self):
+        rest, self.buffer = self.buffer, ""
+        return rest
+
+
+async def segments_from_stream(pieces, max_chars=CHUNK_CHARS, first_chars=FIRST_SEGMENT_CHARS):
+    """Ріже потік тексту на сегменти для TTS по межах речень.
+
+    Перший сегмент короткий (first_chars), щоб звук з'явився якомога раніше,
+    далі сегменти подвоюються до max_chars.
+    """
+    splitter = SentenceSplitter()
+    pending = ""
+    target = first_chars
+    async for piece in _aiter(pieces):
+        pending += splitter.feed(piece)
+        if len(pending) >= target:
+            for segment in split_text(pending, max_chars):
+                yield segment
+            pending = ""
+            target = min(max_chars, target * 2)
+    pending += splitter.flush()
+    for segment in split_text(pending, max_chars):
+        yield segment
+
+
+async def iterate_in_thread(make_iter):
+    """Ганяє блокуючий ітератор (напр. потік Gemini) у потоці і віддає елементи асинхронно."""
+    loop = asyncio.get_running_loop()
+    q = asyncio.Queue()
+    finished = object()
+
+    def worker():
+        try:
+            for item in make_iter():
+                loop.call_soon_threadsafe(q.put_nowait, (item, None))
+            loop.call_soon_threadsafe(q.put_nowait, (finished, None))
+        except BaseException as e:
+            loop.call_soon_threadsafe(q.put_nowait, (finished, e))
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        item, error = await q.get()
+        if error is not None:
+            raise error
+        if item is finished:
+            return
+        yield item
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import metrics
+import providers
+import rate_limiter
+from tts_engine import MAX_RETRIES, edge_segment, iter_segments, split_text, synthesize_chunked, synthesize_segments
+
+# --- НАЛАШТУВАННЯ ПЕРЕМИКАННЯ ПРОВАЙДЕРІВ ---
+# Порядок, у якому шукаємо заміну, якщо основний провайдер впав
+FAILOVER_ORDER = [p.strip() for p in os.getenv("TTS_FAILOVER_ORDER", "edge,openai,genaipro").split(",") if p.strip()]
+# Хеджування (за бажанням): якщо за стільки секунд після відправки запиту немає першого звуку —
+# паралельно запускаємо запасний запит. 0 — вимкнено (за замовчуванням: запасний може бути платним)
+HEDGE_AFTER = float(os.getenv("TTS_HEDGE_AFTER", "0"))
+# Лише ці провайдери дають сигнал «перший звук» до завершення, тож лише їх є сенс хеджувати
+STREAMING_PROVIDERS = ("edge",)
+# Скільки разів пробувати основний голос на рівні сегмента, перш ніж брати еквівалент
+SEGMENT_ATTEMPTS = int(os.getenv("TTS_SEGMENT_ATTEMPTS", "2"))
+
+OPENAI_TTS_MODEL = "tts-1"
+OPENAI_MAX_CHARS = 4000  # ліміт input у OpenAI TTS — 4096 символів
+OPENAI_CONCURRENCY = 2
+WRITE_CHUNK = 256 * 1024
+GENAIPRO_PARAMS = {"model_id": "eleven_multilingual_v2", "speed": 1, "style": 0.5}
+
+# Групи «однаково звучних» голосів у різних провайдерів (перший голос групи — заміна за замовчуванням)
+VOICE_GROUPS = [
+    {"edge": ["en-US-ChristopherNeural", "en-GB-RyanNeural"], "openai": ["onyx"]},
+    {"edge": ["en-US-JennyNeural"], "openai": ["nova"]},
+    {"edge": ["uk-UA-OstapNeural"], "openai": ["echo"]},
+    {"edge": ["uk-UA-PolinaNeural"], "openai": ["shimmer"]},
+    {"edge": ["de-DE-ConradNeural", "de-DE-KillianNeural", "de-DE-ChristophNeural"],
+     "genaipro": ["NlRO8ABjJNJNYaRaLiPJ"], "openai": ["onyx"]},
+    {"edge": ["de-DE-KatjaNeural"], "openai": ["nova"]},
+    {"edge": ["pl-PL-MarekNeural"], "openai": ["echo"]},
+    {"edge": ["fr-FR-HenriNeural"], "openai": ["onyx"]},
+    {"openai": ["alloy"], "edge": ["en-US-ChristopherNeural"]},
+]
+
+
+def is_available(provider):
+    """Чи можна звертатися до провайдера (є ключ)."""
+    if provider == "openai":
+        return bool(os.getenv("OPENAI_API_KEY"))
+    if provider == "genaipro":
+        return bool(os.getenv("GENAIPRO_API_KEY"))
+    return provider == "edge"
+
+
+def equivalents(provider, voice):
+    """Голоси інших провайдерів, що звучать схоже, у порядку FAILOVER_ORDER."""
+    group = next((g for g in VOICE_GROUPS if voice in g.get(provider, ())), None)
+    if group is None:
+        return []
+    return [(p, group[p][0]) for p in FAILOVER_ORDER if p != provider and p in group]
+
+
+def plan(provider, voice, repeat=1, available=is_available):
+    """Черга спроб: основний голос repeat разів, далі доступні еквіваленти."""
+    return [(provider, voice)] * repeat + [(p, v) for p, v in equivalents(provider, voice) if available(p)]
+
+
+def _openai_to_file(text, voice, path):
+    """Пише відповідь OpenAI у файл чанками, не тримаючи весь MP3 у пам'яті."""
+    speech = providers.get("openai").audio.speech.with_streaming_response
+    with speech.create(model=OPENAI_TTS_MODEL, voice=voice, input=text) as resp, open(path, "wb") as f:
+        for chunk in resp.iter_bytes(WRITE_CHUNK):
+            f.write(chunk)
+
+
+async def speak(provider, voice, text, path, on_audio=None, status_callback=None, **edge_kwargs):
+    """Одна спроба озвучки конкретним провайдером у path.
+
+    on_audio() — сигнал «звук пішов»: у Edge на першому чанку, в інших — лише по завершенню.
+    text — рядок або ітератор шматків (StoryFile): тоді текст читається сегментами по ходу озвучки.
+    """
+    if provider == "openai":
+        # Довгий текст — кількома запитами в межах ліміту input, частини склеюються по кадрах
+        await synthesize_segments(
+            iter_segments([text] if isinstance(text, str) else text, OPENAI_MAX_CHARS), path,
+            concurrency=OPENAI_CONCURRENCY,
+            synth=lambda segment, part_path: asyncio.to_thread(
+                rate_limiter.call, "openai", _openai_to_file, segment, voice, part_path),
+        )
+    elif provider == "genaipro":
+        await asyncio.to_thread(
+            providers.get("genaipro").synthesize, text, voice, path, status_callback, **GENAIPRO_PARAMS)
+    else:  # Edge — паралельна озвучка сегментами
+        await synthesize_chunked(text, path, voice, on_audio=on_audio, **edge_kwargs)
+    if on_audio:
+        on_audio()
+
+
+async def speak_segment(provider, voice, text, part_path, on_audio=None, retries=1):
+    """Один готовий сегмент (вже в межах ліміту провайдера) — прямо в part_path, без повторного поділу."""
+    if provider == "openai":
+        await asyncio.to_thread(rate_limiter.call, "openai", _openai_to_file, text, voice, part_path,
+                                attempts=retries)
+    elif provider == "genaipro":
+        await asyncio.to_thread(providers.get("genaipro").synthesize, text, voice, part_path, None, **GENAIPRO_PARAMS)
+    else:
+        await edge_segment(text, voice, part_path, retries, on_audio)
+    if on_audio:
+        on_audio()
+
+
+class _Attempt:
+    """Одна запущена спроба failover: звук пішов (audio) і коли отримала слот/токен лімітера (ready_at)."""
+
+    def __init__(self, provider, voice, tmp_path, reason):
+        self.provider = provider
+        self.voice = voice
+        self.tmp_path = tmp_path
+        self.reason = reason
+        self.audio = asyncio.Event()
+        self.ready = asyncio.Event()
+        self.ready_at = None
+
+    def mark_ready(self):
+        if self.ready_at is None:
+            self.ready_at = asyncio.get_running_loop().time()
+            self.ready.set()
+
+
+async def failover(steps, attempt, path, hedge_after=HEDGE_AFTER, notify=None):
+    """Виконує attempt(provider, voice, tmp_path, on_audio) по черзі зі steps, поки одна спроба не вдасться.
+
+    Якщо хеджування увімкнене і поточна спроба за hedge_after секунд не дала звуку,
+    паралельно стартує наступна; перемагає та, що завершиться першою, решта скасовується.
+    Годинник хеджування йде з моменту, коли спроба отримала токен лімітера (rate_limiter.on_acquire),
+    тож очікування локального слота чи черги лімітера хеджу не викликає.
+    Результат переможця атомарно переноситься в path. Повертає (provider, voice) переможця.
+    """
+    loop = asyncio.get_running_loop()
+    queue = list(steps)
+    pending = {}
+    last_error = None
+    tmp_dir = tempfile.mkdtemp(prefix=".failover_", dir=os.path.dirname(os.path.abspath(path)))
+
+    def launch(reason):
+        provider, voice = queue.pop(0)
+        state = _Attempt(provider, voice, os.path.join(tmp_dir, f"{len(queue)}_{provider}.mp3"), reason)
+
+        async def run():
+            # Контекст задачі — свій, тож колбек бачать лише запити цієї спроби (і її підзадачі)
+            rate_limiter.on_acquire.set(lambda: loop.call_soon_threadsafe(state.mark_ready))
+            await attempt(provider, voice, state.tmp_path, state.audio.set)
+
+        pending[asyncio.ensure_future(run())] = state
+        if reason:
+            metrics.inc(f"tts_{reason}_total", provider=provider)
+            if notify:
+                notify(f"🔀 {'Хедж' if reason == 'hedge' else 'Заміна'}: {provider}/{voice}")
+
+    try:
+        launch(None)
+        while pending:
+            timeout = None
+            waiters = set(pending)
+            ready_waiter = None
+            if hedge_after > 0 and queue and len(pending) == 1:
+                (state,) = pending.values()
+                if state.provider in STREAMING_PROVIDERS and not state.audio.is_set():
+                    if state.ready_at is None:
+                        ready_waiter = asyncio.ensure_future(state.ready.wait())
+                        waiters.add(ready_waiter)
+                    else:
+                        timeout = max(0.0, state.ready_at + hedge_after - loop.time())
+
+            try:
+                done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if ready_waiter is not None:
+                    ready_waiter.cancel()
+            done = [task for task in done if task in pending]
+            if not done:
+                if timeout is not None and not state.audio.is_set():
+                    launch("hedge")
+                continue
+
+            for task in done:
+                state = pending.pop(task)
+                if task.exception() is None:
+                    os.replace(state.tmp_path, path)
+                    if state.reason:
+                        metrics.inc(f"tts_{state.reason}_wins_total", provider=state.provider)
+                    return state.provider, state.voice
+                last_error = task.exception()
+                print(f"⚠️ {state.provider}/{state.voice}: {last_error}")
+            if not pending and queue:
+                launch("failover")
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def segment_synth(voice, provider="edge", hedge_after=HEDGE_AFTER):
+    """synth для synthesize_segments: кожен сегмент з хеджуванням і переходом на еквівалентний голос.
+
+    Замість трьох повторів з паузою 1.5 с — одразу наступна спроба (той самий голос, потім еквівалент).
+    Заміна обирається раз на файл: після першої наступні сегменти одразу йдуть голосом-заміною.
+    synth.voice — поточний (провайдер, голос), synth.voices — усі, якими озвучено сегменти.
+    """
+    full_plan = plan(provider, voice, repeat=1)
+
+    async def synth(text, part_path):
+        current = synth.voice
+        # Поточний голос кілька разів, далі — еквіваленти основного, що стоять у плані після нього
+        steps = [current] * SEGMENT_ATTEMPTS + full_plan[full_plan.index(current) + 1:]
+        winner = await failover(steps, lambda p, v, tmp, on_audio: speak_segment(p, v, text, tmp, on_audio),
+                                part_path, hedge_after)
+        synth.voices.add(winner)
+        if winner != current and full_plan.index(winner) > full_plan.index(synth.voice):
+            synth.voice = winner
+
+    synth.voice = (provider, voice)
+    synth.voices = set()
+    return synth
+
+
+async def synthesize_one_voice(segments, path, voice, provider="edge", on_progress=None, full_text=None):
+    """synthesize_segments через segment_synth, але з одним голосом на весь файл.
+
+    Якщо частину сегментів уже озвучено основним голосом, а решту — заміною (сегменти йдуть
+    паралельно), весь файл переозвучується заміною: текст для цього дає full_text().
+    Повертає (провайдер, голос), яким озвучено файл.
+    """
+    synth = segment_synth(voice, provider)
+    await synthesize_segments(segments, path, on_progress=on_progress, synth=synth)
+    if len(synth.voices) > 1:
+        sub_provider, sub_voice = synth.voice
+        print(f"🔀 Частину сегментів озвучено заміною {sub_provider}/{sub_voice} — переозвучую нею весь файл")
+        metrics.inc("tts_voice_reruns_total", provider=sub_provider)
+        await synthesize_segments(
+            split_text(full_text()), path, on_progress=on_progress,
+            synth=lambda text, part_path: speak_segment(sub_provider, sub_voice, text, part_path, retries=MAX_RETRIES))
+    return synth.voice
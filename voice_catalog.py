@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+import event_loop
+import metrics
+import providers
+import rate_limiter
+
+# --- НАЛАШТУВАННЯ КАТАЛОГУ ГОЛОСІВ ---
+VOICE_CATALOG_PATH = os.getenv("VOICE_CATALOG_PATH", "voice_catalog.json")
+VOICE_CATALOG_TTL = int(os.getenv("VOICE_CATALOG_TTL", str(24 * 3600)))
+VOICE_CATALOG_RETRY = int(os.getenv("VOICE_CATALOG_RETRY", str(15 * 60)))  # пауза після невдалого оновлення
+VOICES_PAGE_SIZE = 100
+VOICES_MAX_PARALLEL = 4  # скільки сторінок одного провайдера качаємо одночасно
+
+MULTILINGUAL = "multi"  # голос говорить будь-якою мовою (OpenAI, більшість GenAIPro)
+
+# Є завжди — перший запуск без мережі, а також OpenAI, у якого немає API списку голосів
+BUILTIN_VOICES = [
+    {"provider": "edge", "id": "en-US-ChristopherNeural", "name": "Christopher", "language": "en-US", "gender": "Male"},
+    {"provider": "edge", "id": "en-US-JennyNeural", "name": "Jenny", "language": "en-US", "gender": "Female"},
+    {"provider": "edge", "id": "en-GB-RyanNeural", "name": "Ryan", "language": "en-GB", "gender": "Male"},
+    {"provider": "edge", "id": "uk-UA-OstapNeural", "name": "Ostap", "language": "uk-UA", "gender": "Male"},
+    {"provider": "edge", "id": "uk-UA-PolinaNeural", "name": "Polina", "language": "uk-UA", "gender": "Female"},
+    {"provider": "edge", "id": "de-DE-ConradNeural", "name": "Conrad", "language": "de-DE", "gender": "Male"},
+    {"provider": "edge", "id": "de-DE-ChristophNeural", "name": "Christoph", "language": "de-DE", "gender": "Male"},
+    {"provider": "edge", "id": "de-DE-KillianNeural", "name": "Killian", "language": "de-DE", "gender": "Male"},
+    {"provider": "edge", "id": "de-DE-KatjaNeural", "name": "Katja", "language": "de-DE", "gender": "Female"},
+    {"provider": "edge", "id": "pl-PL-MarekNeural", "name": "Marek", "language": "pl-PL", "gender": "Male"},
+    {"provider": "edge", "id": "fr-FR-HenriNeural", "name": "Henri", "language": "fr-FR", "gender": "Male"},
+    {"provider": "genaipro", "id": "NlRO8ABjJNJNYaRaLiPJ", "name": "Konrad", "language": "de-DE", "gender": "Male"},
+    {"provider": "openai", "id": "alloy", "name": "Alloy", "language": MULTILINGUAL, "gender": None},
+    {"provider": "openai", "id": "echo", "name": "Echo", "language": MULTILINGUAL, "gender": "Male"},
+    {"provider": "openai", "id": "fable", "name": "Fable", "language": MULTILINGUAL, "gender": None},
+    {"provider": "openai", "id": "onyx", "name": "Onyx", "language": MULTILINGUAL, "gender": "Male"},
+    {"provider": "openai", "id": "nova", "name": "Nova", "language": MULTILINGUAL, "gender": "Female"},
+    {"provider": "openai", "id": "shimmer", "name": "Shimmer", "language": MULTILINGUAL, "gender": "Female"},
+]
+
+
+def _gender(value):
+    return value.capitalize() if value else None
+
+
+def _edge_voice(v):
+    # "en-US-AvaMultilingualNeural" → "AvaMultilingual"
+    name = v["ShortName"].split("-", 2)[-1]
+    return {"provider": "edge", "id": v["ShortName"], "name": name[:-6] if name.endswith("Neural") else name,
+            "language": v.get("Locale") or MULTILINGUAL, "gender": _gender(v.get("Gender"))}
+
+
+def _genaipro_voice(v):
+    labels = v.get("labels") or {}
+    return {"provider": "genaipro", "id": v["voice_id"], "name": v.get("name") or v["voice_id"],
+            "language": v.get("language") or labels.get("language") or MULTILINGUAL,
+            "gender": _gender(v.get("gender") or labels.get("gender"))}
+
+
+async def _fetch_edge(etag):
+    """Усі голоси Edge одним запитом (пагінації і ETag у цього API немає)."""
+    edge = providers.get("edge")
+    voices = await rate_limiter.call_async("edge", lambda: edge.list_voices())
+    return [_edge_voice(v) for v in voices], None
+
+
+async def _fetch_genaipro(etag):
+    """Усі сторінки GenAIPro: перша — з If-None-Match, решта — паралельно, коли відомо total."""
+    client = providers.get("genaipro")
+    if client is None:
+        return None  # немає ключа
+    first = await asyncio.to_thread(rate_limiter.call, "genaipro", client.list_voices_page, 1, VOICES_PAGE_SIZE, etag)
+    if first is None:
+        return None, etag  # не змінився
+    voices, total, new_etag = first
+    if total is not None:
+        limit = asyncio.Semaphore(VOICES_MAX_PARALLEL)
+
+        async def page(n):
+            async with limit:
+                return (await asyncio.to_thread(rate_limiter.call, "genaipro", client.list_voices_page,
+                                                n, VOICES_PAGE_SIZE))[0]
+
+        pages = range(2, math.ceil(total / VOICES_PAGE_SIZE) + 1)
+        for chunk in await asyncio.gather(*(page(n) for n in pages)):
+            voices += chunk
+    else:
+        # total невідомий — по сторінці, доки не прийде неповна
+        last, n = voices, 1
+        while len(last) == VOICES_PAGE_SIZE:
+            n += 1
+            last = (await asyncio.to_thread(rate_limiter.call, "genaipro", client.list_voices_page,
+                                            n, VOICES_PAGE_SIZE))[0]
+            voices += last
+    return [_genaipro_voice(v) for v in voices], new_etag
+
+
+# Провайдер → fetcher(etag): None (недоступний), (None, etag) — не змінився, або (голоси, etag)
+FETCHERS = {"edge": _fetch_edge, "genaipro": _fetch_genaipro}
+
+
+class VoiceCatalog:
+    """Каталог голосів усіх провайдерів: файл на диску з TTL/ETag і індекс у пам'яті.
+
+    Читається лише з диска (разом з BUILTIN_VOICES), тож старт не чекає мережі;
+    оновлення — у фоні на спільному event loop (refresh_in_background).
+    """
+
+    def __init__(self, path=VOICE_CATALOG_PATH, ttl=VOICE_CATALOG_TTL, retry=VOICE_CATALOG_RETRY):
+        self.path = path
+        self.ttl = ttl
+        self.retry = retry
+        self.lock = threading.Lock()
+        self.sources = {}  # провайдер → {"voices": [...], "fetched_at": ..., "etag": ..., "failed_at": ...}
+        self.refreshing = None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.sources = json.load(f).get("providers", {})
+        except (OSError, ValueError):
+            pass
+        self._reindex()
+
+    def _reindex(self):
+        voices = {(v["provider"], v["id"]): v for v in BUILTIN_VOICES}
+        for source in self.sources.values():
+            voices.update(((v["provider"], v["id"]), v) for v in source["voices"])
+        ordered = sorted(voices.values(), key=lambda v: (v["language"], v["provider"], v["name"]))
+        index = {}
+        for i, v in enumerate(ordered):
+            language = v["language"]
+            for key in {("provider", v["provider"]), ("language", language), ("language", language.split("-")[0]),
+                        ("gender", v["gender"])}:
+                index.setdefault(key, []).append(i)
+        with self.lock:
+            self.voices = ordered
+            self.by_id = voices
+            self.index = index
+            self.etag = hashlib.sha1(json.dumps(ordered, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"providers": self.sources}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def find(self, provider=None, language=None, gender=None):
+        """Голоси за фільтрами; language — "en-US" або просто "en". Багатомовні підходять до будь-якої мови."""
+        with self.lock:
+            voices, index = self.voices, self.index
+        selected = None
+        for key in (("provider", provider), ("gender", gender and gender.capitalize())):
+            if key[1]:
+                ids = set(index.get(key, ()))
+                selected = ids if selected is None else selected & ids
+        if language:
+            ids = set(index.get(("language", language), ())) | set(index.get(("language", MULTILINGUAL), ()))
+            selected = ids if selected is None else selected & ids
+        return voices if selected is None else [voices[i] for i in sorted(selected)]
+
+    def get(self, provider, voice_id):
+        with self.lock:
+            return self.by_id.get((provider, voice_id))
+
+    def languages(self):
+        """Мови, для яких є хоч один голос (без "multi")."""
+        with self.lock:
+            return sorted({v["language"] for v in self.voices} - {MULTILINGUAL})
+
+    def is_stale(self, provider):
+        source = self.sources.get(provider)
+        if source is None:
+            return True
+        now = time.time()
+        # Після невдачі не смикаємо провайдера на кожен /voices і старт вікна — чекаємо retry
+        if now - source.get("failed_at", 0) < self.retry:
+            return False
+        return now - source["fetched_at"] > self.ttl
+
+    async def refresh(self, force=False):
+        """Оновлює застарілі (або всі, якщо force) провайдери паралельно. Повертає назви змінених."""
+        names = [name for name in FETCHERS if force or self.is_stale(name)]
+        results = await asyncio.gather(*(self._fetch(name) for name in names))
+        changed = [name for name, was_changed in zip(names, results) if was_changed]
+        if names:
+            await asyncio.to_thread(self._save)
+        if changed:
+            self._reindex()
+            print(f"🗣️ Каталог голосів оновлено ({', '.join(changed)}): {len(self.voices)} голосів")
+        return changed
+
+    async def _fetch(self, name):
+        """True — голоси змінилися, False — ні (304), None — провайдер недоступний або помилка."""
+        source = self.sources.get(name, {})
+        try:
+            with metrics.span("voice_catalog", provider=name):
+                result = await FETCHERS[name](source.get("etag"))
+        except Exception as e:
+            metrics.inc("voice_catalog_errors_total", provider=name)
+            print(f"⚠️ Каталог голосів {name}: {e} — лишаю збережений, повтор через {self.retry} с")
+            result = None
+        if result is None:
+            self._mark_failed(name, source)
+            return None
+        voices, etag = result
+        fresh = {"voices": voices if voices is not None else source.get("voices", []),
+                 "fetched_at": time.time(), "etag": etag}
+        self.sources = {**self.sources, name: fresh}
+        return voices is not None and voices != source.get("voices")
+
+    def _mark_failed(self, name, source):
+        """Запам'ятовує невдачу (і на диску), щоб is_stale не повторював запит до VOICE_CATALOG_RETRY."""
+        failed = {"voices": source.get("voices", []), "fetched_at": source.get("fetched_at", 0),
+                  "etag": source.get("etag"), "failed_at": time.time()}
+        self.sources = {**self.sources, name: failed}
+
+    def refresh_in_background(self, force=False, on_done=None):
+        """Запускає refresh на спільному loop, якщо є що оновлювати; повторні виклики чекають той самий.
+
+        on_done(changed) викликається з фонового потоку — для вікна через self.after.
+        """
+        with self.lock:
+            if self.refreshing is None or self.refreshing.done():
+                if not force and not any(self.is_stale(name) for name in FETCHERS):
+                    return None
+                self.refreshing = event_loop.submit(self.refresh(force))
+            future = self.refreshing
+        if on_done:
+            future.add_done_callback(lambda f: on_done([] if f.cancelled() or f.exception() else f.result()))
+        return future
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_voice_catalog():
+    """Спільний каталог процесу."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = VoiceCatalog()
+        return _default